@@ -0,0 +1 @@
+# Remote host agents
@@ -0,0 +1,587 @@
+"""Deduplicating incremental backups of server saves - runs on a managed host.
+
+Each backup of a server's SavedArks is split into content-defined
+chunks. A chunk is stored once per host, whichever server or snapshot
+it came from::
+
+    <root>/chunks/ab/abcdef...   one chunk, named by the sha256 of its data
+    <root>/snapshots/<server>/<id>.json.gz   manifest: path -> [size, mtime, mode, inode, chunks]
+    <root>/snapshots/<server>/latest   id of the newest manifest
+
+Chunk boundaries depend on the bytes around them, not on offsets, so an
+insert or a resized record early in a map file only changes the chunks
+it touches. Each byte maps to one bit through a fixed table, and a chunk
+ends where the last 16 bits match a marker (16-512 KiB, about 80 KiB on
+average). ``bytes.translate`` and ``bytes.find`` do this at C speed.
+
+An hourly run is cheap:
+
+- A file whose size, mtime and inode match the previous snapshot is not
+  read.
+- A chunk already in the store is not written again.
+- New chunks are compressed (zstd, else zlib) and written by a pool of
+  ``--workers`` processes at ``--nice`` priority. Each chunk starts with
+  a codec byte, so stores written either way stay readable.
+- A run that finds nothing changed writes no manifest.
+
+``prune`` keeps the newest ``--keep-last`` snapshots plus the newest one
+per hour / day / week / month (``--keep-hourly`` ...). With ``--gc`` it
+then deletes chunks that no manifest references. Backups and restores
+share ``<root>/lock``; prune takes it exclusively. ``restore`` rebuilds a
+directory as of a snapshot (``--snapshot``) or a point in time
+(``--at``), verifying every chunk.
+
+Standard library only (``zstandard`` is used when installed); it prints
+JSON lines for the backend::
+
+    python3 backup.py backup <root> <server id> <source dir> [--tag T] [--workers 2] [--level 3] [--missing-ok]
+    python3 backup.py restore <root> <server id> <target dir> [--snapshot ID | --at EPOCH] [--delete]
+    python3 backup.py list <root> <server id>
+    python3 backup.py prune <root> [--server ID ...] [--keep-last 1] [--keep-hourly 24] ... [--gc]
+    python3 backup.py stats <root>
+"""
+import argparse
+import collections
+import fcntl
+import gzip
+import hashlib
+import json
+import os
+import stat
+import sys
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Chunking parameters are part of the store format: changing them stops
+# new backups from deduplicating against existing chunks.
+CHUNK_MIN = 16 * 1024
+CHUNK_MAX = 512 * 1024
+CUT_MARK = b"1101001100011100"
+# Half of the byte values map to "1", picked by a fixed hash
+_ONES = set(sorted(range(256), key=lambda b: hashlib.sha256(b"zedin-cdc-%d" % b).digest())[:128])
+CUT_TABLE = bytes(ord("1") if b in _ONES else ord("0") for b in range(256))
+
+READ_BLOCK = 8 << 20
+CODEC_RAW, CODEC_ZLIB, CODEC_ZSTD = b"-", b"z", b"Z"
+# Partial files of a save in progress
+SKIP_SUFFIXES = (".tmp",)
+PROGRESS_INTERVAL = 0.5
+RETENTION_BUCKETS = (("hourly", "%Y%m%d%H"), ("daily", "%Y%m%d"), ("weekly", "%G%V"), ("monthly", "%Y%m"))
+
+
+def emit(event: str, **fields):
+    print(json.dumps({"event": event, **fields}), flush=True)
+
+
+class Progress:
+    """Throttled progress events"""
+
+    def __init__(self, step: str, total: int, bytes_total: int):
+        self.step = step
+        self.total = total
+        self.bytes_total = bytes_total
+        self.done = 0
+        self.bytes_done = 0
+        self._at = 0.0
+
+    def add(self, nbytes: int):
+        self.done += 1
+        self.bytes_done += nbytes
+        now = time.monotonic()
+        if now - self._at >= PROGRESS_INTERVAL or self.done == self.total:
+            self._at = now
+            emit("progress", step=self.step, done=self.done, total=self.total,
+                 bytes_done=self.bytes_done, bytes_total=self.bytes_total)
+
+
+def _lock(root: str, exclusive: bool):
+    os.makedirs(root, exist_ok=True)
+    f = open(os.path.join(root, "lock"), "a")
+    fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+    return f
+
+
+def _write_atomic(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _chunk_path(root: str, sha: str) -> str:
+    return os.path.join(root, "chunks", sha[:2], sha)
+
+
+def _plain_name(value: str, what: str) -> str:
+    """A name used as one path component (never a path into another server's snapshots)"""
+    if not value or value in (".", "..") or "/" in value or os.sep in value or "\0" in value:
+        raise SystemExit(f"Invalid {what}: {value!r}")
+    return value
+
+
+def _snapshot_dir(root: str, server_id: str) -> str:
+    return os.path.join(root, "snapshots", _plain_name(server_id, "server id"))
+
+
+def _chunks(f):
+    """Content-defined chunks of an open file"""
+    pending = b""
+    while True:
+        block = f.read(READ_BLOCK)
+        data = pending + block if pending else block
+        final = not block
+        marks = data.translate(CUT_TABLE)
+        start = 0
+        while True:
+            remaining = len(data) - start
+            # Mid-file, only cut with a full CHUNK_MAX window in view
+            if remaining == 0 or (not final and remaining < CHUNK_MAX):
+                break
+            if remaining <= CHUNK_MIN:
+                end = len(data)
+            else:
+                i = marks.find(CUT_MARK, start + CHUNK_MIN - len(CUT_MARK), start + CHUNK_MAX)
+                end = i + len(CUT_MARK) if i >= 0 else min(start + CHUNK_MAX, len(data))
+            yield data[start:end]
+            start = end
+        if final:
+            return
+        pending = data[start:]
+
+
+_compressor = None
+
+
+def _write_chunk(path: str, data: bytes, level: int) -> int:
+    """Compress and store one chunk (in a pool worker); returns bytes stored"""
+    global _compressor
+    if zstandard is not None:
+        if _compressor is None:
+            _compressor = zstandard.ZstdCompressor(level=level)
+        codec, payload = CODEC_ZSTD, _compressor.compress(data)
+    else:
+        codec, payload = CODEC_ZLIB, zlib.compress(data, min(max(level, 1), 9))
+    if len(payload) >= len(data):
+        codec, payload = CODEC_RAW, data
+    _write_atomic(path, codec + payload)
+    return len(payload) + 1
+
+
+def _read_chunk(root: str, sha: str) -> bytes:
+    with open(_chunk_path(root, sha), "rb") as f:
+        stored = f.read()
+    codec, payload = stored[:1], stored[1:]
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise SystemExit("Chunks are zstd-compressed: install python3-zstandard on this host")
+        data = zstandard.ZstdDecompressor().decompress(payload)
+    elif codec == CODEC_ZLIB:
+        data = zlib.decompress(payload)
+    elif codec == CODEC_RAW:
+        data = payload
+    else:
+        raise SystemExit(f"Chunk {sha} has unknown codec {codec!r}")
+    if hashlib.sha256(data).hexdigest() != sha:
+        raise SystemExit(f"Chunk {sha} is corrupt")
+    return data
+
+
+class ChunkStore:
+    """Adds chunks to the store; new ones are compressed and written by a process pool"""
+
+    def __init__(self, root: str, workers: int, level: int):
+        self.root = root
+        self.level = level
+        self._pool = ProcessPoolExecutor(max_workers=workers) if workers > 0 else None
+        # Bounds the chunk data queued for the pool
+        self._limit = max(workers, 1) * 8
+        self._inflight = collections.deque()
+        self._seen = set()
+        self.chunks = 0
+        self.new_chunks = 0
+        self.new_bytes = 0
+        self.stored_bytes = 0
+
+    def put(self, data: bytes) -> str:
+        sha = hashlib.sha256(data).hexdigest()
+        self.chunks += 1
+        if sha in self._seen:
+            return sha
+        self._seen.add(sha)
+        path = _chunk_path(self.root, sha)
+        if os.path.exists(path):
+            return sha
+        self.new_chunks += 1
+        self.new_bytes += len(data)
+        if self._pool is None:
+            self.stored_bytes += _write_chunk(path, data, self.level)
+            return sha
+        while len(self._inflight) >= self._limit:
+            self.stored_bytes += self._inflight.popleft().result()
+        self._inflight.append(self._pool.submit(_write_chunk, path, data, self.level))
+        return sha
+
+    def add_file(self, path: str):
+        """(chunk list, bytes, stat before, stat after) of one file"""
+        with open(path, "rb") as f:
+            before = os.fstat(f.fileno())
+            chunks, size = [], 0
+            for data in _chunks(f):
+                chunks.append(self.put(data))
+                size += len(data)
+            return chunks, size, before, os.fstat(f.fileno())
+
+    def close(self):
+        """Wait until every new chunk is on disk"""
+        try:
+            while self._inflight:
+                self.stored_bytes += self._inflight.popleft().result()
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+
+
+def _walk(base: str):
+    """(relative path, lstat) for every entry under base, directories first"""
+    for dirpath, dirnames, filenames in os.walk(base):
+        dirnames.sort()
+        rel_dir = os.path.relpath(dirpath, base)
+        rel_dir = "" if rel_dir == "." else rel_dir.replace(os.sep, "/") + "/"
+        for name in dirnames + sorted(filenames):
+            if name.endswith(SKIP_SUFFIXES):
+                continue
+            try:
+                yield rel_dir + name, os.lstat(os.path.join(dirpath, name))
+            except FileNotFoundError:
+                continue
+
+
+def _read_manifest(path: str):
+    try:
+        with gzip.open(path, "rt") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _snapshot_ids(root: str, server_id: str):
+    directory = _snapshot_dir(root, server_id)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(name[:-len(".json.gz")] for name in os.listdir(directory) if name.endswith(".json.gz"))
+
+
+def _load_snapshot(root: str, server_id: str, snapshot_id: str = None, at: float = None) -> dict:
+    """A snapshot by id, the newest taken at or before ``at``, or the latest"""
+    directory = _snapshot_dir(root, server_id)
+    if snapshot_id is None and at is None:
+        try:
+            with open(os.path.join(directory, "latest")) as f:
+                snapshot_id = f.read().strip()
+        except OSError:
+            raise SystemExit(f"No backups of server {server_id}")
+    if snapshot_id is None:
+        for candidate in reversed(_snapshot_ids(root, server_id)):
+            manifest = _read_manifest(os.path.join(directory, f"{candidate}.json.gz"))
+            if manifest is not None and manifest["created_at"] <= at:
+                return manifest
+        raise SystemExit(f"No backup of server {server_id} at or before {at}")
+    manifest = _read_manifest(os.path.join(directory, f"{_plain_name(snapshot_id, 'snapshot id')}.json.gz"))
+    if manifest is None:
+        raise SystemExit(f"No snapshot {snapshot_id} of server {server_id}")
+    return manifest
+
+
+def _summary(manifest: dict) -> dict:
+    return {**{k: v for k, v in manifest.items() if k != "dirs"}, "files": len(manifest["files"])}
+
+
+def backup(root: str, server_id: str, source: str, tag: str, workers: int, level: int, missing_ok: bool = False):
+    if not os.path.isdir(source):
+        if not missing_ok:
+            raise SystemExit(f"Nothing to back up at {source}")
+        # E.g. a server that never ran: no saves yet
+        emit("result", step="backup", snapshot=None, unchanged=True, missing=True, server_id=server_id)
+        return
+    started = time.time()
+    lock = _lock(root, exclusive=False)
+    try:
+        latest = os.path.join(_snapshot_dir(root, server_id), "latest")
+        previous = _load_snapshot(root, server_id) if os.path.exists(latest) else {}
+        before_files = previous.get("files", {})
+
+        entries = list(_walk(source))
+        dirs = [rel for rel, st in entries if stat.S_ISDIR(st.st_mode)]
+        regular = [(rel, st) for rel, st in entries if stat.S_ISREG(st.st_mode)]
+        progress = Progress("backup", len(regular), sum(st.st_size for _, st in regular))
+        files = {}
+        unchanged = changing = 0
+        store = ChunkStore(root, workers, level)
+        try:
+            for rel, st in regular:
+                before = before_files.get(rel)
+                if before and before[0] == st.st_size and before[1] == st.st_mtime_ns and before[3] == st.st_ino:
+                    files[rel] = before
+                    unchanged += 1
+                    progress.add(st.st_size)
+                    continue
+                # A file rewritten in place while being read is read again
+                for attempt in range(3):
+                    try:
+                        chunks, size, st_before, st_after = store.add_file(os.path.join(source, rel))
+                    except FileNotFoundError:
+                        chunks = None
+                        break
+                    if st_before.st_mtime_ns == st_after.st_mtime_ns and size == st_after.st_size:
+                        break
+                else:
+                    changing += 1
+                if chunks is not None:
+                    files[rel] = [size, st_after.st_mtime_ns, stat.S_IMODE(st_after.st_mode), st_after.st_ino, chunks]
+                progress.add(st.st_size)
+        finally:
+            store.close()
+
+        result = {
+            "server_id": server_id,
+            "files": len(files),
+            "bytes": sum(entry[0] for entry in files.values()),
+            "unchanged_files": unchanged,
+            "changing_files": changing,
+            "chunks": store.chunks,
+            "new_chunks": store.new_chunks,
+            "new_bytes": store.new_bytes,
+            "stored_bytes": store.stored_bytes,
+        }
+        if previous and files == before_files and dirs == previous.get("dirs"):
+            # Nothing changed: the previous snapshot still describes the saves
+            emit("result", step="backup", snapshot=previous["id"], unchanged=True,
+                 duration_s=round(time.time() - started, 3), **result)
+            return
+
+        snapshot_id = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime(started))
+        existing = set(_snapshot_ids(root, server_id))
+        n = 1
+        while (snapshot_id if n == 1 else f"{snapshot_id}-{n}") in existing:
+            n += 1
+        snapshot_id = snapshot_id if n == 1 else f"{snapshot_id}-{n}"
+        manifest = {"id": snapshot_id, "created_at": started, "tag": tag, "source": source, **result,
+                    "duration_s": round(time.time() - started, 3), "dirs": dirs, "files": files}
+        directory = _snapshot_dir(root, server_id)
+        _write_atomic(os.path.join(directory, f"{snapshot_id}.json.gz"),
+                      gzip.compress(json.dumps(manifest, separators=(",", ":")).encode(), 6))
+        _write_atomic(os.path.join(directory, "latest"), snapshot_id.encode())
+        emit("result", step="backup", snapshot=snapshot_id, unchanged=False, **_summary(manifest))
+    finally:
+        lock.close()
+
+
+def restore(root: str, server_id: str, target: str, snapshot_id: str = None, at: float = None,
+            delete: bool = False):
+    lock = _lock(root, exclusive=False)
+    try:
+        manifest = _load_snapshot(root, server_id, snapshot_id, at)
+        counts = {"written": 0, "unchanged": 0, "removed": 0}
+        os.makedirs(target, exist_ok=True)
+        for rel in manifest["dirs"]:
+            path = os.path.join(target, rel)
+            if os.path.lexists(path) and not os.path.isdir(path):
+                os.unlink(path)
+            os.makedirs(path, exist_ok=True)
+
+        files = manifest["files"]
+        progress = Progress("restore", len(files), manifest["bytes"])
+        for rel, (size, mtime_ns, mode, _, chunks) in files.items():
+            dst = os.path.join(target, rel)
+            try:
+                st = os.lstat(dst)
+            except FileNotFoundError:
+                st = None
+            if st is not None and stat.S_ISREG(st.st_mode) and st.st_size == size and st.st_mtime_ns == mtime_ns:
+                counts["unchanged"] += 1
+                progress.add(size)
+                continue
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            tmp = f"{dst}.zedin-restore"
+            with open(tmp, "wb") as f:
+                for sha in chunks:
+                    f.write(_read_chunk(root, sha))
+            os.chmod(tmp, mode)
+            os.utime(tmp, ns=(mtime_ns, mtime_ns))
+            if st is not None and stat.S_ISDIR(st.st_mode):
+                os.rmdir(dst)
+            os.replace(tmp, dst)
+            counts["written"] += 1
+            progress.add(size)
+
+        if delete:
+            # Saves written after the snapshot would otherwise mix with the restored ones
+            for rel, st in list(_walk(target)):
+                if not stat.S_ISDIR(st.st_mode) and rel not in files:
+                    os.unlink(os.path.join(target, rel))
+                    counts["removed"] += 1
+        emit("result", step="restore", snapshot=manifest["id"], created_at=manifest["created_at"],
+             files=len(files), bytes=manifest["bytes"], **counts)
+    finally:
+        lock.close()
+
+
+def list_snapshots(root: str, server_id: str):
+    directory = _snapshot_dir(root, server_id)
+    snapshots = []
+    for snapshot_id in _snapshot_ids(root, server_id):
+        manifest = _read_manifest(os.path.join(directory, f"{snapshot_id}.json.gz"))
+        if manifest is not None:
+            snapshots.append(_summary(manifest))
+    emit("result", step="list", server_id=server_id, snapshots=snapshots)
+
+
+def _retained(snapshots: list, keep_last: int, keep: dict) -> set:
+    """Ids to keep: the newest ``keep_last``, plus the newest per hour / day / week / month"""
+    newest_first = sorted(snapshots, key=lambda s: s["created_at"], reverse=True)
+    kept = {s["id"] for s in newest_first[:max(keep_last, 1)]}
+    for name, fmt in RETENTION_BUCKETS:
+        buckets = set()
+        for snapshot in newest_first:
+            if len(buckets) >= keep.get(name, 0):
+                break
+            bucket = time.strftime(fmt, time.gmtime(snapshot["created_at"]))
+            if bucket not in buckets:
+                buckets.add(bucket)
+                kept.add(snapshot["id"])
+    return kept
+
+
+def prune(root: str, server_ids, keep_last: int, keep: dict, gc: bool, nice: int):
+    lock = _lock(root, exclusive=True)
+    try:
+        snapshots_root = os.path.join(root, "snapshots")
+        servers = os.listdir(snapshots_root) if os.path.isdir(snapshots_root) else []
+        removed = 0
+        referenced = set()
+        for server_id in servers:
+            selected = not server_ids or server_id in server_ids
+            if not selected and not gc:
+                continue
+            directory = _snapshot_dir(root, server_id)
+            manifests = {}
+            for snapshot_id in _snapshot_ids(root, server_id):
+                manifest = _read_manifest(os.path.join(directory, f"{snapshot_id}.json.gz"))
+                if manifest is not None:
+                    manifests[snapshot_id] = manifest
+            kept = set(manifests)
+            if selected:
+                kept = _retained([_summary(m) for m in manifests.values()], keep_last, keep)
+                for snapshot_id in set(manifests) - kept:
+                    os.unlink(os.path.join(directory, f"{snapshot_id}.json.gz"))
+                    removed += 1
+            if gc:
+                for snapshot_id in kept:
+                    for entry in manifests[snapshot_id]["files"].values():
+                        referenced.update(entry[4])
+
+        chunks_removed = freed = 0
+        if gc:
+            os.nice(nice)
+            stale = time.time() - 86400
+            for dirpath, _, filenames in os.walk(os.path.join(root, "chunks")):
+                for name in filenames:
+                    path = os.path.join(dirpath, name)
+                    # Leftovers of an interrupted write are only removed once surely dead
+                    if name in referenced or (".tmp" in name and os.lstat(path).st_mtime > stale):
+                        continue
+                    freed += os.lstat(path).st_size
+                    os.unlink(path)
+                    chunks_removed += 1
+        emit("result", step="prune", snapshots_removed=removed, gc=gc,
+             chunks_removed=chunks_removed, bytes_freed=freed)
+    finally:
+        lock.close()
+
+
+def stats(root: str):
+    chunks = total = 0
+    for dirpath, _, filenames in os.walk(os.path.join(root, "chunks")):
+        for name in filenames:
+            chunks += 1
+            total += os.lstat(os.path.join(dirpath, name)).st_size
+    servers = {}
+    logical = 0
+    snapshots_root = os.path.join(root, "snapshots")
+    for server_id in os.listdir(snapshots_root) if os.path.isdir(snapshots_root) else []:
+        directory = _snapshot_dir(root, server_id)
+        ids = _snapshot_ids(root, server_id)
+        summaries = [_read_manifest(os.path.join(directory, f"{i}.json.gz")) for i in ids]
+        summaries = [m for m in summaries if m is not None]
+        if summaries:
+            logical += sum(m["bytes"] for m in summaries)
+            servers[server_id] = {"snapshots": len(summaries), "latest": summaries[-1]["id"],
+                                  "bytes": summaries[-1]["bytes"]}
+    emit("result", step="stats", chunks=chunks, chunk_bytes=total, snapshot_bytes=logical,
+         codec="zstd" if zstandard is not None else "zlib", servers=servers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deduplicating backups of server saves")
+    commands = parser.add_subparsers(dest="command", required=True)
+    p = commands.add_parser("backup")
+    p.add_argument("root")
+    p.add_argument("server_id")
+    p.add_argument("source")
+    p.add_argument("--tag", default="manual")
+    p.add_argument("--workers", type=int, default=2, help="compression processes (0: compress inline)")
+    p.add_argument("--level", type=int, default=3, help="zstd level (zlib: capped at 9)")
+    p.add_argument("--nice", type=int, default=10)
+    p.add_argument("--missing-ok", action="store_true", help="no source directory is not an error")
+    p = commands.add_parser("restore")
+    p.add_argument("root")
+    p.add_argument("server_id")
+    p.add_argument("target")
+    which = p.add_mutually_exclusive_group()
+    which.add_argument("--snapshot")
+    which.add_argument("--at", type=float, help="newest snapshot at or before this epoch time")
+    p.add_argument("--delete", action="store_true", help="remove files the snapshot doesn't have")
+    p = commands.add_parser("list")
+    p.add_argument("root")
+    p.add_argument("server_id")
+    p = commands.add_parser("prune")
+    p.add_argument("root")
+    p.add_argument("--server", action="append", default=[])
+    p.add_argument("--keep-last", type=int, default=1)
+    for name, _ in RETENTION_BUCKETS:
+        p.add_argument(f"--keep-{name}", type=int, default=0)
+    p.add_argument("--gc", action="store_true", help="delete chunks no snapshot references")
+    p.add_argument("--nice", type=int, default=10)
+    p = commands.add_parser("stats")
+    p.add_argument("root")
+    args = parser.parse_args()
+
+    if args.command == "backup":
+        os.nice(args.nice)
+        backup(args.root, args.server_id, args.source, args.tag, args.workers, args.level, args.missing_ok)
+    elif args.command == "restore":
+        restore(args.root, args.server_id, args.target, args.snapshot, args.at, args.delete)
+    elif args.command == "list":
+        list_snapshots(args.root, args.server_id)
+    elif args.command == "prune":
+        keep = {name: getattr(args, f"keep_{name}") for name, _ in RETENTION_BUCKETS}
+        prune(args.root, args.server, args.keep_last, keep, args.gc, args.nice)
+    else:
+        stats(args.root)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except OSError as e:
+        emit("error", error=str(e))
+        sys.exit(1)
@@ -0,0 +1,430 @@
+"""Content-addressed game file cache - runs on a managed host.
+
+Every server on a host installs the same game files (20-60 GB). SteamCMD
+downloads each app once per host into ``<root>/staging/<app id>``. That
+tree is ingested into a content-addressed store, and every server's
+``install_path`` is materialized from the store by reflink or hardlink::
+
+    <root>/objects/ab/abcdef...   file contents, named by sha256, read-only
+    <root>/builds/<app>/<build>.json   manifest: path -> [sha256, size, mode]
+    <root>/builds/<app>/latest    id of the newest manifest
+    <root>/index/<app>.json       (size, mtime, inode) -> sha256 of staging files
+    <root>/lock                   flock: shared by ingest/materialize, exclusive for gc
+
+Objects are never written in place:
+
+- A reflink (btrfs, XFS) gives the server block-level copy-on-write.
+- A hardlinked object is read-only, so a writer has to replace the file,
+  which gives it a private copy. Game servers must not run as root:
+  root would bypass that and write into every server's copy.
+
+Paths passed with ``--keep`` (configs, saves, mods) are never touched.
+Only files this tool placed are ever removed. Standard library only; it
+prints JSON lines for the backend::
+
+    python3 game_cache.py ingest <root> <app id>
+    python3 game_cache.py materialize <root> <app id> <install path> [--keep DIR ...] [--link auto] [--force]
+    python3 game_cache.py gc <root> <app id> [--keep-builds 2]
+    python3 game_cache.py stats <root>
+"""
+import argparse
+import errno
+import fcntl
+import hashlib
+import json
+import os
+import re
+import shutil
+import stat
+import sys
+import time
+
+# Linux FICLONE ioctl (reflink the whole file)
+FICLONE = 0x40049409
+STATE_FILE = ".zedin-cache.json"
+# Scratch and download directories of steamcmd, not game files
+SKIP_PREFIXES = ("steamapps/downloading/", "steamapps/temp/", "steamapps/shadercache/", "steamapps/workshop/")
+PROGRESS_INTERVAL = 0.5
+HASH_CHUNK = 1 << 20
+
+_reflink_ok = True
+
+
+def emit(event: str, **fields):
+    print(json.dumps({"event": event, **fields}), flush=True)
+
+
+class Progress:
+    """Throttled progress events"""
+
+    def __init__(self, step: str, total: int, bytes_total: int):
+        self.step = step
+        self.total = total
+        self.bytes_total = bytes_total
+        self.done = 0
+        self.bytes_done = 0
+        self._at = 0.0
+
+    def add(self, nbytes: int):
+        self.done += 1
+        self.bytes_done += nbytes
+        now = time.monotonic()
+        if now - self._at >= PROGRESS_INTERVAL or self.done == self.total:
+            self._at = now
+            emit("progress", step=self.step, done=self.done, total=self.total,
+                 bytes_done=self.bytes_done, bytes_total=self.bytes_total)
+
+
+def _lock(root: str, exclusive: bool):
+    # Shared for ingest/materialize, exclusive for gc: gc must not see objects
+    # of an ingest whose manifest is not written yet
+    os.makedirs(root, exist_ok=True)
+    f = open(os.path.join(root, "lock"), "a")
+    fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+    return f
+
+
+def _write_json(path: str, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def _read_json(path: str, default):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def _object_path(root: str, sha: str) -> str:
+    return os.path.join(root, "objects", sha[:2], sha)
+
+
+def _hash(path: str) -> str:
+    digest = hashlib.sha256()
+    buffer = bytearray(HASH_CHUNK)
+    view = memoryview(buffer)
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            digest.update(view[:n])
+    return digest.hexdigest()
+
+
+def _reflink(src: str, dst: str) -> bool:
+    global _reflink_ok
+    if not _reflink_ok:
+        return False
+    try:
+        with open(src, "rb") as s, open(dst, "wb") as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        return True
+    except OSError as e:
+        try:
+            os.unlink(dst)
+        except OSError:
+            pass
+        if e.errno in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.ENOSYS):
+            # Filesystem can't clone - don't try again for every file
+            _reflink_ok = False
+        return False
+
+
+def _place(src: str, dst: str, link: str) -> str:
+    """Put src at dst (dst must not exist); returns how: reflink / hardlink / copy"""
+    if link in ("auto", "reflink") and _reflink(src, dst):
+        return "reflink"
+    if link in ("auto", "hardlink"):
+        try:
+            os.link(src, dst)
+            return "hardlink"
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                raise
+    shutil.copyfile(src, dst)
+    return "copy"
+
+
+def _walk(base: str):
+    """(relative path, lstat) for every entry under base, directories first"""
+    for dirpath, dirnames, filenames in os.walk(base):
+        dirnames.sort()
+        rel_dir = os.path.relpath(dirpath, base)
+        rel_dir = "" if rel_dir == "." else rel_dir.replace(os.sep, "/") + "/"
+        for name in dirnames + sorted(filenames):
+            rel = rel_dir + name
+            if rel.startswith(SKIP_PREFIXES) or (rel + "/").startswith(SKIP_PREFIXES):
+                continue
+            yield rel, os.lstat(os.path.join(dirpath, name))
+
+
+def _build_id(staging: str, app_id: str) -> str:
+    acf = os.path.join(staging, "steamapps", f"appmanifest_{app_id}.acf")
+    try:
+        with open(acf, errors="replace") as f:
+            match = re.search(r'"buildid"\s+"(\d+)"', f.read())
+        if match:
+            return match.group(1)
+    except OSError:
+        pass
+    return ""
+
+
+def ingest(root: str, app_id: str):
+    staging = os.path.join(root, "staging", app_id)
+    if not os.path.isdir(staging):
+        raise SystemExit(f"No staging install at {staging}")
+    lock = _lock(root, exclusive=False)
+    try:
+        index_path = os.path.join(root, "index", f"{app_id}.json")
+        index = _read_json(index_path, {})
+        new_index = {}
+
+        entries = list(_walk(staging))
+        files, dirs, symlinks = {}, [], {}
+        regular = [(rel, st) for rel, st in entries if stat.S_ISREG(st.st_mode)]
+        progress = Progress("ingest", len(regular), sum(st.st_size for _, st in regular))
+        new_objects = new_bytes = 0
+
+        for rel, st in entries:
+            if stat.S_ISDIR(st.st_mode):
+                dirs.append(rel)
+            elif stat.S_ISLNK(st.st_mode):
+                symlinks[rel] = os.readlink(os.path.join(staging, rel))
+        for rel, st in regular:
+            src = os.path.join(staging, rel)
+            key = [st.st_size, st.st_mtime_ns, st.st_ino]
+            cached = index.get(rel)
+            sha = cached[3] if cached and cached[:3] == key else _hash(src)
+            new_index[rel] = key + [sha]
+            mode = 0o555 if st.st_mode & 0o111 else 0o444
+
+            obj = _object_path(root, sha)
+            if not os.path.exists(obj):
+                # Reflink or copy, never hardlink: steamcmd may patch staging files in place
+                os.makedirs(os.path.dirname(obj), exist_ok=True)
+                tmp = f"{obj}.tmp{os.getpid()}"
+                if not _reflink(src, tmp):
+                    shutil.copyfile(src, tmp)
+                os.chmod(tmp, mode)
+                os.replace(tmp, obj)
+                new_objects += 1
+                new_bytes += st.st_size
+            files[rel] = [sha, st.st_size, mode]
+            progress.add(st.st_size)
+
+        build_id = _build_id(staging, app_id)
+        if not build_id:
+            build_id = "h" + hashlib.sha256(json.dumps(files, sort_keys=True).encode()).hexdigest()[:16]
+        manifest = {
+            "app_id": app_id,
+            "build_id": build_id,
+            "created_at": time.time(),
+            "files": files,
+            "dirs": dirs,
+            "symlinks": symlinks,
+            "bytes": progress.bytes_total
+        }
+        builds = os.path.join(root, "builds", app_id)
+        _write_json(os.path.join(builds, f"{build_id}.json"), manifest)
+        with open(os.path.join(builds, "latest.tmp"), "w") as f:
+            f.write(build_id)
+        os.replace(os.path.join(builds, "latest.tmp"), os.path.join(builds, "latest"))
+        _write_json(index_path, new_index)
+        emit("result", step="ingest", build_id=build_id, files=len(files), bytes=manifest["bytes"],
+             new_objects=new_objects, new_bytes=new_bytes)
+    finally:
+        lock.close()
+
+
+def _load_manifest(root: str, app_id: str, build_id: str = None) -> dict:
+    builds = os.path.join(root, "builds", app_id)
+    if build_id is None:
+        try:
+            with open(os.path.join(builds, "latest")) as f:
+                build_id = f.read().strip()
+        except OSError:
+            raise SystemExit(f"No ingested build for app {app_id}")
+    manifest = _read_json(os.path.join(builds, f"{build_id}.json"), None)
+    if manifest is None:
+        raise SystemExit(f"Missing manifest {app_id}/{build_id}")
+    return manifest
+
+
+def _kept(rel: str, keep) -> bool:
+    return any(rel == k or rel.startswith(k + "/") for k in keep)
+
+
+def materialize(root: str, app_id: str, target: str, keep, link: str, build_id: str = None,
+                force: bool = False):
+    lock = _lock(root, exclusive=False)
+    try:
+        manifest = _load_manifest(root, app_id, build_id)
+        keep = [k.strip("/") for k in keep]
+        state_path = os.path.join(target, STATE_FILE)
+        previous = _read_json(state_path, {}).get("files", {})
+        placed = {}
+        counts = {"reflink": 0, "hardlink": 0, "copy": 0, "unchanged": 0, "removed": 0}
+
+        os.makedirs(target, exist_ok=True)
+        for rel in manifest["dirs"]:
+            if not _kept(rel, keep):
+                path = os.path.join(target, rel)
+                if os.path.lexists(path) and not os.path.isdir(path):
+                    os.unlink(path)
+                os.makedirs(path, exist_ok=True)
+
+        files = [(rel, entry) for rel, entry in manifest["files"].items() if not _kept(rel, keep)]
+        progress = Progress("materialize", len(files), sum(entry[1] for _, entry in files))
+        for rel, (sha, size, mode) in files:
+            dst = os.path.join(target, rel)
+            before = previous.get(rel)
+            try:
+                st = os.lstat(dst)
+            except FileNotFoundError:
+                st = None
+            if (not force and st is not None and before and before[0] == sha and stat.S_ISREG(st.st_mode)
+                    and st.st_size == size and st.st_mtime_ns == before[2]):
+                placed[rel] = before
+                counts["unchanged"] += 1
+                progress.add(size)
+                continue
+
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            tmp = f"{dst}.zedin-tmp"
+            if os.path.lexists(tmp):
+                os.unlink(tmp)
+            how = _place(_object_path(root, sha), tmp, link)
+            if how != "hardlink":
+                # Private copy: writable by the server like a normal install
+                os.chmod(tmp, 0o755 if mode & 0o111 else 0o644)
+            if st is not None and stat.S_ISDIR(st.st_mode):
+                shutil.rmtree(dst)
+            os.replace(tmp, dst)
+            counts[how] += 1
+            placed[rel] = [sha, size, os.lstat(dst).st_mtime_ns]
+            progress.add(size)
+
+        for rel, target_link in manifest["symlinks"].items():
+            if _kept(rel, keep):
+                continue
+            dst = os.path.join(target, rel)
+            if os.path.islink(dst) and os.readlink(dst) == target_link:
+                continue
+            if os.path.lexists(dst):
+                os.unlink(dst)
+            os.symlink(target_link, dst)
+
+        # Only remove files we placed before (never user files or kept dirs)
+        for rel in previous:
+            if rel not in placed and not _kept(rel, keep):
+                try:
+                    os.unlink(os.path.join(target, rel))
+                    counts["removed"] += 1
+                except FileNotFoundError:
+                    pass
+
+        _write_json(state_path, {"app_id": app_id, "build_id": manifest["build_id"], "files": placed})
+        emit("result", step="materialize", build_id=manifest["build_id"], files=len(files),
+             bytes=progress.bytes_total, **counts)
+    finally:
+        lock.close()
+
+
+def gc(root: str, app_id: str, keep_builds: int):
+    """Drop old manifests of one app and objects no kept manifest (of any app) references"""
+    lock = _lock(root, exclusive=True)
+    try:
+        builds_root = os.path.join(root, "builds")
+        app_builds = os.path.join(builds_root, app_id)
+        manifests = sorted(
+            (os.path.join(app_builds, name) for name in os.listdir(app_builds) if name.endswith(".json")),
+            key=os.path.getmtime, reverse=True
+        ) if os.path.isdir(app_builds) else []
+        for path in manifests[keep_builds:]:
+            os.unlink(path)
+
+        referenced = set()
+        for app in os.listdir(builds_root) if os.path.isdir(builds_root) else []:
+            for name in os.listdir(os.path.join(builds_root, app)):
+                if name.endswith(".json"):
+                    manifest = _read_json(os.path.join(builds_root, app, name), {})
+                    referenced.update(entry[0] for entry in manifest.get("files", {}).values())
+
+        removed = freed = 0
+        objects = os.path.join(root, "objects")
+        for dirpath, _, filenames in os.walk(objects):
+            for name in filenames:
+                if name not in referenced:
+                    path = os.path.join(dirpath, name)
+                    freed += os.lstat(path).st_size
+                    os.unlink(path)
+                    removed += 1
+        emit("result", step="gc", builds_removed=max(len(manifests) - keep_builds, 0),
+             objects_removed=removed, bytes_freed=freed)
+    finally:
+        lock.close()
+
+
+def stats(root: str):
+    objects = total = 0
+    for dirpath, _, filenames in os.walk(os.path.join(root, "objects")):
+        for name in filenames:
+            objects += 1
+            total += os.lstat(os.path.join(dirpath, name)).st_size
+    apps = {}
+    builds_root = os.path.join(root, "builds")
+    for app in os.listdir(builds_root) if os.path.isdir(builds_root) else []:
+        try:
+            manifest = _load_manifest(root, app)
+            apps[app] = {"build_id": manifest["build_id"], "files": len(manifest["files"]),
+                         "bytes": manifest["bytes"]}
+        except SystemExit:
+            continue
+    emit("result", step="stats", objects=objects, object_bytes=total, apps=apps)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Content-addressed game file cache")
+    commands = parser.add_subparsers(dest="command", required=True)
+    p = commands.add_parser("ingest")
+    p.add_argument("root")
+    p.add_argument("app_id")
+    p = commands.add_parser("materialize")
+    p.add_argument("root")
+    p.add_argument("app_id")
+    p.add_argument("target")
+    p.add_argument("--keep", action="append", default=[])
+    p.add_argument("--link", choices=("auto", "reflink", "hardlink", "copy"), default="auto")
+    p.add_argument("--build")
+    p.add_argument("--force", action="store_true", help="re-place unchanged files too")
+    p = commands.add_parser("gc")
+    p.add_argument("root")
+    p.add_argument("app_id")
+    p.add_argument("--keep-builds", type=int, default=2)
+    p = commands.add_parser("stats")
+    p.add_argument("root")
+    args = parser.parse_args()
+
+    if args.command == "ingest":
+        ingest(args.root, args.app_id)
+    elif args.command == "materialize":
+        materialize(args.root, args.app_id, args.target, args.keep, args.link, args.build, args.force)
+    elif args.command == "gc":
+        gc(args.root, args.app_id, args.keep_builds)
+    else:
+        stats(args.root)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except OSError as e:
+        emit("error", error=str(e))
+        sys.exit(1)
@@ -0,0 +1,121 @@
+"""Remote metrics agent - runs on every managed host.
+
+Samples CPU/memory/disk/network with the same ``MetricsSampler`` the
+backend uses for itself. Each sample goes out as a delta-encoded binary
+frame over one long-lived WebSocket, typically about 11 bytes per 2 s
+sample. Samples taken while the backend is unreachable are buffered
+(``AGENT_BUFFER`` samples) and sent after reconnecting.
+
+Run from the backend directory on the host (needs ``psutil``, ``websockets``
+and ``python-dotenv`` from requirements.txt)::
+
+    AGENT_SERVER_URL=ws://manager:8000/api/hosts/agent \\
+    AGENT_HOST_ID=<hosts.id> AGENT_KEY=<key> python -m agent.metrics_agent
+
+The key for a host is printed on the backend (needs AGENT_SECRET)::
+
+    python -m agent.metrics_agent keygen <hosts.id>
+"""
+import asyncio
+import json
+from collections import deque
+import os
+import platform
+import sys
+from urllib.parse import urlencode
+
+import websockets
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from services.metric_frames import FrameEncoder
+from services.metrics_sampler import MetricsSampler, history_values
+from services.timeseries import SYSTEM_METRICS
+
+AGENT_VERSION = 1
+AGENT_SERVER_URL = os.getenv("AGENT_SERVER_URL", "ws://localhost:8000/api/hosts/agent")
+AGENT_HOST_ID = os.getenv("AGENT_HOST_ID")
+AGENT_KEY = os.getenv("AGENT_KEY")
+AGENT_INTERVAL = float(os.getenv("AGENT_INTERVAL", "2"))
+# Samples kept while disconnected (oldest dropped first)
+AGENT_BUFFER = int(os.getenv("AGENT_BUFFER", "300"))
+AGENT_RETRY_MAX = 60
+
+
+async def run_agent(url: str, host_id: str, key: str, interval: float = AGENT_INTERVAL):
+    # Oldest first; a sample that could not be sent goes back to the front
+    samples: deque = deque(maxlen=AGENT_BUFFER)
+    available = asyncio.Event()
+
+    def on_snapshot(snapshot: dict):
+        samples.append((snapshot["timestamp"], history_values(snapshot)))
+        available.set()
+
+    sampler = MetricsSampler(interval=interval)
+    sampler.add_listener(on_snapshot)
+    sampler.start()
+
+    encoder = FrameEncoder(SYSTEM_METRICS)
+    target = f"{url}?{urlencode({'host_id': host_id, 'key': key})}"
+    backoff = 1
+    while True:
+        try:
+            # No per-message compression: deflate overhead exceeds a ~11 byte frame
+            async with websockets.connect(target, compression=None, ping_interval=30, max_size=2 ** 16) as ws:
+                await ws.send(json.dumps({
+                    "type": "hello",
+                    "metrics": SYSTEM_METRICS,
+                    "interval": interval,
+                    "platform": platform.platform(),
+                    "agent_version": AGENT_VERSION
+                }))
+                encoder.reset()
+                backoff = 1
+                print(f"✅ Connected to {url} as {host_id}", flush=True)
+
+                async def listen():
+                    async for message in ws:
+                        if message == "key":
+                            # Backend lost a frame - resend absolute values
+                            encoder.reset()
+
+                listener = asyncio.create_task(listen())
+                try:
+                    while True:
+                        while not samples:
+                            available.clear()
+                            await available.wait()
+                        if listener.done():
+                            listener.result()
+                            break
+                        sample = samples.popleft()
+                        try:
+                            await ws.send(encoder.encode(*sample))
+                        except BaseException:
+                            # Not delivered - send it first after reconnecting
+                            samples.appendleft(sample)
+                            raise
+                finally:
+                    listener.cancel()
+        except (OSError, websockets.WebSocketException) as e:
+            print(f"⚠️ Agent connection failed, retry in {backoff}s: {e}", flush=True)
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, AGENT_RETRY_MAX)
+
+
+def main():
+    if len(sys.argv) == 3 and sys.argv[1] == "keygen":
+        from services.host_metrics import agent_key
+        print(agent_key(sys.argv[2]))
+        return
+    if not AGENT_HOST_ID or not AGENT_KEY:
+        sys.exit("AGENT_HOST_ID and AGENT_KEY are required")
+    try:
+        asyncio.run(run_agent(AGENT_SERVER_URL, AGENT_HOST_ID, AGENT_KEY))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
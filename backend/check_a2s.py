@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""Exercise the A2S poller against local fake game servers (no game server needed).
+
+    python check_a2s.py [servers]
+
+Each fake answers A2S_INFO / A2S_PLAYERS on its own UDP port, after a
+simulated network delay. Like current Source servers, it demands a
+challenge before answering. Some fakes drop their first packets (to show
+resends), some split the player list into several packets, and some are
+down.
+"""
+import asyncio
+import struct
+import sys
+import time
+from dotenv import load_dotenv
+load_dotenv()
+
+from services.a2s import A2SPoller, HEADER_SIMPLE, HEADER_SPLIT
+
+LATENCY = 0.03
+CHALLENGE = b"\x12\x34\x56\x78"
+
+
+class FakeA2SServer(asyncio.DatagramProtocol):
+    def __init__(self, name: str, players: int = 5, drop: int = 0, split: int = 0, latency: float = LATENCY):
+        self.name = name
+        self.players = players
+        # Packets to ignore before answering, and split packet size (0 = never split)
+        self.drop = drop
+        self.split = split
+        self.latency = latency
+        self.transport = None
+        self.port = None
+        self.requests = 0
+
+    async def start(self):
+        self.transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+            lambda: self, local_addr=("127.0.0.1", 0)
+        )
+        self.port = self.transport.get_extra_info("sockname")[1]
+        return self
+
+    def info(self) -> bytes:
+        body = struct.pack("<B", 17)
+        for text in (self.name, "TheIsland", "ark_survival_evolved", "ARK: Survival Evolved"):
+            body += text.encode() + b"\x00"
+        body += struct.pack("<HBBBccBB", 0, self.players, 70, 0, b"d", b"l", 0, 1)
+        body += b"1.0.0.0\x00"
+        body += struct.pack("<BH", 0x80, 7777)
+        return HEADER_SIMPLE + b"I" + body
+
+    def player_list(self) -> bytes:
+        body = struct.pack("<B", self.players)
+        for i in range(self.players):
+            body += struct.pack("<B", i) + f"Survivor {i:03d}".encode() + b"\x00" + struct.pack("<lf", i, 60.0 * i)
+        return HEADER_SIMPLE + b"D" + body
+
+    def replies(self, data: bytes) -> list:
+        if data.startswith(HEADER_SIMPLE + b"T"):
+            challenge, reply = data[25:29], self.info()
+        elif data.startswith(HEADER_SIMPLE + b"U"):
+            challenge, reply = data[5:9], self.player_list()
+        else:
+            return []
+        if challenge != CHALLENGE:
+            return [HEADER_SIMPLE + b"A" + CHALLENGE]
+        if not self.split or len(reply) <= self.split:
+            return [reply]
+        parts = [reply[i:i + self.split] for i in range(0, len(reply), self.split)]
+        # Out of order on purpose
+        return [
+            HEADER_SPLIT + struct.pack("<lBBH", 7, len(parts), n, self.split) + part
+            for n, part in reversed(list(enumerate(parts)))
+        ]
+
+    def datagram_received(self, data, addr):
+        self.requests += 1
+        if self.drop > 0:
+            self.drop -= 1
+            return
+        loop = asyncio.get_running_loop()
+        for reply in self.replies(data):
+            loop.call_later(self.latency, self.transport.sendto, reply, addr)
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    fakes = [
+        await FakeA2SServer(f"srv{i:03d}", players=i % 71, drop=2 if i % 50 == 1 else 0,
+                            split=400 if i % 10 == 3 else 0).start()
+        for i in range(count)
+    ]
+    down = fakes[-3:]
+    for fake in down:
+        fake.transport.close()
+
+    poller = A2SPoller(timeout=0.5, retries=2)
+    poller.add_listener(lambda results: print(
+        f"   listener: {sum(r['online'] for r in results.values())}/{len(results)} online"
+    ))
+    servers = [{"id": fake.name, "hostname": "localhost", "query_port": fake.port} for fake in fakes]
+    try:
+        started = time.perf_counter()
+        results = await poller.poll_once(servers)
+        print(f"✅ First round ({count} servers, challenge handshake): "
+              f"{(time.perf_counter() - started) * 1000:.0f} ms")
+
+        started = time.perf_counter()
+        requests = sum(fake.requests for fake in fakes)
+        results = await poller.poll_once(servers)
+        print(f"✅ Second round (cached challenges): {(time.perf_counter() - started) * 1000:.0f} ms, "
+              f"{sum(fake.requests for fake in fakes) - requests} requests")
+
+        started = time.perf_counter()
+        await poller.query({fake.name: ("localhost", fake.port) for fake in fakes if fake not in down})
+        print(f"✅ Round without the down servers (nothing to wait out): {(time.perf_counter() - started) * 1000:.0f} ms")
+
+        lossy = results["srv001"]
+        print(f"✅ srv001 dropped two packets, answered on resend: online={lossy['online']} players={lossy['players']}")
+        split = results["srv013"]
+        assert len(split["player_list"]) == 13 and split["player_list"][-1]["name"] == "Survivor 012"
+        big = max((r for r in results.values() if r["online"]), key=lambda r: len(r["player_list"]))
+        print(f"✅ Split player lists reassembled: {big['name']} has {len(big['player_list'])} players")
+        offline = [name for name, r in results.items() if not r["online"]]
+        print(f"✅ Offline ({poller.status[offline[0]]['failures']} failed rounds): {offline}")
+
+        sample = dict(results["srv042"])
+        sample["player_list"] = sample["player_list"][:2]
+        print(f"\n📊 {sample}\n📊 {poller.stats()}")
+    finally:
+        await poller.stop()
+        for fake in fakes:
+            fake.transport.close()
+
+asyncio.run(main())
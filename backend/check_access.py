@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""Check role-based access to host and server endpoints (no database needed).
+
+    python check_access.py
+
+Signs tokens for a manager_admin and for customers (server_admin / user),
+then checks who may open the multi-host shell, who may read host
+internals, and who may manage, list and broadcast to servers owned by
+someone else. A token issued before the user's role changed must not
+keep its old role.
+"""
+import os
+import sys
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+load_dotenv()
+os.environ.setdefault("SUPABASE_URL", "http://localhost")
+os.environ.setdefault("SUPABASE_KEY", "check")
+os.environ["JWT_SECRET"] = os.environ["SECRET_KEY"] = "check-access-secret"
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from routers import hosts, servers, system, tokens
+from routers.auth import create_access_token
+from services.server_state import get_server_state
+from services.token_cache import token_cache
+from services.a2s import get_a2s_poller
+
+app = FastAPI()
+app.include_router(hosts.router, prefix="/api/hosts")
+app.include_router(servers.router, prefix="/api/servers")
+app.include_router(system.router, prefix="/api/system")
+client = TestClient(app)
+failures = 0
+
+
+def check(label: str, ok: bool):
+    global failures
+    failures += not ok
+    print(f"{'✅' if ok else '❌'} {label}")
+
+
+def token(user_id: str, role: str) -> str:
+    return create_access_token({"sub": user_id, "role": role})
+
+
+# One server, owned by "owner"; the database is faked
+SERVER = {"id": "srv1", "name": "Island", "server_type": "ASE", "status": "STOPPED", "host_id": None,
+          "install_path": "/srv/ark/srv1", "steamcmd_path": "steamcmd", "owner_id": "owner",
+          "rcon_port": 1, "rcon_password": "x", "hosts": None}
+# The user's profiles row: when their role last changed (None: never)
+PROFILE = {"role_changed_at": None}
+
+
+class FakeQuery:
+    def __init__(self, table: str):
+        self.table = table
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    async def execute(self):
+        return type("Result", (), {"data": [PROFILE if self.table == "profiles" else SERVER], "count": 1})()
+
+
+class FakeSupabase:
+    def table(self, name):
+        return FakeQuery(name)
+
+
+async def fake_supabase():
+    return FakeSupabase()
+
+
+async def current_role(user_id: str):
+    return "user"
+
+
+servers.get_async_supabase = tokens.get_async_supabase = fake_supabase
+# The auth admin API (asked when a role claim is not trusted) says everyone is a plain user
+tokens.get_user_role = current_role
+
+
+def exec_close_code(role: str):
+    """Close code of /exec for a token with this role (None: accepted)"""
+    try:
+        with client.websocket_connect(f"/api/hosts/exec?token={token('u-' + role, role)}") as ws:
+            ws.send_json({"hosts": {"host_ids": []}, "command": "true"})
+            ws.receive_json()
+            return None
+    except WebSocketDisconnect as e:
+        return e.code
+
+
+check("server_admin is refused the host shell (4403)", exec_close_code("server_admin") == 4403)
+check("user is refused the host shell (4403)", exec_close_code("user") == 4403)
+check("manager_admin is not refused", exec_close_code("manager_admin") != 4403)
+
+# Role changed after the token was issued, seen by a fresh process (empty cache)
+PROFILE["role_changed_at"] = datetime.now(timezone.utc).isoformat()
+token_cache.clear()
+check("manager_admin token from before a role change is refused (4403)", exec_close_code("manager_admin") == 4403)
+PROFILE["role_changed_at"] = None
+token_cache.clear()
+
+state = get_server_state()
+state._rows = {"srv1": {**state._from_db(SERVER), "hostname": None}}
+get_a2s_poller().status = {"srv1": {"online": True, "players": 3}}
+
+
+def get(path: str, user_id: str, role: str):
+    return client.get(path, params={"token": token(user_id, role)})
+
+
+for user_id, role, allowed in (("other", "server_admin", False), ("owner", "server_admin", True),
+                               ("ops", "manager_admin", True)):
+    who = f"{role} ({'owner' if user_id == 'owner' else 'not owner'})"
+    detail = get("/api/servers/srv1/install", user_id, role).json().get("detail")
+    check(f"{who}: server install status -> {detail!r}", (detail != "Server not found") == allowed)
+    visible = [row["id"] for row in get("/api/servers/state", user_id, role).json()["servers"]]
+    check(f"{who}: /state lists {visible}", (visible == ["srv1"]) == allowed)
+    live = list(get("/api/servers/live", user_id, role).json())
+    check(f"{who}: /live lists {live}", (live == ["srv1"]) == allowed)
+    status = client.post("/api/servers/srv1/rcon", params={"token": token(user_id, role)},
+                         json={"command": "ListPlayers"}).status_code
+    check(f"{who}: server RCON -> {status}", (status != 404) == allowed)
+
+status = client.post("/api/servers/rcon/broadcast", params={"token": token("owner", "server_admin")},
+                     json={"command": "ServerChat hi", "all": True}).status_code
+check(f"server_admin broadcast to all servers -> {status}", status == 403)
+
+for snapshot in ("../other-server/20261017T120000Z", "--delete"):
+    status = client.post("/api/servers/srv1/backups/restore", params={"token": token("owner", "server_admin")},
+                         json={"snapshot": snapshot}).status_code
+    check(f"restore of snapshot {snapshot!r} -> {status}", status == 400)
+
+# Operator-only views: host metrics and remote stats commands, metadata of every server
+ADMIN_ONLY = ["/api/hosts/metrics", "/api/hosts/h1/history", "/api/hosts/h1/backups", "/api/hosts/h1/game-cache",
+              "/api/hosts/ssh-stats", "/api/servers/backup-stats", "/api/servers/install-stats",
+              "/api/servers/rcon-stats", "/api/servers/a2s-stats", "/api/servers/state-stats",
+              "/api/servers/log-tail-stats", "/api/system/mail-stats", "/api/system/job-stats", "/api/system/expiry-stats"]
+for path in ADMIN_ONLY:
+    status = client.get(path).status_code
+    check(f"anonymous GET {path} -> {status}", status in (401, 403, 422))
+    status = get(path, "owner", "server_admin").status_code
+    check(f"server_admin GET {path} -> {status}", status == 403)
+status = get("/api/servers/backup-stats", "ops", "manager_admin").status_code
+check(f"manager_admin GET /api/servers/backup-stats -> {status}", status == 200)
+
+sys.exit(1 if failures else 0)
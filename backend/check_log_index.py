@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Exercise the log index on generated ARK logs (no game server needed).
+
+    python check_log_index.py [days] [lines per day]
+
+Writes weeks of ShooterGame logs (joins, chat, tribe kills, saves and
+engine noise) into a temp install, indexes them, appends and rotates like
+a restarting server, and times a few searches.
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from dotenv import load_dotenv
+load_dotenv()
+
+from services.log_index import LogIndexer
+
+PLAYERS = [f"Survivor{i}" for i in range(200)] + ["Bob the Builder"]
+TRIBES = [f"Tribe of {name}" for name in ("Rex", "Raptors", "Dodos", "Wyverns", "Argents")]
+DINOS = ["Rex", "Raptor", "Dodo", "Giganotosaurus", "Wyvern", "Argentavis"]
+
+
+def log_line(ts: float, rng: random.Random) -> str:
+    stamp = time.strftime("%Y.%m.%d_%H.%M.%S", time.gmtime(ts))
+    prefix = time.strftime("[%Y.%m.%d-%H.%M.%S", time.gmtime(ts)) + f":{int(ts * 1000) % 1000:03d}][{rng.randint(0, 999):3d}]"
+    player = rng.choice(PLAYERS)
+    roll = rng.random()
+    if roll < 0.05:
+        return f"{prefix}{stamp}: {player} joined this ARK!"
+    if roll < 0.10:
+        return f"{prefix}{stamp}: {player} left this ARK!"
+    if roll < 0.30:
+        return f"{prefix}{stamp}: steam_{player.lower()} ({player}): anyone seen a {rng.choice(DINOS)}?"
+    if roll < 0.40:
+        return (f"{prefix}{stamp}: Tribe {rng.choice(TRIBES)}, ID 1234: Day 17, 12:34:56: "
+                f"<RichColor Color=\"1, 0, 0, 1\">{player} - Lvl {rng.randint(1, 150)} was killed by a "
+                f"{rng.choice(DINOS)} - Lvl {rng.randint(1, 300)}!</>)")
+    if roll < 0.42:
+        return f"{prefix}LogSavegame: World Save Complete"
+    if roll < 0.45:
+        return f"{prefix}LogNet: Warning: Network failure for {player}"
+    return f"{prefix}LogShooterGame: tick {rng.randint(0, 10 ** 9)} replicated actors {rng.randint(0, 5000)}"
+
+
+def write_day(path: str, day_start: float, lines: int, rng: random.Random, mode: str = "a"):
+    step = 86400 / lines
+    with open(path, mode) as f:
+        f.write(f"Log file open, {time.strftime('%m/%d/%y %H:%M:%S', time.gmtime(day_start))} "
+                f"{rng.random()}\n" if mode == "w" else "")
+        for i in range(lines):
+            f.write(log_line(day_start + i * step, rng) + "\n")
+
+
+async def timed(label: str, coro):
+    started = time.perf_counter()
+    result = await coro
+    print(f"   {label}: {len(result['events'])} events in {(time.perf_counter() - started) * 1000:.1f} ms")
+    return result
+
+
+async def main():
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 21
+    per_day = int(sys.argv[2]) if len(sys.argv) > 2 else 30000
+    rng = random.Random(7)
+    root = tempfile.mkdtemp(prefix="log-index-")
+    logs = os.path.join(root, "ShooterGame", "Saved", "Logs")
+    os.makedirs(logs)
+    start = time.time() - days * 86400
+    # One backup log per server restart (daily), plus the live log
+    for day in range(days - 1):
+        path = os.path.join(logs, f"ShooterGame_Backup-{day:03d}.log")
+        write_day(path, start + day * 86400, per_day, rng, mode="w")
+        os.utime(path, (start + (day + 1) * 86400,) * 2)
+    live = os.path.join(logs, "ShooterGame.log")
+    write_day(live, start + (days - 1) * 86400, per_day, rng, mode="w")
+    size = sum(os.path.getsize(os.path.join(logs, name)) for name in os.listdir(logs))
+
+    indexer = LogIndexer(directory=os.path.join(root, "index"), interval=0)
+    server = {"id": "srv1", "install_path": root}
+    run = await indexer.index_server(server, None)
+    print(f"✅ First run: {run['lines']} lines / {size / 1e6:.0f} MB from {run['files']} files "
+          f"in {run['duration_s']:.1f} s")
+
+    run = await indexer.index_server(server, None)
+    print(f"✅ Nothing new: {run['lines']} lines, {run['bytes']} bytes read in {run['duration_s'] * 1000:.0f} ms")
+
+    with open(live, "a") as f:
+        f.write(log_line(time.time(), rng) + "\n" + log_line(time.time(), rng) + "\nhalf a li")
+    run = await indexer.index_server(server, None)
+    print(f"✅ Appended: {run['lines']} lines indexed (the unterminated one waits)")
+
+    # Restart: the live log becomes a backup, a new one starts
+    with open(live, "a") as f:
+        f.write("ne\n")
+    os.rename(live, os.path.join(logs, f"ShooterGame_Backup-{days:03d}.log"))
+    write_day(live, time.time() - 60, 10, rng, mode="w")
+    run = await indexer.index_server(server, None)
+    print(f"✅ Rotated: {run['lines']} lines indexed (1 from the renamed log, 10 from the new one)")
+
+    stats = await indexer.stats("srv1")
+    print(f"\n📊 {stats['events']} events, index {stats['bytes'] / 1e6:.0f} MB, {len(stats['sources'])} files\n")
+    await timed("player 'Bob the Builder', all time", indexer.search("srv1", player="Bob the Builder", limit=100))
+    await timed("text 'Giganotosaurus', last 7 days", indexer.search("srv1", text="Giganotosaurus", since=time.time() - 7 * 86400))
+    await timed("joins last 24h", indexer.search("srv1", kind="join", since=time.time() - 86400, limit=500))
+    await timed("kills by 'Tribe of Rex' in week 1", indexer.search(
+        "srv1", text='"Tribe of Rex"', kind="kill", since=start, until=start + 7 * 86400))
+    page = await timed("prefix 'Survivor1*' + 'Wyvern', page 1", indexer.search("srv1", text="Survivor1* Wyvern", limit=50))
+    cursor = tuple(float(part) if i == 0 else int(part) for i, part in enumerate(page["next_cursor"].split(",")))
+    page2 = await timed("... page 2", indexer.search("srv1", text="Survivor1* Wyvern", limit=50, cursor=cursor))
+    assert not {e["id"] for e in page["events"]} & {e["id"] for e in page2["events"]}
+    print(f"   e.g. {page['events'][0]['kind']} / {page['events'][0]['player']} / {page['events'][0]['line'][:80]}")
+    await indexer.stop()
+
+asyncio.run(main())
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Exercise the log tail service on local fake server installs (no game server needed).
+
+    python check_log_tail.py [servers]
+
+Creates install directories in a temp dir, follows every server's
+ShooterGame.log, and writes to them like a running server would,
+including rotation at restart, truncation, and a server whose Logs
+directory doesn't exist yet.
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from dotenv import load_dotenv
+load_dotenv()
+
+from services.log_tail import LogTailService, LOG_TAIL_FILES
+
+
+def write(path: str, lines, mode: str = "a"):
+    with open(path, mode) as f:
+        f.writelines(f"{line}\n" for line in lines)
+
+
+async def frames(sub, count: int, timeout: float = 2) -> list:
+    result = []
+    while len(result) < count:
+        result.append(json.loads(await asyncio.wait_for(sub.get(), timeout)))
+    return result
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    root = tempfile.mkdtemp(prefix="log-tail-")
+    servers = []
+    for i in range(count):
+        install = os.path.join(root, f"server{i}")
+        log = os.path.join(install, LOG_TAIL_FILES[0])
+        if i > 0:
+            os.makedirs(os.path.dirname(log))
+            write(log, [f"[2024.01.01-00.00.00:000][  0]old line {n}" for n in range(5000)])
+        servers.append({"id": f"srv{i}", "install_path": install, "log": log})
+
+    service = LogTailService()
+    started = time.perf_counter()
+    logs = [await service.watch(server, None) for server in servers]
+    print(f"✅ Watching {count} logs in {(time.perf_counter() - started) * 1000:.0f} ms, "
+          f"backlog of srv1: {len(logs[1].lines)} lines (last: {logs[1].lines[-1][2]!r})")
+    subs = [log.channel.subscribe() for log in logs]
+
+    started = time.perf_counter()
+    for server in servers[1:]:
+        write(server["log"], [f"{server['id']}: player joined", f"{server['id']}: SaveWorld"])
+    received = await asyncio.gather(*(frames(sub, 1) for sub in subs[1:]))
+    lines = sum(len(frame["lines"]) for batch in received for frame in batch)
+    print(f"✅ {lines} live lines from {count - 1} servers in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    # Partial line: only delivered once its newline is written
+    with open(servers[1]["log"], "a") as f:
+        f.write("half a li")
+        f.flush()
+        await asyncio.sleep(0.05)
+        f.write("ne\n")
+    print(f"✅ Partial write joined: {(await frames(subs[1], 1))[0]['lines'][0][2]!r}")
+
+    # Restart: ShooterGame.log -> ShooterGame_Last.log, then a new ShooterGame.log
+    log = servers[2]["log"]
+    write(log, ["last words before shutdown"])
+    os.rename(log, log.replace("ShooterGame.log", "ShooterGame_Last.log"))
+    write(log, ["Log file open", "Server started"], mode="w")
+    events = await frames(subs[2], 3)
+    print(f"✅ Rotation: {[frame['type'] for frame in events]} -> {[line[2] for line in events[-1]['lines']]}")
+
+    # Truncation in place
+    log = servers[3]["log"]
+    write(log, ["after truncation"], mode="w")
+    events = await frames(subs[3], 2)
+    print(f"✅ Truncation: {[frame['type'] for frame in events]} -> {events[-1]['lines'][0][2]!r}")
+
+    # Server 0 has no Logs directory yet: it is waited for, not polled
+    os.makedirs(os.path.dirname(servers[0]["log"]))
+    write(servers[0]["log"], ["first start"])
+    print(f"✅ Log directory created later: {(await frames(subs[0], 1))[0]['lines'][0][2]!r}")
+
+    stats = service.stats()
+    print(f"\n📊 {stats['local']}, threads: {threading.active_count()}")
+    for sub in subs:
+        sub.close()
+    await service.close()
+
+asyncio.run(main())
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Exercise the pooled mailer against a local SMTP sink (no mail server needed).
+
+    pip install aiosmtpd && python check_mailer.py
+
+The sink accepts everything except recipients at refused.example, and
+can be slowed down to simulate a stalled relay. Checks that the pool reuses
+its connections, that refused recipients are not retried, and that
+``stop()`` resolves every waiting sender even when it gives up mid-batch.
+"""
+import asyncio
+import socket
+import time
+from email.message import EmailMessage
+from dotenv import load_dotenv
+load_dotenv()
+
+from aiosmtpd.controller import Controller
+
+from services.mailer import Mailer, OutboxFull
+
+failures = 0
+
+
+def check(label: str, ok: bool):
+    global failures
+    failures += not ok
+    print(f"{'✅' if ok else '❌'} {label}")
+
+
+class Sink:
+    def __init__(self):
+        self.received = 0
+        self.delay = 0.0
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.endswith("@refused.example"):
+            return "550 No such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.received += 1
+        return "250 Message accepted"
+
+
+def message(to: str, n: int) -> EmailMessage:
+    msg = EmailMessage()
+    msg["From"] = "check@localhost"
+    msg["To"] = to
+    msg["Subject"] = f"check {n}"
+    msg.set_content("hello")
+    return msg
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def mailer_for(controller: Controller, **kwargs) -> Mailer:
+    return Mailer(hostname=controller.hostname, port=controller.port, username="", password="",
+                  start_tls=False, retry_base=0.05, **kwargs)
+
+
+async def main():
+    sink = Sink()
+    controller = Controller(sink, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    try:
+        mailer = mailer_for(controller, pool_size=2)
+        started = time.perf_counter()
+        await asyncio.gather(*(mailer.send(message(f"user{n}@localhost", n)) for n in range(50)))
+        elapsed = time.perf_counter() - started
+        check(f"50 messages delivered in {elapsed * 1000:.0f} ms", sink.received == 50 and mailer.sent == 50)
+        check(f"pooled: {mailer.connects} SMTP sessions for 50 messages", mailer.connects <= 2)
+
+        try:
+            await mailer.send(message("nobody@refused.example", 0))
+            refused = False
+        except Exception:
+            refused = True
+        check(f"refused recipient fails without retries (retries={mailer.retries})",
+              refused and mailer.retries == 0)
+        await mailer.stop()
+
+        # Stalled relay: stop() gives up while workers are mid-batch
+        sink.delay = 0.2
+        sink.received = 0
+        mailer = mailer_for(controller, pool_size=1, batch_size=10)
+        futures = [mailer.enqueue(message(f"slow{n}@localhost", n), wait=True) for n in range(15)]
+        await asyncio.sleep(0.05)
+        await mailer.stop(drain_timeout=0.5)
+        done = await asyncio.wait_for(asyncio.gather(*futures, return_exceptions=True), 5)
+        dropped = sum(isinstance(result, OutboxFull) for result in done)
+        check(f"stop mid-batch resolves every sender ({mailer.sent} sent, {dropped} dropped)",
+              mailer.sent + dropped == 15 and dropped > 0)
+        check(f"dropped messages counted as failed (failed={mailer.failed})", mailer.failed == dropped)
+    except asyncio.TimeoutError:
+        check("stop mid-batch left senders waiting", False)
+    finally:
+        controller.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
+    raise SystemExit(1 if failures else 0)
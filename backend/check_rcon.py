@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""Exercise the RCON pool against local fake RCON servers (no game server needed).
+
+    python check_rcon.py
+
+The fake speaks Source RCON like ARK's server does. It answers commands in
+order after a simulated network delay, splits long responses into 4096
+byte packets, and mirrors the empty terminator packet. It also drops
+connections on "crash".
+"""
+import asyncio
+import struct
+import time
+from dotenv import load_dotenv
+load_dotenv()
+
+from services.fanout import summarize
+from services.rcon import (
+    RCONPool, RCONAuthError, encode_packet, read_packet,
+    SERVERDATA_AUTH, SERVERDATA_AUTH_RESPONSE, SERVERDATA_RESPONSE_VALUE
+)
+
+PASSWORD = "secret"
+LATENCY = 0.05
+
+
+class FakeRCONServer:
+    def __init__(self, name: str, latency: float = LATENCY):
+        self.name = name
+        self.latency = latency
+        self.commands = 0
+        self.connections = 0
+        self.server = None
+        self.port = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        outbox: asyncio.Queue = asyncio.Queue()
+
+        async def send_later():
+            # Responses leave in order, each `latency` after its request was read
+            while True:
+                ready_at, data = await outbox.get()
+                await asyncio.sleep(max(ready_at - time.monotonic(), 0))
+                writer.write(data)
+                await writer.drain()
+
+        sender = asyncio.create_task(send_later())
+        try:
+            while True:
+                request_id, kind, body = await read_packet(reader)
+                ready_at = time.monotonic() + self.latency
+                if kind == SERVERDATA_AUTH:
+                    ok = body.decode() == PASSWORD
+                    reply = encode_packet(request_id, SERVERDATA_RESPONSE_VALUE, "")
+                    reply += encode_packet(request_id if ok else -1, SERVERDATA_AUTH_RESPONSE, "")
+                    outbox.put_nowait((ready_at, reply))
+                    continue
+                if kind == SERVERDATA_RESPONSE_VALUE:
+                    # Terminator: mirror it, then the odd 0x0100 packet Source servers send
+                    reply = encode_packet(request_id, SERVERDATA_RESPONSE_VALUE, "")
+                    reply += struct.pack("<iii", 14, request_id, SERVERDATA_RESPONSE_VALUE) + b"\x00\x01\x00\x00\x00\x00"
+                    outbox.put_nowait((ready_at, reply))
+                    continue
+                self.commands += 1
+                command = body.decode()
+                if command == "crash":
+                    break
+                if command.startswith("long "):
+                    text = "".join(f"player{i:05d}\n" for i in range(int(command.split()[1])))
+                else:
+                    text = f"{self.name}: {command}"
+                for start in range(0, max(len(text), 1), 4096):
+                    outbox.put_nowait((ready_at, encode_packet(request_id, SERVERDATA_RESPONSE_VALUE, text[start:start + 4096])))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            # Let queued replies go out, then drop the connection
+            await asyncio.sleep(self.latency * 2)
+            sender.cancel()
+            writer.close()
+
+
+def target(server: FakeRCONServer, password: str = PASSWORD) -> dict:
+    return {"id": server.name, "name": server.name, "hostname": "127.0.0.1",
+            "rcon_port": server.port, "rcon_password": password}
+
+
+async def main():
+    servers = [await FakeRCONServer(f"srv{i}").start() for i in range(20)]
+    pool = RCONPool()
+    first = target(servers[0])
+    try:
+        started = time.perf_counter()
+        print(f"✅ {await pool.command(first, 'ListPlayers')!r} "
+              f"(connect + auth + command: {(time.perf_counter() - started) * 1000:.0f} ms)")
+
+        started = time.perf_counter()
+        for i in range(10):
+            await pool.command(first, f"echo {i}")
+        sequential = time.perf_counter() - started
+        started = time.perf_counter()
+        replies = await asyncio.gather(*(pool.command(first, f"echo {i}") for i in range(50)))
+        pipelined = time.perf_counter() - started
+        assert replies == [f"srv0: echo {i}" for i in range(50)]
+        print(f"✅ 10 sequential commands: {sequential * 1000:.0f} ms, "
+              f"50 pipelined: {pipelined * 1000:.0f} ms (one connection, replies matched by id)")
+
+        reply = await pool.command(first, "long 2000")
+        print(f"✅ Multi-packet response: {len(reply)} bytes, {reply.count(chr(10))} lines")
+
+        try:
+            await pool.command(first, "crash")
+        except Exception as e:
+            print(f"✅ Connection dropped mid-command: {type(e).__name__}: {e}")
+        print(f"✅ Reconnected: {await pool.command(first, 'ListPlayers')!r} "
+              f"(connections to srv0: {servers[0].connections})")
+
+        try:
+            await pool.command(target(servers[1], "wrong"), "ListPlayers")
+        except RCONAuthError as e:
+            print(f"✅ Wrong password refused: {e}")
+
+        targets = [target(server) for server in servers]
+        # srv1 is still backing off after its failed login; srv2 gets a wrong password now
+        targets[1]["rcon_password"] = targets[2]["rcon_password"] = "wrong"
+        targets.append({"id": "dead", "name": "dead", "hostname": "127.0.0.1", "rcon_port": 1, "rcon_password": PASSWORD})
+        started = time.perf_counter()
+        rows = await pool.broadcast(targets, "ServerChat Restart in 5 minutes", timeout=2)
+        print(f"✅ Broadcast to {len(rows)} servers in {(time.perf_counter() - started) * 1000:.0f} ms: "
+              f"{summarize(rows)['by_status']}")
+
+        print(f"\n📊 {pool.stats()['srv0']}")
+    finally:
+        await pool.close()
+        for server in servers:
+            server.server.close()
+        # Let the fake servers notice the closed connections
+        await asyncio.sleep(LATENCY * 3)
+
+asyncio.run(main())
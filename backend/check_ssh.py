@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""Exercise the SSH pool against a real sshd (localhost by default).
+
+    SSH_TEST_HOST=127.0.0.1 SSH_TEST_USER=$USER SSH_TEST_KEY=~/.ssh/id_ed25519 python check_ssh.py
+"""
+import asyncio
+import os
+import time
+from dotenv import load_dotenv
+load_dotenv()
+
+from services.ssh_pool import SSHPool, SSHUnavailable
+
+host = {
+    "id": "check",
+    "hostname": os.getenv("SSH_TEST_HOST", "127.0.0.1"),
+    "port": int(os.getenv("SSH_TEST_PORT", "22")),
+    "username": os.getenv("SSH_TEST_USER", os.getenv("USER", "root")),
+    "ssh_key_path": os.getenv("SSH_TEST_KEY")
+}
+
+async def main():
+    pool = SSHPool()
+    print(f"Connecting to {host['username']}@{host['hostname']}:{host['port']}...")
+    try:
+        started = time.perf_counter()
+        result = await pool.run(host, "uname -a")
+        print(f"✅ First command (handshake + channel): {(time.perf_counter() - started) * 1000:.1f} ms")
+        print(f"   {result.stdout.strip()}")
+
+        started = time.perf_counter()
+        for _ in range(20):
+            await pool.run(host, "true")
+        print(f"✅ Pooled commands: {(time.perf_counter() - started) * 1000 / 20:.1f} ms each")
+
+        started = time.perf_counter()
+        await asyncio.gather(*(pool.run(host, "sleep 0.5") for _ in range(pool.max_channels * 2)))
+        print(f"✅ {pool.max_channels * 2} x sleep 0.5 over {pool.max_channels} channels: "
+              f"{time.perf_counter() - started:.2f} s")
+
+        async with pool.process(host, "for i in 1 2 3; do echo line $i; sleep 0.2; done") as process:
+            async for line in process.stdout:
+                print(f"   📨 {line.rstrip()}")
+
+        print(f"\n📊 {pool.stats()}")
+    except SSHUnavailable as e:
+        print(f"❌ {e}")
+    finally:
+        await pool.close()
+
+asyncio.run(main())
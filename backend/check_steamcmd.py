@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""Run SteamCMD install jobs against fake_steamcmd.py (no Steam, no database).
+
+    python check_steamcmd.py
+
+Starts three installs on one host with STEAMCMD_PER_HOST=1 (the first one
+fails once and is retried), prints their progress frames and the status
+transitions each server goes through. Then installs three servers through
+the shared game file cache (GAME_CACHE_ROOT) and updates one of them.
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from dotenv import load_dotenv
+load_dotenv()
+
+os.environ.setdefault("FAKE_STEAMCMD_DELAY", "0.01")
+os.environ.setdefault("FAKE_STEAMCMD_FAIL", "1")
+
+import services.steamcmd as steamcmd
+from services.steamcmd import SteamCMDManager, InstallConflict
+
+steamcmd.STEAMCMD_RETRY_DELAY = 0.2
+FAKE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_steamcmd.py")
+
+statuses = {}
+
+async def set_status(server_id, status, only_from=None):
+    current = statuses.get(server_id, "NOT_INSTALLED")
+    if only_from is not None and current not in only_from:
+        return False
+    print(f"   🔁 server {server_id}: {current} -> {status}")
+    statuses[server_id] = status
+    return True
+
+async def watch(job):
+    frames = 0
+    with job.channel.subscribe() as sub:
+        async for frame in sub:
+            frames += 1
+            event = json.loads(frame)
+            if event["type"] == "state":
+                print(f"   📨 {job.server_id}: {event['state']} (attempt {event['attempt']})")
+            elif event["percent"] == 100.0:
+                print(f"   📨 {job.server_id}: {event['phase']} 100% ({len(event['lines'])} new lines)")
+    print(f"   📨 {job.server_id}: stream closed after {frames} frames")
+
+async def main():
+    manager = SteamCMDManager(per_host=1, on_status=set_status)
+    with tempfile.TemporaryDirectory() as root:
+        servers = [{
+            "id": f"srv{i}",
+            "server_type": "ASE",
+            "status": "NOT_INSTALLED",
+            "install_path": os.path.join(root, f"srv{i}"),
+            "steamcmd_path": FAKE
+        } for i in range(3)]
+        # The fake fails only on the first run per install dir
+        os.makedirs(servers[1]["install_path"])
+        os.makedirs(servers[2]["install_path"])
+        for server in servers[1:]:
+            with open(os.path.join(server["install_path"], ".fake_steamcmd_runs"), "w") as f:
+                f.write("1")
+
+        jobs = [await manager.start(server) for server in servers]
+        try:
+            await manager.start(servers[0])
+        except InstallConflict as e:
+            print(f"✅ Second install of srv0 refused: {e}")
+        print(f"📊 {manager.stats()}")
+
+        watchers = [asyncio.create_task(watch(job)) for job in jobs]
+        await asyncio.gather(*(job.task for job in jobs))
+        await asyncio.gather(*watchers)
+
+        for job in jobs:
+            took = job.finished_at - job.started_at
+            print(f"{'✅' if job.state == 'done' else '❌'} {job.server_id}: {job.state} after "
+                  f"{job.attempt} attempt(s), {took:.2f} s, {job.bytes_total} bytes")
+        print(f"📊 Final statuses: {statuses}")
+
+def disk_usage(*paths):
+    """Bytes used by distinct inodes under paths (hardlinks counted once)"""
+    seen, total = set(), 0
+    for path in paths:
+        for dirpath, _, filenames in os.walk(path):
+            for name in filenames:
+                st = os.lstat(os.path.join(dirpath, name))
+                if st.st_ino not in seen:
+                    seen.add(st.st_ino)
+                    total += st.st_size
+    return total
+
+async def cache_demo():
+    print("\n🗄️  Shared game file cache")
+    os.environ["FAKE_STEAMCMD_FAIL"] = "0"
+    manager = SteamCMDManager(per_host=1, on_status=set_status)
+    with tempfile.TemporaryDirectory() as root:
+        steamcmd.GAME_CACHE_ROOT = os.path.join(root, "cache")
+        servers = [{
+            "id": f"cached{i}",
+            "server_type": "ASE",
+            "status": "NOT_INSTALLED",
+            "install_path": os.path.join(root, f"cached{i}"),
+            "steamcmd_path": FAKE
+        } for i in range(3)]
+        saved = os.path.join(servers[0]["install_path"], "ShooterGame", "Saved")
+        os.makedirs(saved)
+        with open(os.path.join(saved, "GameUserSettings.ini"), "w") as f:
+            f.write("[ServerSettings]\n")
+
+        for server in servers:
+            job = await manager.start(server)
+            await job.task
+            print(f"{'✅' if job.state == 'done' else '❌'} {job.server_id}: {job.state} in "
+                  f"{job.finished_at - job.started_at:.2f} s - {job.cache.get('materialize')}")
+
+        os.environ["FAKE_STEAMCMD_BUILD"] = "1001"
+        job = await manager.start({**servers[0], "status": "STOPPED"})
+        await job.task
+        print(f"{'✅' if job.state == 'done' else '❌'} update of {job.server_id}: {job.cache}")
+        print(f"   Saved/ kept: {os.listdir(saved)}")
+
+        installs = [server["install_path"] for server in servers]
+        print(f"📊 Game files: {disk_usage(installs[0]) / 1e6:.1f} MB per server, "
+              f"{disk_usage(*installs) / 1e6:.2f} MB for all servers, "
+              f"cache {disk_usage(steamcmd.GAME_CACHE_ROOT) / 1e6:.1f} MB")
+
+asyncio.run(main())
+asyncio.run(cache_demo())
@@ -0,0 +1,83 @@
+-- User profiles: indexed mirror of auth.users for lookups by email
+-- (the admin API can only list users page by page)
+CREATE TABLE IF NOT EXISTS public.profiles (
+    id UUID PRIMARY KEY REFERENCES auth.users(id) ON DELETE CASCADE,
+    email TEXT NOT NULL,
+    username TEXT,
+    role TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Unique email index (emails are stored lower-cased; backend queries lower-cased)
+CREATE UNIQUE INDEX IF NOT EXISTS idx_profiles_email ON public.profiles(email);
+
+-- Role (mirrors app_metadata.role, which only the service role can write) for fan-out notifications to a role
+ALTER TABLE public.profiles ADD COLUMN IF NOT EXISTS role TEXT;
+CREATE INDEX IF NOT EXISTS idx_profiles_role ON public.profiles(role);
+
+-- Last role change: access tokens issued before it no longer carry a trusted role
+ALTER TABLE public.profiles ADD COLUMN IF NOT EXISTS role_changed_at TIMESTAMP WITH TIME ZONE;
+
+-- Enable Row Level Security
+ALTER TABLE public.profiles ENABLE ROW LEVEL SECURITY;
+
+-- Policy: Service role can do everything
+CREATE POLICY "Service role can manage profiles"
+    ON public.profiles
+    FOR ALL
+    TO service_role
+    USING (true)
+    WITH CHECK (true);
+
+-- Policy: Users can view their own profile
+CREATE POLICY "Users can view own profile"
+    ON public.profiles
+    FOR SELECT
+    TO authenticated
+    USING (auth.uid() = id);
+
+-- Keep profiles in sync with auth.users (insert + email/username/role changes)
+CREATE OR REPLACE FUNCTION sync_profile_from_auth_user()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.email IS NULL THEN
+        RETURN NEW;
+    END IF;
+    INSERT INTO public.profiles (id, email, username, role)
+    VALUES (NEW.id, lower(NEW.email), NEW.raw_user_meta_data->>'username', NEW.raw_app_meta_data->>'role')
+    ON CONFLICT (id) DO UPDATE
+        SET email = EXCLUDED.email,
+            username = EXCLUDED.username,
+            role = EXCLUDED.role,
+            role_changed_at = CASE
+                WHEN public.profiles.role IS DISTINCT FROM EXCLUDED.role THEN NOW()
+                ELSE public.profiles.role_changed_at
+            END,
+            updated_at = NOW();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+DROP TRIGGER IF EXISTS on_auth_user_synced ON auth.users;
+CREATE TRIGGER on_auth_user_synced
+    AFTER INSERT OR UPDATE OF email, raw_user_meta_data, raw_app_meta_data ON auth.users
+    FOR EACH ROW EXECUTE FUNCTION sync_profile_from_auth_user();
+
+-- One-time migration: roles used to live in user_metadata, which users can edit
+-- themselves. Move them to app_metadata (service role only), then drop the copy.
+UPDATE auth.users
+SET raw_app_meta_data = coalesce(raw_app_meta_data, '{}'::jsonb) || jsonb_build_object('role', raw_user_meta_data->>'role')
+WHERE raw_user_meta_data ? 'role'
+  AND NOT coalesce(raw_app_meta_data, '{}'::jsonb) ? 'role';
+
+UPDATE auth.users
+SET raw_user_meta_data = raw_user_meta_data - 'role'
+WHERE raw_user_meta_data ? 'role';
+
+-- Backfill existing users
+INSERT INTO public.profiles (id, email, username, role)
+SELECT id, lower(email), raw_user_meta_data->>'username', raw_app_meta_data->>'role'
+FROM auth.users
+WHERE email IS NOT NULL
+ON CONFLICT (id) DO UPDATE SET role = EXCLUDED.role;
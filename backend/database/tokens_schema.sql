@@ -30,6 +30,18 @@ CREATE INDEX IF NOT EXISTS idx_tokens_expires_at ON tokens(expires_at);
 CREATE INDEX IF NOT EXISTS idx_notifications_user_id ON notifications(user_id);
 CREATE INDEX IF NOT EXISTS idx_notifications_read ON notifications(read);
 CREATE INDEX IF NOT EXISTS idx_notifications_created_at ON notifications(created_at DESC);
+-- Keyset pagination: (created_at, id) newest-first, optionally per owner
+CREATE INDEX IF NOT EXISTS idx_tokens_created_id ON tokens(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_tokens_assigned_created_id ON tokens(assigned_to, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_notifications_user_created_id ON notifications(user_id, created_at DESC, id DESC);
+-- Unread counter resync: only unread rows are indexed
+CREATE INDEX IF NOT EXISTS idx_notifications_unread ON notifications(user_id) WHERE read = FALSE;
+
+-- Expiry warnings: set once the "expires soon" email/notification went out
+ALTER TABLE tokens ADD COLUMN IF NOT EXISTS expiry_warned_at TIMESTAMP WITH TIME ZONE;
+-- Expiry scheduler cursor: only active, not yet warned tokens, in expiry order
+CREATE INDEX IF NOT EXISTS idx_tokens_expiry_pending ON tokens(expires_at, id)
+    WHERE status = 'active' AND expiry_warned_at IS NULL;
 
 -- RLS Policies for tokens
 ALTER TABLE tokens ENABLE ROW LEVEL SECURITY;
@@ -41,7 +53,7 @@ CREATE POLICY "Manager admins can view all tokens"
         EXISTS (
             SELECT 1 FROM auth.users
             WHERE auth.users.id = auth.uid()
-            AND (auth.users.raw_user_meta_data->>'role')::text = 'manager_admin'
+            AND (auth.users.raw_app_meta_data->>'role')::text = 'manager_admin'
         )
     );
 
@@ -52,7 +64,7 @@ CREATE POLICY "Manager admins can insert tokens"
         EXISTS (
             SELECT 1 FROM auth.users
             WHERE auth.users.id = auth.uid()
-            AND (auth.users.raw_user_meta_data->>'role')::text = 'manager_admin'
+            AND (auth.users.raw_app_meta_data->>'role')::text = 'manager_admin'
         )
     );
 
@@ -98,3 +110,31 @@ $$ language 'plpgsql';
 -- Trigger for tokens
 CREATE TRIGGER update_tokens_updated_at BEFORE UPDATE ON tokens
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+-- Fan-out notification: one INSERT ... SELECT for an explicit user set and/or
+-- every user with a role (profiles.role, see profiles_schema.sql).
+-- Returns the recipients so the backend can bump its unread counters.
+CREATE OR REPLACE FUNCTION fan_out_notification(
+    p_title VARCHAR,
+    p_message TEXT,
+    p_type VARCHAR DEFAULT 'info',
+    p_link VARCHAR DEFAULT NULL,
+    p_user_ids UUID[] DEFAULT NULL,
+    p_role TEXT DEFAULT NULL
+)
+RETURNS SETOF UUID AS $$
+BEGIN
+    RETURN QUERY
+    INSERT INTO notifications (user_id, title, message, type, link)
+    SELECT recipients.id, p_title, p_message, p_type, p_link
+    FROM (
+        SELECT unnest(p_user_ids) AS id
+        UNION
+        SELECT profiles.id FROM public.profiles WHERE p_role IS NOT NULL AND profiles.role = p_role
+    ) AS recipients
+    RETURNING notifications.user_id;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE ALL ON FUNCTION fan_out_notification(VARCHAR, TEXT, VARCHAR, VARCHAR, UUID[], TEXT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION fan_out_notification(VARCHAR, TEXT, VARCHAR, VARCHAR, UUID[], TEXT) TO service_role;
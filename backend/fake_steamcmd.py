@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Stand-in for steamcmd.sh that prints realistic install output.
+
+Takes steamcmd's arguments (+force_install_dir, +app_update ...) and writes a
+marker file into the install dir. Behaviour is set with environment variables:
+
+    FAKE_STEAMCMD_SIZE=5000000000   bytes to "download"
+    FAKE_STEAMCMD_STEPS=20          progress lines per phase
+    FAKE_STEAMCMD_DELAY=0.05        seconds between lines
+    FAKE_STEAMCMD_FAIL=1            fail the first N runs with state 0x202
+    FAKE_STEAMCMD_FILES=20          game files written (64 KB each)
+    FAKE_STEAMCMD_BUILD=1000        build id in steamapps/appmanifest_<app>.acf
+"""
+import os
+import sys
+import time
+
+args = sys.argv[1:]
+install_dir = args[args.index("+force_install_dir") + 1] if "+force_install_dir" in args else "."
+app_id = args[args.index("+app_update") + 1] if "+app_update" in args else "0"
+size = int(os.getenv("FAKE_STEAMCMD_SIZE", "5000000000"))
+steps = int(os.getenv("FAKE_STEAMCMD_STEPS", "20"))
+delay = float(os.getenv("FAKE_STEAMCMD_DELAY", "0.05"))
+fail_runs = int(os.getenv("FAKE_STEAMCMD_FAIL", "0"))
+game_files = int(os.getenv("FAKE_STEAMCMD_FILES", "20"))
+build_id = os.getenv("FAKE_STEAMCMD_BUILD", "1000")
+
+
+def say(line: str, end: str = "\n"):
+    sys.stdout.write(line + end)
+    sys.stdout.flush()
+    time.sleep(delay)
+
+
+say("Redirecting stderr to '/home/steam/Steam/logs/stderr.txt'")
+for percent in (0, 45, 100):
+    say(f"[{percent:3d}%] Downloading update ({percent * 400:,} of 40,000 KB)...")
+say("[----] Verifying installation...")
+say("Steam Console Client (c) Valve Corporation - version 1716584000")
+say("Connecting anonymously to Steam Public...OK")
+say("Waiting for client config...OK")
+say("Waiting for user info...OK")
+
+os.makedirs(install_dir, exist_ok=True)
+runs_file = os.path.join(install_dir, ".fake_steamcmd_runs")
+runs = int(open(runs_file).read()) + 1 if os.path.exists(runs_file) else 1
+with open(runs_file, "w") as f:
+    f.write(str(runs))
+
+for state, phase in ((0x61, "downloading"), (0x81, "verifying update")):
+    for step in range(steps + 1):
+        done = size * step // steps
+        say(f" Update state (0x{state:x}) {phase}, progress: {done * 100 / size:.2f} ({done} / {size})")
+        if phase == "downloading" and runs <= fail_runs and step == steps // 2:
+            say(f"Error! App '{app_id}' state is 0x202 after update job.")
+            sys.exit(8)
+
+content = os.path.join(install_dir, "ShooterGame", "Content")
+os.makedirs(content, exist_ok=True)
+for i in range(game_files):
+    path = os.path.join(content, f"pak{i}.pak")
+    data = f"{app_id}:{build_id if i == 0 else 0}:{i}".encode().ljust(65536, b".")
+    if not os.path.exists(path) or open(path, "rb").read() != data:
+        # Like steamcmd: only changed files are rewritten
+        with open(path, "wb") as f:
+            f.write(data)
+os.makedirs(os.path.join(install_dir, "steamapps"), exist_ok=True)
+with open(os.path.join(install_dir, "steamapps", f"appmanifest_{app_id}.acf"), "w") as f:
+    f.write(f'"AppState"\n{{\n\t"appid"\t\t"{app_id}"\n\t"buildid"\t\t"{build_id}"\n}}\n')
+say(f"Success! App '{app_id}' fully installed.")
@@ -1,11 +1,11 @@
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel, EmailStr
 from datetime import datetime, timedelta
 from jose import jwt
 import os
 from gotrue.errors import AuthApiError
-from services.supabase_client import get_supabase
-from services.email_service import send_verification_email, send_password_reset_email
+from services.supabase_client import get_async_supabase, get_async_auth_client, db_call
+from services.jobs import enqueue_job
 import secrets
 
 router = APIRouter()
@@ -33,16 +33,19 @@ def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(hours=72)  # 72 hours = 3 days
     to_encode.update({"exp": expire, "iat": datetime.utcnow()})
+    # Every issued token carries a role claim (see get_current_claims)
+    to_encode.setdefault("role", "user")
     return jwt.encode(to_encode, os.getenv("SECRET_KEY"), algorithm="HS256")
 
 @router.post("/register")
-async def register(request: RegisterRequest, background_tasks: BackgroundTasks):
+async def register(request: RegisterRequest):
     """Register new user with custom email verification"""
-    supabase = get_supabase()
+    supabase = await get_async_supabase()
+    auth_client = await get_async_auth_client()
     
     try:
         # Simple sign up - Supabase email confirmation should be DISABLED in dashboard
-        response = supabase.auth.sign_up({
+        response = await db_call(auth_client.auth.sign_up({
             "email": request.email,
             "password": request.password,
             "options": {
@@ -51,25 +54,28 @@ async def register(request: RegisterRequest, background_tasks: BackgroundTasks):
                     "email_verified": False
                 }
             }
-        })
+        }))
         
         if response and response.user:
             # Generate our own verification token
             verification_token = secrets.token_urlsafe(32)
             
             # Store token in database
-            supabase.table("email_verifications").insert({
+            await db_call(supabase.table("email_verifications").insert({
                 "user_id": response.user.id,
                 "token": verification_token,
                 "expires_at": (datetime.utcnow() + timedelta(hours=24)).isoformat()
-            }).execute()
+            }).execute())
             
-            # Send our custom verification email in background
-            background_tasks.add_task(
-                send_verification_email,
-                request.email,
-                request.username,
-                verification_token
+            # Send our custom verification email via the durable job queue
+            await enqueue_job(
+                "email.verification",
+                {
+                    "email": request.email,
+                    "username": request.username,
+                    "token": verification_token
+                },
+                dedupe_key=f"verify:{verification_token}"
             )
             
             return {
@@ -86,14 +92,14 @@ async def register(request: RegisterRequest, background_tasks: BackgroundTasks):
 @router.post("/verify-email")
 async def verify_email(request: VerifyEmailRequest):
     """Verify user email with token"""
-    supabase = get_supabase()
+    supabase = await get_async_supabase()
     
     try:
         # Find verification token (check if exists and not expired)
-        result = supabase.table("email_verifications")\
+        result = await db_call(supabase.table("email_verifications")\
             .select("*")\
             .eq("token", request.token)\
-            .execute()
+            .execute())
         
         if not result.data or len(result.data) == 0:
             raise HTTPException(status_code=400, detail="Invalid or expired verification token")
@@ -108,17 +114,17 @@ async def verify_email(request: VerifyEmailRequest):
         user_id = verification["user_id"]
         
         # Delete verification token (marks as verified)
-        supabase.table("email_verifications")\
+        await db_call(supabase.table("email_verifications")\
             .delete()\
             .eq("token", request.token)\
-            .execute()
+            .execute())
         
         # Update the user in Supabase Auth to mark email as confirmed
         # This is the crucial step to enable login
-        update_response = supabase.auth.admin.update_user_by_id(
+        update_response = await db_call(supabase.auth.admin.update_user_by_id(
             user_id,
             {"email_confirm": True}
-        )
+        ))
         
         return {
             "message": "Email verified successfully. You can now login.",
@@ -134,20 +140,21 @@ async def verify_email(request: VerifyEmailRequest):
 async def login(request: LoginRequest):
     """Login - check if email was verified via token"""
     try:
-        supabase = get_supabase()
+        supabase = await get_async_supabase()
+        auth_client = await get_async_auth_client()
 
         # Sign in user
-        response = supabase.auth.sign_in_with_password({
+        response = await db_call(auth_client.auth.sign_in_with_password({
             "email": request.email,
             "password": request.password
-        })
+        }))
 
         if response and response.user:
             # Check if there's still a pending verification token
-            pending = supabase.table("email_verifications")\
+            pending = await db_call(supabase.table("email_verifications")\
                 .select("id")\
                 .eq("user_id", response.user.id)\
-                .execute()
+                .execute())
 
             if pending.data and len(pending.data) > 0:
                 raise HTTPException(
@@ -159,7 +166,10 @@ async def login(request: LoginRequest):
             token_data = {
                 "sub": response.user.id,
                 "email": response.user.email,
-                "username": response.user.user_metadata.get("username", "")
+                "username": response.user.user_metadata.get("username", ""),
+                # Role claim lets request handlers authorize without an admin API call
+                # (from app_metadata - user_metadata is editable by the user)
+                "role": (response.user.app_metadata or {}).get("role", "user")
             }
             token = create_access_token(token_data)
 
@@ -187,48 +197,51 @@ async def logout():
     return {"message": "Logged out successfully"}
 
 @router.post("/forgot-password")
-async def forgot_password(request: ForgotPasswordRequest, background_tasks: BackgroundTasks):
+async def forgot_password(request: ForgotPasswordRequest):
     """Send password reset email"""
-    supabase = get_supabase()
+    supabase = await get_async_supabase()
     
     try:
-        # Check if user exists using the admin API.
-        # Note: list_users() can be slow with many users, but it's a reliable way
-        # to find a user by email with the service_role key.
-        all_users_response = supabase.auth.admin.list_users()
-        user_list = all_users_response.users
+        # Indexed lookup in profiles (kept in sync with auth.users by trigger,
+        # see database/profiles_schema.sql) - constant cost regardless of user count
+        result = await db_call(supabase.table("profiles")\
+            .select("id, email, username")\
+            .eq("email", request.email.lower())\
+            .limit(1)\
+            .execute())
         
-        user_found = next((u for u in user_list if u.email == request.email), None)
-        
-        if not user_found:
+        if not result.data:
             # Don't reveal if user exists or not for security
             return {
                 "message": "If the email exists, a password reset link has been sent."
             }
         
-        # Adapt the found user object to the dictionary format the rest of the function expects.
+        profile = result.data[0]
         user = {
-            "id": user_found.id,
-            "email": user_found.email,
-            "username": user_found.user_metadata.get("username", "user")
+            "id": profile["id"],
+            "email": profile["email"],
+            "username": profile.get("username") or "user"
         }
         
         # Generate reset token
         reset_token = secrets.token_urlsafe(32)
         
         # Store token in database (expires in 1 hour)
-        supabase.table("password_resets").insert({
+        await db_call(supabase.table("password_resets").insert({
             "user_id": user["id"],
             "token": reset_token,
             "expires_at": (datetime.utcnow() + timedelta(hours=1)).isoformat()
-        }).execute()
+        }).execute())
         
-        # Send password reset email in background
-        background_tasks.add_task(
-            send_password_reset_email,
-            user["email"],
-            user["username"],
-            reset_token
+        # Send password reset email via the durable job queue
+        await enqueue_job(
+            "email.password_reset",
+            {
+                "email": user["email"],
+                "username": user["username"],
+                "reset_token": reset_token
+            },
+            dedupe_key=f"reset:{reset_token}"
         )
         
         return {
@@ -243,14 +256,14 @@ async def forgot_password(request: ForgotPasswordRequest, background_tasks: Back
 @router.post("/reset-password")
 async def reset_password(request: ResetPasswordRequest):
     """Reset password with token"""
-    supabase = get_supabase()
+    supabase = await get_async_supabase()
     
     try:
         # Find reset token
-        result = supabase.table("password_resets")\
+        result = await db_call(supabase.table("password_resets")\
             .select("*")\
             .eq("token", request.token)\
-            .execute()
+            .execute())
         
         if not result.data or len(result.data) == 0:
             raise HTTPException(status_code=400, detail="Invalid or expired reset token")
@@ -265,7 +278,7 @@ async def reset_password(request: ResetPasswordRequest):
         user_id = reset["user_id"]
         
         # Get user object using admin API to update password
-        user_response = supabase.auth.admin.get_user_by_id(user_id)
+        user_response = await db_call(supabase.auth.admin.get_user_by_id(user_id))
         if not user_response:
             raise HTTPException(status_code=400, detail="User not found")
         
@@ -273,16 +286,16 @@ async def reset_password(request: ResetPasswordRequest):
 
         # Update password in Supabase Auth (using admin API)
         # Note: This requires service role key
-        auth_response = supabase.auth.admin.update_user_by_id(
+        auth_response = await db_call(supabase.auth.admin.update_user_by_id(
             user_id,
             {"password": request.new_password}
-        )
+        ))
         
         # Delete reset token
-        supabase.table("password_resets")\
+        await db_call(supabase.table("password_resets")\
             .delete()\
             .eq("token", request.token)\
-            .execute()
+            .execute())
         
         return {
             "message": "Password reset successfully. You can now login with your new password."
@@ -1,100 +1,31 @@
 from fastapi import APIRouter, HTTPException
-import subprocess
-import os
+from fastapi.responses import JSONResponse
+from services.git_updater import get_git_updater, GitError
 
 router = APIRouter()
 
-# Git executable path
-GIT_CMD = "/usr/bin/git"
-SYSTEMCTL_CMD = "/usr/bin/systemctl"
-
 @router.post("/git-update")
 async def git_update():
-    """Update application from git repository"""
-    app_dir = "/opt/zedin-steam-manager"
-    
+    """Start updating the application from git (runs in the background)
+
+    Returns 202 with the update state; poll /git-update/status for progress.
+    """
     try:
-        # Check if git repository exists
-        if not os.path.exists(os.path.join(app_dir, ".git")):
-            raise HTTPException(status_code=400, detail="Not a git repository")
-        
-        # Fetch latest changes
-        subprocess.run(
-            [GIT_CMD, "fetch", "origin", "main"],
-            cwd=app_dir,
-            check=True,
-            capture_output=True
-        )
-        
-        # Check if updates available
-        result = subprocess.run(
-            [GIT_CMD, "rev-list", "HEAD...origin/main", "--count"],
-            cwd=app_dir,
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        
-        commits_behind = int(result.stdout.strip())
-        
-        if commits_behind == 0:
-            return {
-                "message": "Already up to date",
-                "updated": False,
-                "commits_behind": 0
-            }
-        
-        # Pull updates
-        subprocess.run(
-            [GIT_CMD, "pull", "origin", "main"],
-            cwd=app_dir,
-            check=True,
-            capture_output=True
-        )
-        
-        # Restart services
-        subprocess.run([SYSTEMCTL_CMD, "restart", "zedin-backend"], check=False)
-        subprocess.run([SYSTEMCTL_CMD, "restart", "zedin-frontend"], check=False)
-        
-        return {
-            "message": f"Updated successfully ({commits_behind} commits)",
-            "updated": True,
-            "commits_behind": commits_behind
-        }
-    except subprocess.CalledProcessError as e:
-        raise HTTPException(status_code=500, detail=f"Git update failed: {str(e)}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        state = get_git_updater().start_update()
+    except GitError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return JSONResponse(status_code=202, content=state)
+
+@router.get("/git-update/status")
+async def git_update_status():
+    """Progress of the running (or last) update"""
+    return get_git_updater().update_state()
 
 @router.get("/git-status")
-async def git_status():
-    """Check if updates are available"""
-    app_dir = "/opt/zedin-steam-manager"
-    
+async def git_status(refresh: bool = False):
+    """Check if updates are available (cached; ?refresh=true forces a fetch)"""
     try:
-        # Fetch latest changes
-        subprocess.run(
-            [GIT_CMD, "fetch", "origin", "main"],
-            cwd=app_dir,
-            check=True,
-            capture_output=True
-        )
-        
-        # Check commits behind
-        result = subprocess.run(
-            [GIT_CMD, "rev-list", "HEAD...origin/main", "--count"],
-            cwd=app_dir,
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        
-        commits_behind = int(result.stdout.strip())
-        
-        return {
-            "updates_available": commits_behind > 0,
-            "commits_behind": commits_behind
-        }
+        return await get_git_updater().status(refresh=refresh)
     except Exception as e:
         return {
             "updates_available": False,
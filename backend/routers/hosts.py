@@ -0,0 +1,252 @@
+from fastapi import APIRouter, HTTPException, Depends, Query, WebSocket, WebSocketDisconnect
+from typing import List, Optional, Tuple
+import asyncio
+import math
+from services.supabase_client import get_async_supabase, db_call
+from services.fanout import run_fanout, summarize, FANOUT_TIMEOUT
+from services.host_metrics import host_metrics, agent_store, verify_agent_key
+from services.metric_frames import FrameDecoder, FrameError, FrameGap
+from services.ssh_pool import get_ssh_pool, SSHUnavailable
+from services.steamcmd import game_cache_stats
+from services.backups import get_backups
+from services.timeseries import history_payload
+from routers.tokens import get_current_claims
+
+router = APIRouter()
+
+HOST_COLUMNS = "id, name, hostname, port, username, ssh_key_path"
+# Shell on every managed host: operators only (server_admin is the customer role)
+EXEC_ROLES = ("manager_admin",)
+# Host internals (remote stats commands, backups and metrics of every server): operators only
+ADMIN_ROLES = ("manager_admin",)
+MAX_COMMAND_LENGTH = 4096
+# Output lines buffered per exec socket before producers wait for the client
+OUTPUT_QUEUE_SIZE = 2000
+# Lines per WebSocket frame
+OUTPUT_BATCH = 200
+MAX_AGENT_METRICS = 32
+
+def require_admin(claims: Tuple[str, Optional[str]]):
+    _, role = claims
+    if role not in ADMIN_ROLES:
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+async def select_hosts(selector: dict) -> List[dict]:
+    """Resolve a host selector: {"all": true} or {"host_ids": [...]} (active hosts only)"""
+    supabase = await get_async_supabase()
+    query = supabase.table("hosts").select(HOST_COLUMNS).eq("is_active", True)
+    if not selector.get("all"):
+        host_ids = selector.get("host_ids") or []
+        if not host_ids:
+            raise HTTPException(status_code=400, detail="Select hosts with 'all' or 'host_ids'")
+        query = query.in_("id", host_ids)
+    result = await db_call(query.order("name").execute())
+    return result.data or []
+
+@router.websocket("/agent")
+async def metrics_agent(websocket: WebSocket, host_id: str, key: str):
+    """Ingest binary metric frames from a host agent (see agent/metrics_agent.py)
+
+    Agent sends a JSON hello ({"metrics": [...], "interval", "platform"}), then
+    one binary frame per sample. Server replies "key" when it needs a keyframe.
+    """
+    if not verify_agent_key(host_id, key):
+        await websocket.close(code=4401)
+        return
+
+    await websocket.accept()
+    try:
+        hello = await websocket.receive_json()
+        metrics = hello.get("metrics") if isinstance(hello, dict) else None
+        if (not isinstance(metrics, list) or not 0 < len(metrics) <= MAX_AGENT_METRICS
+                or not all(isinstance(m, str) for m in metrics)):
+            await websocket.close(code=1003)
+            return
+        decoder = FrameDecoder(metrics)
+        host_metrics.connected(host_id, hello)
+    except (WebSocketDisconnect, ValueError):
+        return
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            frame = message.get("bytes")
+            if frame is None:
+                continue
+            try:
+                ts, values = decoder.decode(frame)
+            except FrameGap:
+                host_metrics.gap(host_id)
+                await websocket.send_text("key")
+                continue
+            host_metrics.ingest(host_id, ts, values, len(frame))
+    except FrameError as e:
+        print(f"⚠️ Bad metric frame from host {host_id}: {e}", flush=True)
+        await websocket.close(code=1003)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        host_metrics.disconnected(host_id)
+
+@router.get("/metrics")
+async def hosts_metrics(claims: Tuple[str, Optional[str]] = Depends(get_current_claims)):
+    """Latest agent-reported metrics for every host"""
+    require_admin(claims)
+    return host_metrics.overview()
+
+@router.get("/{host_id}/history")
+async def host_history(
+    host_id: str,
+    range_: str = Query("2h", alias="range"),
+    resolution: Optional[str] = None,
+    claims: Tuple[str, Optional[str]] = Depends(get_current_claims)
+):
+    """Metric history of a remote host (same shape as /api/system/history)"""
+    require_admin(claims)
+    if host_id not in host_metrics:
+        raise HTTPException(status_code=404, detail="No metrics reported for this host")
+    try:
+        return history_payload(agent_store(host_id), range_, resolution)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/{host_id}/game-cache")
+async def host_game_cache(host_id: str, claims: Tuple[str, Optional[str]] = Depends(get_current_claims)):
+    """Shared game file cache of a host: unique bytes on disk and the current build per app"""
+    require_admin(claims)
+    supabase = await get_async_supabase()
+    result = await db_call(supabase.table("hosts").select(HOST_COLUMNS).eq("id", host_id).limit(1).execute())
+    if not result.data:
+        raise HTTPException(status_code=404, detail="Host not found")
+    try:
+        return await game_cache_stats(result.data[0])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SSHUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except (RuntimeError, OSError, asyncio.TimeoutError) as e:
+        raise HTTPException(status_code=502, detail=f"Game cache stats failed: {e}")
+
+@router.get("/{host_id}/backups")
+async def host_backups(host_id: str, claims: Tuple[str, Optional[str]] = Depends(get_current_claims)):
+    """Backup chunk store of a host: bytes on disk vs. bytes in snapshots, snapshots per server"""
+    require_admin(claims)
+    supabase = await get_async_supabase()
+    result = await db_call(supabase.table("hosts").select(HOST_COLUMNS).eq("id", host_id).limit(1).execute())
+    if not result.data:
+        raise HTTPException(status_code=404, detail="Host not found")
+    try:
+        return await get_backups().host_stats(result.data[0])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SSHUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except (RuntimeError, OSError, asyncio.TimeoutError) as e:
+        raise HTTPException(status_code=502, detail=f"Backup stats failed: {e}")
+
+@router.get("/ssh-stats")
+async def ssh_stats(claims: Tuple[str, Optional[str]] = Depends(get_current_claims)):
+    """Pooled SSH connections per host (admins only: errors name host addresses and users)"""
+    require_admin(claims)
+    return get_ssh_pool().stats()
+
+@router.websocket("/exec")
+async def exec_on_hosts(websocket: WebSocket, token: str):
+    """Run one command on many hosts, streaming their output.
+
+    Client sends: {"hosts": {"all": true} | {"host_ids": [...]}, "command": "...", "timeout": 60}
+    Server sends: {"type": "start", "targets": [...]},
+                  {"type": "output", "lines": [[target, "stdout"|"stderr", line], ...]} (repeated),
+                  {"type": "summary", "results": [...], "totals": {...}}
+    Sending {"type": "cancel"} (or disconnecting) stops the run.
+    """
+    try:
+        _, role = await get_current_claims(token)
+    except HTTPException:
+        await websocket.close(code=4401)
+        return
+    if role not in EXEC_ROLES:
+        await websocket.close(code=4403)
+        return
+
+    await websocket.accept()
+    try:
+        request = await websocket.receive_json()
+        command = request.get("command")
+        if not isinstance(command, str) or not command.strip() or len(command) > MAX_COMMAND_LENGTH:
+            await websocket.send_json({"type": "error", "detail": "Invalid command"})
+            await websocket.close()
+            return
+        timeout = float(request.get("timeout") or FANOUT_TIMEOUT)
+        if not math.isfinite(timeout):
+            raise HTTPException(status_code=400, detail="Invalid timeout")
+        timeout = min(max(timeout, 1.0), 3600)
+        hosts = await select_hosts(request.get("hosts") or {})
+    except WebSocketDisconnect:
+        return
+    except HTTPException as e:
+        await websocket.send_json({"type": "error", "detail": e.detail})
+        await websocket.close()
+        return
+    except Exception as e:
+        await websocket.send_json({"type": "error", "detail": str(e)})
+        await websocket.close()
+        return
+
+    targets = [(host["name"], host, command) for host in hosts]
+    await websocket.send_json({
+        "type": "start",
+        "targets": [{"target": label, "host_id": host["id"]} for label, host, _ in targets]
+    })
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=OUTPUT_QUEUE_SIZE)
+
+    async def on_output(target: str, stream: str, line: str):
+        await queue.put([target, stream, line])
+
+    async def send_output():
+        # Coalesce whatever is queued into one frame (None marks the end)
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            lines = [item]
+            while len(lines) < OUTPUT_BATCH and not queue.empty():
+                item = queue.get_nowait()
+                if item is None:
+                    await websocket.send_json({"type": "output", "lines": lines})
+                    return
+                lines.append(item)
+            await websocket.send_json({"type": "output", "lines": lines})
+
+    async def watch_client():
+        # Returns when the client cancels or goes away
+        while True:
+            message = await websocket.receive_json()
+            if isinstance(message, dict) and message.get("type") == "cancel":
+                return
+
+    run = asyncio.create_task(run_fanout(targets, on_output, timeout))
+    sender = asyncio.create_task(send_output())
+    watcher = asyncio.create_task(watch_client())
+    try:
+        await asyncio.wait({run, sender, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        if not run.done():
+            # Cancelled, disconnected or the sender failed (client gone)
+            run.cancel()
+            await asyncio.gather(run, return_exceptions=True)
+            return
+        results = run.result()
+        await queue.put(None)
+        await sender
+        await websocket.send_json({"type": "summary", "results": results, "totals": summarize(results)})
+        await websocket.close()
+    except (WebSocketDisconnect, RuntimeError):
+        # Client went away (RuntimeError: send after close)
+        pass
+    finally:
+        for task in (run, sender, watcher):
+            task.cancel()
+        await asyncio.gather(run, sender, watcher, return_exceptions=True)
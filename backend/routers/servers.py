@@ -0,0 +1,494 @@
+from fastapi import APIRouter, HTTPException, Depends, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+from typing import List, Optional, Tuple
+import asyncio
+import json
+import math
+import time
+from datetime import datetime, timezone
+from services.supabase_client import get_async_supabase, db_call
+from services.broadcast import sse_stream
+from services.steamcmd import get_steamcmd, InstallConflict, RUNNING, INSTALLING
+from services.rcon import get_rcon_pool, RCONError, RCONUnavailable, RCON_TIMEOUT
+from services.fanout import summarize
+from services.ssh_pool import SSHUnavailable
+from services.a2s import get_a2s_poller
+from services.server_state import get_server_state
+from services.log_tail import get_log_tail, LOG_TAIL_LINES
+from services.log_index import get_log_indexer, KINDS, MAX_SEARCH_LIMIT
+from services.backups import get_backups, SNAPSHOT_ID_RE
+from services.timeseries import parse_duration
+from routers.hosts import HOST_COLUMNS
+from routers.tokens import get_current_claims
+
+router = APIRouter()
+
+SERVER_COLUMNS = "id, name, server_type, status, host_id, install_path, steamcmd_path, owner_id"
+# Roles that see and manage every server; server_admin (customers) only their own
+ADMIN_ROLES = ("manager_admin",)
+# Server plus its host's address, for RCON
+RCON_COLUMNS = "id, name, rcon_port, rcon_password, owner_id, hosts(hostname)"
+MAX_RCON_COMMAND = 1024
+
+class RCONCommand(BaseModel):
+    command: str
+    timeout: float = RCON_TIMEOUT
+
+class RCONBroadcast(RCONCommand):
+    # Target servers: every server, or the listed ones
+    all: bool = False
+    server_ids: Optional[List[str]] = None
+
+class BackupRestore(BaseModel):
+    # A snapshot id, or a point in time (epoch, ISO 8601 or "6h" back); neither = latest
+    snapshot: Optional[str] = None
+    at: Optional[str] = None
+
+@router.on_event("startup")
+async def recover_interrupted_installs():
+    """Installs die with their backend - put servers this host left in INSTALLING back"""
+    try:
+        restored = await get_steamcmd().recover()
+        if restored:
+            print(f"⚠️ Restored {restored} server(s) from interrupted installs", flush=True)
+    except Exception as e:
+        print(f"⚠️ Could not restore interrupted installs: {e}", flush=True)
+
+@router.on_event("shutdown")
+async def cancel_installs():
+    await get_steamcmd().shutdown()
+
+@router.on_event("shutdown")
+async def close_rcon_connections():
+    await get_rcon_pool().close()
+
+@router.on_event("shutdown")
+async def stop_log_tails():
+    await get_log_tail().close()
+
+@router.on_event("startup")
+async def start_log_indexer():
+    get_log_indexer().start()
+
+@router.on_event("shutdown")
+async def stop_log_indexer():
+    await get_log_indexer().stop()
+
+@router.on_event("startup")
+async def start_backups():
+    get_backups().start()
+
+@router.on_event("shutdown")
+async def stop_backups():
+    await get_backups().stop()
+
+@router.on_event("startup")
+async def start_server_state():
+    """Load the state table, then feed it A2S observations (polling the servers it knows)"""
+    state = get_server_state()
+    await state.start()
+    poller = get_a2s_poller()
+    poller.targets_source = state.a2s_targets
+    poller.add_listener(state.observe_a2s)
+    poller.start()
+
+@router.on_event("shutdown")
+async def stop_server_state():
+    await get_a2s_poller().stop()
+    await get_server_state().stop()
+
+def require_admin(claims: Tuple[str, Optional[str]]):
+    _, role = claims
+    if role not in ADMIN_ROLES:
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+async def load_server(server_id: str, claims: Tuple[str, Optional[str]]) -> dict:
+    """Server row the caller may manage (owner or admin), else 404"""
+    user_id, role = claims
+    supabase = await get_async_supabase()
+    result = await db_call(
+        supabase.table("servers").select(SERVER_COLUMNS).eq("id", server_id).limit(1).execute()
+    )
+    if not result.data or (role not in ADMIN_ROLES and result.data[0]["owner_id"] != user_id):
+        raise HTTPException(status_code=404, detail="Server not found")
+    return result.data[0]
+
+@router.get("/install-stats")
+async def install_stats(claims: Tuple[str, Optional[str]] = Depends(get_current_claims)):
+    """Running and queued SteamCMD jobs per host (admins only)"""
+    require_admin(claims)
+    return get_steamcmd().stats()
+
+@router.get("/a2s-stats")
+async def a2s_stats(claims: Tuple[str, Optional[str]] = Depends(get_current_claims)):
+    """A2S poller: servers polled, online count, last round duration (admins only)"""
+    require_admin(claims)
+    return get_a2s_poller().stats()
+
+@router.get("/state")
+async def server_state(claims: Tuple[str, Optional[str]] = Depends(get_current_claims)):
+    """Status and live player counts of the caller's servers (from memory, no SQL)"""
+    user_id, role = claims
+    servers = get_server_state().visible(user_id, role in ADMIN_ROLES)
+    return {
+        "servers": sorted(servers, key=lambda row: row["name"] or ""),
+        "totals": {
+            "servers": len(servers),
+            "running": sum(1 for row in servers if row["status"] == RUNNING),
+            "players": sum(row.get("players") or 0 for row in servers)
+        }
+    }
+
+@router.get("/state-stats")
+async def server_state_stats(claims: Tuple[str, Optional[str]] = Depends(get_current_claims)):
+    """State table: servers per status, observations vs. database writes (admins only)"""
+    require_admin(claims)
+    return get_server_state().stats()
+
+@router.get("/live")
+async def live_status(claims: Tuple[str, Optional[str]] = Depends(get_current_claims)):
+    """Latest A2S result (players, map, ping) of every server the caller can see"""
+    user_id, role = claims
+    status = get_a2s_poller().status
+    if role in ADMIN_ROLES:
+        return status
+    owned = {row["id"] for row in get_server_state().visible(user_id, False)}
+    return {server_id: row for server_id, row in status.items() if server_id in owned}
+
+@router.get("/log-tail-stats")
+async def log_tail_stats(claims: Tuple[str, Optional[str]] = Depends(get_current_claims)):
+    """Watched server logs, console clients, inotify / remote tail state (admins only)"""
+    require_admin(claims)
+    return get_log_tail().stats()
+
+async def load_host(server: dict) -> Optional[dict]:
+    """Host row of the server (None: no host_id, this machine)"""
+    if not server.get("host_id"):
+        return None
+    supabase = await get_async_supabase()
+    result = await db_call(
+        supabase.table("hosts").select(HOST_COLUMNS).eq("id", server["host_id"]).limit(1).execute()
+    )
+    if not result.data:
+        # Never fall back to this machine: the install_path belongs to another host
+        raise HTTPException(status_code=400, detail="Server host not found")
+    return result.data[0]
+
+async def watch_server_log(server: dict):
+    """Start (or reuse) the tail of the server's log files"""
+    return await get_log_tail().watch(server, await load_host(server))
+
+@router.get("/{server_id}/console")
+async def console_backlog(
+    server_id: str,
+    lines: int = 200,
+    claims: Tuple[str, Optional[str]] = Depends(get_current_claims)
+):
+    """Last lines of the server log: [[timestamp, file, line], ...]"""
+    server = await load_server(server_id, claims)
+    try:
+        log = await watch_server_log(server)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"files": log.files, "lines": log.backlog(min(max(lines, 1), LOG_TAIL_LINES))}
+
+@router.websocket("/{server_id}/console/ws")
+async def console_stream(websocket: WebSocket, server_id: str, token: str):
+    """Live server log.
+
+    Server sends: {"type": "backlog", "files": [...], "lines": [[timestamp, file, line], ...]},
+                  then {"type": "lines", "lines": [...]} as the log grows, and
+                  {"type": "rotated" | "truncated", "file": name} when a log file is replaced.
+    """
+    try:
+        server = await load_server(server_id, await get_current_claims(token))
+        log = await watch_server_log(server)
+    except HTTPException as e:
+        await websocket.close(code=4000 + e.status_code if e.status_code in (400, 401) else 4404)
+        return
+    except ValueError:
+        await websocket.close(code=4400)
+        return
+
+    await websocket.accept()
+    # Subscribe and snapshot without an await in between: no line is missed or sent twice
+    sub = log.channel.subscribe()
+    backlog = {"type": "backlog", "files": log.files, "lines": log.backlog()}
+
+    async def watch_client():
+        # Returns when the client goes away
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+
+    watcher = asyncio.create_task(watch_client())
+    try:
+        await websocket.send_json(backlog)
+        while True:
+            frame = asyncio.ensure_future(sub.get())
+            await asyncio.wait({frame, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            if not frame.done():
+                frame.cancel()
+                return
+            if frame.result() is None:
+                await websocket.close()
+                return
+            await websocket.send_text(frame.result())
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        sub.close()
+        watcher.cancel()
+        await asyncio.gather(watcher, return_exceptions=True)
+
+def parse_time(value: Optional[str]) -> Optional[float]:
+    """Epoch seconds, ISO 8601, or a duration back from now ("24h", "7d")"""
+    if not value:
+        return None
+    try:
+        epoch = float(value)
+    except ValueError:
+        pass
+    else:
+        if not math.isfinite(epoch):
+            raise HTTPException(status_code=400, detail=f"Invalid time: {value}")
+        return epoch
+    try:
+        return time.time() - parse_duration(value)
+    except ValueError:
+        pass
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid time: {value}")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+@router.get("/{server_id}/logs/search")
+async def search_logs(
+    server_id: str,
+    q: Optional[str] = None,
+    kind: Optional[str] = None,
+    player: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    claims: Tuple[str, Optional[str]] = Depends(get_current_claims)
+):
+    """Search the indexed server logs, newest first.
+
+    ``q`` matches words in the line, player or tribe (``word*`` for prefixes),
+    ``kind`` is one of join, leave, chat, kill, tribe, admin, save, error,
+    warning, log. ``since`` / ``until`` take epoch seconds, ISO 8601 or a
+    duration ("7d"). Pass ``next_cursor`` back as ``cursor`` for the next page.
+    """
+    await load_server(server_id, claims)
+    if kind is not None and kind not in KINDS:
+        raise HTTPException(status_code=400, detail=f"kind must be one of {', '.join(KINDS)}")
+    page = None
+    if cursor:
+        try:
+            ts, row_id = cursor.split(",")
+            page = (float(ts), int(row_id))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    try:
+        return await get_log_indexer().search(
+            server_id, text=q, kind=kind, player=player, since=parse_time(since), until=parse_time(until),
+            limit=min(max(limit, 1), MAX_SEARCH_LIMIT), cursor=page
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/{server_id}/logs/index")
+async def log_index_status(server_id: str, claims: Tuple[str, Optional[str]] = Depends(get_current_claims)):
+    """Indexed events, time span, files and offsets, last run"""
+    await load_server(server_id, claims)
+    return await get_log_indexer().stats(server_id)
+
+@router.post("/{server_id}/logs/index")
+async def index_logs(server_id: str, claims: Tuple[str, Optional[str]] = Depends(get_current_claims)):
+    """Index what was logged since the last run, now"""
+    server = await load_server(server_id, claims)
+    try:
+        return await get_log_indexer().index_server(server, await load_host(server))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SSHUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except (RuntimeError, OSError, asyncio.TimeoutError) as e:
+        raise HTTPException(status_code=502, detail=f"Log indexing failed: {e}")
+
+@router.get("/backup-stats")
+async def backup_stats(claims: Tuple[str, Optional[str]] = Depends(get_current_claims)):
+    """Backups in progress, the last scheduled round, servers whose last backup failed (admins only)"""
+    require_admin(claims)
+    return get_backups().stats()
+
+async def run_backup_call(call):
+    try:
+        return await call
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SSHUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except (RuntimeError, OSError, asyncio.TimeoutError) as e:
+        raise HTTPException(status_code=502, detail=f"Backup failed: {e}")
+
+@router.get("/{server_id}/backups")
+async def list_backups(server_id: str, claims: Tuple[str, Optional[str]] = Depends(get_current_claims)):
+    """Snapshots of the server's saves, oldest first"""
+    server = await load_server(server_id, claims)
+    return {"snapshots": await run_backup_call(get_backups().snapshots(server, await load_host(server)))}
+
+@router.post("/{server_id}/backups")
+async def backup_now(server_id: str, claims: Tuple[str, Optional[str]] = Depends(get_current_claims)):
+    """Back up the server's saves now (no new snapshot if nothing changed)"""
+    server = await load_server(server_id, claims)
+    return await run_backup_call(get_backups().backup_server(server, await load_host(server)))
+
+@router.post("/{server_id}/backups/restore")
+async def restore_backup(
+    server_id: str,
+    request: BackupRestore,
+    claims: Tuple[str, Optional[str]] = Depends(get_current_claims)
+):
+    """Restore the saves as of a snapshot or point in time. The server must be stopped.
+
+    The current saves are backed up first (``pre_restore_snapshot``).
+    """
+    server = await load_server(server_id, claims)
+    statuses = {server["status"], (get_server_state().get(server_id) or server)["status"]}
+    if statuses & {RUNNING, INSTALLING}:
+        raise HTTPException(status_code=409, detail="Stop the server before restoring its saves")
+    if request.snapshot and not SNAPSHOT_ID_RE.match(request.snapshot):
+        raise HTTPException(status_code=400, detail="Invalid snapshot id")
+    at = parse_time(request.at) if not request.snapshot else None
+    return await run_backup_call(
+        get_backups().restore(server, await load_host(server), snapshot=request.snapshot, at=at)
+    )
+
+@router.post("/{server_id}/install", status_code=202)
+async def install_server(
+    server_id: str,
+    validate: bool = False,
+    claims: Tuple[str, Optional[str]] = Depends(get_current_claims)
+):
+    """Install or update the server files with SteamCMD (runs in the background)"""
+    server = await load_server(server_id, claims)
+    host = await load_host(server)
+    try:
+        job = await get_steamcmd().start(server, host, validate=validate)
+    except InstallConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return job.snapshot()
+
+@router.get("/{server_id}/install")
+async def install_status(server_id: str, claims: Tuple[str, Optional[str]] = Depends(get_current_claims)):
+    """Running (or last) install job of the server, with its log tail"""
+    await load_server(server_id, claims)
+    job = get_steamcmd().for_server(server_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="No install job for this server")
+    return job.snapshot(log=True)
+
+@router.get("/{server_id}/install/stream")
+async def install_stream(server_id: str, claims: Tuple[str, Optional[str]] = Depends(get_current_claims)):
+    """Server-Sent Events: "state" frames (with log tail) and throttled "progress" frames.
+
+    The stream ends after the final "state" frame (done / failed / cancelled).
+    """
+    await load_server(server_id, claims)
+    job = get_steamcmd().for_server(server_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="No install job for this server")
+    sub = job.channel.subscribe()
+    if not job.finished:
+        # Start from the full state, not just the newest progress frame
+        sub.push(json.dumps({"type": "state", **job.snapshot(log=True)}))
+    return StreamingResponse(
+        sse_stream(sub),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.delete("/{server_id}/install")
+async def cancel_install(server_id: str, claims: Tuple[str, Optional[str]] = Depends(get_current_claims)):
+    """Cancel the running install; the server returns to its previous status"""
+    await load_server(server_id, claims)
+    job = get_steamcmd().for_server(server_id)
+    if job is None or not get_steamcmd().cancel(job.id):
+        raise HTTPException(status_code=404, detail="No running install for this server")
+    return JSONResponse(status_code=202, content={"id": job.id, "state": "cancelling"})
+
+def rcon_target(row: dict) -> dict:
+    """servers row with embedded hosts(hostname) -> RCON pool target"""
+    return {**row, "hostname": (row.pop("hosts", None) or {}).get("hostname")}
+
+def check_rcon_command(request: RCONCommand):
+    if not request.command.strip() or len(request.command) > MAX_RCON_COMMAND:
+        raise HTTPException(status_code=400, detail="Invalid command")
+    if not math.isfinite(request.timeout):
+        raise HTTPException(status_code=400, detail="Invalid timeout")
+    request.timeout = min(max(request.timeout, 1), 120)
+
+@router.get("/rcon-stats")
+async def rcon_stats(claims: Tuple[str, Optional[str]] = Depends(get_current_claims)):
+    """Pooled RCON connections per server (admins only)"""
+    require_admin(claims)
+    return get_rcon_pool().stats()
+
+@router.post("/rcon/broadcast")
+async def rcon_broadcast(
+    request: RCONBroadcast,
+    claims: Tuple[str, Optional[str]] = Depends(get_current_claims)
+):
+    """Send one RCON command to many servers at once (e.g. a restart warning)"""
+    _, role = claims
+    if role not in ADMIN_ROLES:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    check_rcon_command(request)
+    if not request.all and not request.server_ids:
+        raise HTTPException(status_code=400, detail="Select servers with 'all' or 'server_ids'")
+
+    supabase = await get_async_supabase()
+    query = supabase.table("servers").select(RCON_COLUMNS)
+    if not request.all:
+        query = query.in_("id", request.server_ids)
+    result = await db_call(query.order("name").execute())
+    targets = [rcon_target(row) for row in result.data or []]
+
+    results = await get_rcon_pool().broadcast(targets, request.command, request.timeout)
+    return {"results": results, "totals": summarize(results)}
+
+@router.post("/{server_id}/rcon")
+async def rcon_command(
+    server_id: str,
+    request: RCONCommand,
+    claims: Tuple[str, Optional[str]] = Depends(get_current_claims)
+):
+    """Run one RCON command on a server (ListPlayers, SaveWorld, ServerChat ...)"""
+    check_rcon_command(request)
+    user_id, role = claims
+    supabase = await get_async_supabase()
+    result = await db_call(
+        supabase.table("servers").select(RCON_COLUMNS).eq("id", server_id).limit(1).execute()
+    )
+    if not result.data or (role not in ADMIN_ROLES and result.data[0]["owner_id"] != user_id):
+        raise HTTPException(status_code=404, detail="Server not found")
+
+    try:
+        response = await get_rcon_pool().command(rcon_target(result.data[0]), request.command, request.timeout)
+    except RCONUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except RCONError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=f"No response within {request.timeout:g}s")
+    return {"response": response}
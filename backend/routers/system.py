@@ -1,97 +1,139 @@
-from fastapi import APIRouter
-import psutil
-import platform
-from datetime import datetime, timedelta
-from collections import deque
-import time
+from fastapi import APIRouter, HTTPException, Depends, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from typing import Optional, Tuple
+import asyncio
+from services.broadcast import Broadcaster, sse_stream
+from services.expiry_scheduler import get_expiry_scheduler
+from services.jobs import get_job_queue
+from services.mailer import get_mailer
+from services.email_service import register_email_jobs
+from services.email_templates import warm_templates
+from services.metrics_sampler import get_sampler, history_values
+from services.ssh_pool import get_ssh_pool
+from services.timeseries import get_store, history_payload
+from routers.hosts import require_admin
+from routers.tokens import get_current_claims
 
 router = APIRouter()
 
-# Store historical data (last 2 hours, one sample every 2 minutes = 60 samples)
-history_data = {
-    "cpu": deque(maxlen=60),
-    "memory": deque(maxlen=60),
-    "network_sent": deque(maxlen=60),
-    "network_recv": deque(maxlen=60),
-    "timestamps": deque(maxlen=60)
-}
-
-# Last update time for 2-minute interval
-last_history_update = time.time()
-last_network_bytes = None
-
-def update_history():
-    """Update historical data every 2 minutes"""
-    global last_history_update, last_network_bytes
-    current_time = time.time()
-    
-    # Only update if 2 minutes (120 seconds) have passed
-    if current_time - last_history_update >= 120:
-        net_io = psutil.net_io_counters()
-        
-        history_data["cpu"].append(psutil.cpu_percent(interval=0.5))
-        history_data["memory"].append(psutil.virtual_memory().percent)
-        
-        # Network rates (bytes per second averaged over 2 minutes)
-        if last_network_bytes:
-            time_diff = current_time - last_history_update
-            sent_rate = (net_io.bytes_sent - last_network_bytes[0]) / time_diff / 1024 / 1024  # MB/s
-            recv_rate = (net_io.bytes_recv - last_network_bytes[1]) / time_diff / 1024 / 1024  # MB/s
-            history_data["network_sent"].append(round(sent_rate, 2))
-            history_data["network_recv"].append(round(recv_rate, 2))
-        else:
-            history_data["network_sent"].append(0)
-            history_data["network_recv"].append(0)
-        
-        history_data["timestamps"].append(datetime.now().strftime("%H:%M"))
-        last_network_bytes = (net_io.bytes_sent, net_io.bytes_recv)
-        last_history_update = current_time
+# One sample per interval, fanned out to every open dashboard
+metrics_channel = Broadcaster("system-metrics")
+
+def update_history(snapshot: dict):
+    """Record every sampler snapshot into the local history store"""
+    get_store().add(history_values(snapshot), snapshot["timestamp"])
+
+def publish_snapshot(snapshot: dict):
+    """Push every sampler snapshot to stream subscribers"""
+    metrics_channel.publish(snapshot)
+
+@router.on_event("startup")
+async def start_metrics_sampler():
+    """Start the background sampler with the app"""
+    sampler = get_sampler()
+    sampler.add_listener(update_history)
+    sampler.add_listener(publish_snapshot)
+    sampler.start()
+
+@router.on_event("shutdown")
+async def stop_metrics_sampler():
+    await get_sampler().stop()
 
 @router.get("/info")
 async def get_system_info():
     """Get real-time system information (called every 2 seconds)"""
-    # Update history in background
-    update_history()
-    
-    mem = psutil.virtual_memory()
-    disk = psutil.disk_usage('/')
-    net_io = psutil.net_io_counters()
-    
+    sampler = get_sampler()
+    snapshot = sampler.snapshot
+    if snapshot is None:
+        # First request before the sampler has produced anything
+        snapshot = await sampler.sample_once()
+
     return {
-        "cpu": {
-            "percent": psutil.cpu_percent(interval=0.5),
-            "cores": psutil.cpu_count(logical=False),
-            "threads": psutil.cpu_count(logical=True)
-        },
-        "memory": {
-            "total": mem.total,
-            "used": mem.used,
-            "free": mem.available,
-            "percent": mem.percent
-        },
-        "disk": {
-            "total": disk.total,
-            "used": disk.used,
-            "free": disk.free,
-            "percent": disk.percent
-        },
-        "network": {
-            "bytes_sent": net_io.bytes_sent,
-            "bytes_recv": net_io.bytes_recv,
-            "packets_sent": net_io.packets_sent,
-            "packets_recv": net_io.packets_recv
-        },
-        "platform": platform.system(),
-        "version": platform.version()
+        **snapshot,
+        "sampler": sampler.stats(),
+        "stream": metrics_channel.stats()
     }
 
+@router.get("/stream")
+async def stream_system_info():
+    """Server-Sent Events stream of system snapshots (one per sample)"""
+    sub = metrics_channel.subscribe()
+    return StreamingResponse(
+        sse_stream(sub),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.websocket("/ws")
+async def system_info_ws(websocket: WebSocket):
+    """WebSocket stream of system snapshots (one per sample)"""
+    await websocket.accept()
+    with metrics_channel.subscribe() as sub:
+        try:
+            async for frame in sub:
+                await websocket.send_text(frame)
+        except (WebSocketDisconnect, RuntimeError):
+            # Client went away (RuntimeError: send after close)
+            pass
+
 @router.get("/history")
-async def get_system_history():
-    """Get historical data (last 2 hours)"""
-    return {
-        "cpu": list(history_data["cpu"]),
-        "memory": list(history_data["memory"]),
-        "network_sent": list(history_data["network_sent"]),
-        "network_recv": list(history_data["network_recv"]),
-        "timestamps": list(history_data["timestamps"])
-    }
+async def get_system_history(
+    range_: str = Query("2h", alias="range"),
+    resolution: Optional[str] = None
+):
+    """Get historical data (range e.g. 1h/24h/7d, resolution 5s/1m/1h or auto)"""
+    try:
+        return history_payload(get_store(), range_, resolution)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/mail-stats")
+async def mail_stats(claims: Tuple[str, Optional[str]] = Depends(get_current_claims)):
+    """Mail outbox depth and SMTP pool throughput (admins only)"""
+    require_admin(claims)
+    return get_mailer().stats()
+
+@router.get("/job-stats")
+async def job_stats(claims: Tuple[str, Optional[str]] = Depends(get_current_claims)):
+    """Background job backlog, latency and failure counts (admins only)"""
+    require_admin(claims)
+    return await get_job_queue().stats()
+
+@router.get("/expiry-stats")
+async def expiry_stats(claims: Tuple[str, Optional[str]] = Depends(get_current_claims)):
+    """Token expiry warning scheduler: queued deadlines and dispatch counts (admins only)"""
+    require_admin(claims)
+    return get_expiry_scheduler().stats()
+
+@router.on_event("startup")
+async def warm_email_templates():
+    """Compile the email templates before the first email job renders one"""
+    try:
+        await asyncio.to_thread(warm_templates)
+    except Exception as e:
+        print(f"⚠️ Could not precompile email templates: {e}", flush=True)
+
+@router.on_event("startup")
+async def start_job_workers():
+    """Register the job handlers, then start the durable job queue workers"""
+    register_email_jobs()
+    get_job_queue().start()
+
+@router.on_event("startup")
+async def start_expiry_scheduler():
+    """Start the token expiry warning scheduler (its warnings go out as email jobs)"""
+    get_expiry_scheduler().start()
+
+@router.on_event("shutdown")
+async def stop_expiry_scheduler():
+    await get_expiry_scheduler().stop()
+
+@router.on_event("shutdown")
+async def close_ssh_connections():
+    await get_ssh_pool().close()
+
+@router.on_event("shutdown")
+async def flush_mail_outbox():
+    """Stop taking jobs, then give queued emails a chance to go out"""
+    await get_job_queue().stop()
+    await get_mailer().stop()
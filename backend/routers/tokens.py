@@ -1,14 +1,24 @@
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
 from pydantic import BaseModel, EmailStr
 from datetime import datetime, timedelta
-from typing import Optional, List
+from typing import Optional, List, Tuple
+from postgrest.types import CountMethod, ReturnMethod
 import secrets
 import os
-from services.supabase_client import get_supabase
-from services.email_service import send_token_email, send_expiry_notification
+from services.supabase_client import get_async_supabase, db_call
+from services.token_cache import token_cache, role_claim_trusted
+from services.pagination import keyset_page, page_result, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from services.unread_counter import unread_counters
+from services.jobs import enqueue_job
+from services.expiry_scheduler import get_expiry_scheduler
 
 router = APIRouter()
 
+# Explicit projections for listings (never select("*") on unbounded tables)
+TOKEN_LIST_COLUMNS = "id, token_code, assigned_to, status, activated_at, expires_at, created_at"
+TOKEN_ADMIN_LIST_COLUMNS = "id, token_code, generated_by, assigned_to, status, activated_at, expires_at, created_at"
+NOTIFICATION_LIST_COLUMNS = "id, title, message, type, read, link, created_at"
+
 class TokenGenerateRequest(BaseModel):
     assigned_to_email: EmailStr
     duration_days: int = 365  # Default 1 year
@@ -22,37 +32,71 @@ class NotificationCreate(BaseModel):
     type: str = 'info'
     link: Optional[str] = None
 
-def get_current_user(token: str):
-    """Get current user from JWT token"""
+class NotificationFanOut(NotificationCreate):
+    # Recipients: explicit users, everyone with a role, or both
+    user_ids: Optional[List[str]] = None
+    role: Optional[str] = None
+
+class NotificationIdsRequest(BaseModel):
+    ids: List[str]
+
+async def get_user_role(user_id: str) -> Optional[str]:
+    """Look up a user's role through the auth admin API (network round-trip)"""
+    supabase = await get_async_supabase()
+    response = await db_call(supabase.auth.admin.get_user_by_id(user_id))
+    # app_metadata: only the service role can write it (user_metadata is user-editable)
+    return (response.user.app_metadata or {}).get('role')
+
+async def get_role_changed_at(user_id: str) -> Optional[str]:
+    """When the user's role last changed (profiles mirror, primary key lookup)"""
+    supabase = await get_async_supabase()
+    result = await db_call(supabase.table("profiles")\
+        .select("role_changed_at")\
+        .eq("id", user_id)\
+        .limit(1)\
+        .execute())
+    return result.data[0]["role_changed_at"] if result.data else None
+
+async def get_current_claims(token: str) -> Tuple[str, Optional[str]]:
+    """Get (user_id, role) from JWT token - verified once, then served from cache"""
+    cached = token_cache.get(token)
+    if cached is not None:
+        return cached
+
     from jose import jwt, JWTError
     try:
         payload = jwt.decode(token, os.getenv("JWT_SECRET"), algorithms=["HS256"])
-        user_id = payload.get("sub")
-        return user_id
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid authentication token")
 
-def is_manager_admin(user_id: str):
-    """Check if user is manager admin"""
-    supabase = get_supabase()
+    user_id = payload.get("sub")
+    role = payload.get("role")
     try:
-        response = supabase.auth.admin.get_user_by_id(user_id)
-        role = response.user.user_metadata.get('role')
-        return role == 'manager_admin'
-    except:
-        return False
+        if role is None or not role_claim_trusted(payload.get("iat"), await get_role_changed_at(user_id)):
+            # Older token without a role claim, or the role changed since it was issued
+            role = await get_user_role(user_id)
+    except Exception:
+        # Don't cache a failed lookup - treat as no role for this request
+        return user_id, None
+
+    token_cache.put(token, user_id, role, payload.get("exp"))
+    return user_id, role
+
+async def get_current_user(token: str):
+    """Get current user from JWT token"""
+    user_id, _ = await get_current_claims(token)
+    return user_id
 
 @router.post("/tokens/generate")
 async def generate_token(
     request: TokenGenerateRequest,
-    background_tasks: BackgroundTasks,
     authorization: str = Depends(lambda: None)
 ):
     """Generate a new token (Manager Admin only)"""
     # TODO: Extract user from authorization header
     # For now, we'll implement basic check
     
-    supabase = get_supabase()
+    supabase = await get_async_supabase()
     
     try:
         # Find user by email
@@ -76,14 +120,19 @@ async def generate_token(
         # TODO: Get assigned_to user ID from email
         # For now, we'll store the email in a separate field or metadata
         
-        result = supabase.table("tokens").insert(token_data).execute()
+        result = await db_call(supabase.table("tokens").insert(token_data).execute())
         
-        # Send email notification
-        background_tasks.add_task(
-            send_token_email,
-            request.assigned_to_email,
-            token_code,
-            request.duration_days
+        # Send email notification via the durable job queue
+        await enqueue_job(
+            "email.token",
+            {
+                "email": request.assigned_to_email,
+                # Recipient may not have an account yet - greet by address
+                "username": request.assigned_to_email.split("@")[0],
+                "token_code": token_code,
+                "duration_days": request.duration_days
+            },
+            dedupe_key=f"token:{token_code}"
         )
         
         # Create notification for user
@@ -107,15 +156,15 @@ async def generate_token(
 @router.post("/tokens/activate")
 async def activate_token(request: TokenActivateRequest, user_id: str = Depends(get_current_user)):
     """Activate a token and upgrade user to server admin"""
-    supabase = get_supabase()
+    supabase = await get_async_supabase()
     
     try:
         # Find token
-        result = supabase.table("tokens")\
+        result = await db_call(supabase.table("tokens")\
             .select("*")\
             .eq("token_code", request.token_code)\
             .eq("status", "pending")\
-            .execute()
+            .execute())
         
         if not result.data or len(result.data) == 0:
             raise HTTPException(status_code=404, detail="Token not found or already activated")
@@ -128,21 +177,28 @@ async def activate_token(request: TokenActivateRequest, user_id: str = Depends(g
             raise HTTPException(status_code=400, detail="Token has expired")
         
         # Update token status
-        supabase.table("tokens")\
+        await db_call(supabase.table("tokens")\
             .update({
                 "status": "active",
                 "activated_at": datetime.utcnow().isoformat(),
                 "assigned_to": user_id
             })\
             .eq("token_code", request.token_code)\
-            .execute()
+            .execute())
         
-        # Upgrade user role to server_admin
-        # Note: This requires admin API
-        # supabase.auth.admin.update_user_by_id(
-        #     user_id,
-        #     {"user_metadata": {"role": "server_admin"}}
-        # )
+        # Upgrade plain users to server_admin (service role key required);
+        # higher roles (manager_admin) keep what they have
+        role = await get_user_role(user_id)
+        if role in (None, "user"):
+            role = "server_admin"
+            await db_call(supabase.auth.admin.update_user_by_id(
+                user_id,
+                {"app_metadata": {"role": role}}
+            ))
+            # Cached claims and already issued tokens carry the old role
+            token_cache.invalidate_user(user_id)
+        # Now active - schedule its expiry warning if it falls in the loaded window
+        get_expiry_scheduler().track(token["id"], token["expires_at"])
         
         # Create notification
         notification_data = {
@@ -151,11 +207,12 @@ async def activate_token(request: TokenActivateRequest, user_id: str = Depends(g
             "message": "Your token has been activated successfully. You now have server admin privileges.",
             "type": "success"
         }
-        supabase.table("notifications").insert(notification_data).execute()
+        await db_call(supabase.table("notifications").insert(notification_data).execute())
+        unread_counters.incr([user_id])
         
         return {
             "message": "Token activated successfully",
-            "role": "server_admin",
+            "role": role,
             "expires_at": token["expires_at"]
         }
     except HTTPException:
@@ -164,53 +221,76 @@ async def activate_token(request: TokenActivateRequest, user_id: str = Depends(g
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/tokens/my")
-async def get_my_tokens(user_id: str = Depends(get_current_user)):
-    """Get current user's tokens"""
-    supabase = get_supabase()
+async def get_my_tokens(
+    user_id: str = Depends(get_current_user),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
+):
+    """Get current user's tokens (newest first, cursor paginated)"""
+    supabase = await get_async_supabase()
+    query = keyset_page(
+        supabase.table("tokens")\
+            .select(TOKEN_LIST_COLUMNS)\
+            .eq("assigned_to", user_id),
+        cursor,
+        limit
+    )
     
     try:
-        result = supabase.table("tokens")\
-            .select("*")\
-            .eq("assigned_to", user_id)\
-            .order("created_at", desc=True)\
-            .execute()
+        result = await db_call(query.execute())
+        tokens, next_cursor = page_result(result.data, limit)
         
-        return {"tokens": result.data}
+        return {"tokens": tokens, "next_cursor": next_cursor}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/tokens/all")
-async def get_all_tokens(user_id: str = Depends(get_current_user)):
-    """Get all tokens (Manager Admin only)"""
-    if not is_manager_admin(user_id):
+async def get_all_tokens(
+    claims: Tuple[str, Optional[str]] = Depends(get_current_claims),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
+):
+    """Get all tokens (Manager Admin only, newest first, cursor paginated)"""
+    user_id, role = claims
+    if role != 'manager_admin':
         raise HTTPException(status_code=403, detail="Manager Admin access required")
     
-    supabase = get_supabase()
+    supabase = await get_async_supabase()
+    query = keyset_page(
+        supabase.table("tokens").select(TOKEN_ADMIN_LIST_COLUMNS),
+        cursor,
+        limit
+    )
     
     try:
-        result = supabase.table("tokens")\
-            .select("*")\
-            .order("created_at", desc=True)\
-            .execute()
+        result = await db_call(query.execute())
+        tokens, next_cursor = page_result(result.data, limit)
         
-        return {"tokens": result.data}
+        return {"tokens": tokens, "next_cursor": next_cursor}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/notifications")
-async def get_notifications(user_id: str = Depends(get_current_user)):
-    """Get user's notifications"""
-    supabase = get_supabase()
+async def get_notifications(
+    user_id: str = Depends(get_current_user),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
+):
+    """Get user's notifications (newest first, cursor paginated)"""
+    supabase = await get_async_supabase()
+    query = keyset_page(
+        supabase.table("notifications")\
+            .select(NOTIFICATION_LIST_COLUMNS)\
+            .eq("user_id", user_id),
+        cursor,
+        limit
+    )
     
     try:
-        result = supabase.table("notifications")\
-            .select("*")\
-            .eq("user_id", user_id)\
-            .order("created_at", desc=True)\
-            .limit(50)\
-            .execute()
+        result = await db_call(query.execute())
+        notifications, next_cursor = page_result(result.data, limit)
         
-        return {"notifications": result.data}
+        return {"notifications": notifications, "next_cursor": next_cursor}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -220,31 +300,116 @@ async def mark_notification_read(
     user_id: str = Depends(get_current_user)
 ):
     """Mark notification as read"""
-    supabase = get_supabase()
+    supabase = await get_async_supabase()
     
     try:
-        supabase.table("notifications")\
+        # Only unread rows match, so the returned rows are exactly the ones that changed
+        result = await db_call(supabase.table("notifications")\
             .update({"read": True})\
             .eq("id", notification_id)\
             .eq("user_id", user_id)\
-            .execute()
+            .eq("read", False)\
+            .execute())
+        if result.data:
+            unread_counters.adjust(user_id, -len(result.data))
         
         return {"message": "Notification marked as read"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/notifications/unread-count")
-async def get_unread_count(user_id: str = Depends(get_current_user)):
-    """Get count of unread notifications"""
-    supabase = get_supabase()
+@router.post("/notifications/bulk")
+async def create_notifications_bulk(
+    request: NotificationFanOut,
+    claims: Tuple[str, Optional[str]] = Depends(get_current_claims)
+):
+    """Send one notification to many users (Manager Admin only)"""
+    user_id, role = claims
+    if role != 'manager_admin':
+        raise HTTPException(status_code=403, detail="Manager Admin access required")
+    if not request.user_ids and not request.role:
+        raise HTTPException(status_code=400, detail="Either user_ids or role is required")
+    
+    supabase = await get_async_supabase()
     
     try:
-        result = supabase.table("notifications")\
-            .select("id", count="exact")\
+        # Single INSERT ... SELECT in the database, whatever the number of recipients
+        result = await db_call(supabase.rpc("fan_out_notification", {
+            "p_title": request.title,
+            "p_message": request.message,
+            "p_type": request.type,
+            "p_link": request.link,
+            "p_user_ids": request.user_ids,
+            "p_role": request.role
+        }).execute())
+        recipients = result.data or []
+        unread_counters.incr(recipients)
+        
+        return {"message": "Notifications created", "count": len(recipients)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.patch("/notifications/read-all")
+async def mark_all_notifications_read(user_id: str = Depends(get_current_user)):
+    """Mark all of the user's notifications as read"""
+    supabase = await get_async_supabase()
+    
+    try:
+        # Count only - no need to ship the updated rows back
+        result = await db_call(supabase.table("notifications")\
+            .update({"read": True}, count=CountMethod.exact, returning=ReturnMethod.minimal)\
+            .eq("user_id", user_id)\
+            .eq("read", False)\
+            .execute())
+        unread_counters.set(user_id, 0)
+        
+        return {"message": "All notifications marked as read", "count": result.count or 0}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.patch("/notifications/read")
+async def mark_notifications_read(
+    request: NotificationIdsRequest,
+    user_id: str = Depends(get_current_user)
+):
+    """Mark a list of notifications as read"""
+    if len(request.ids) > MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_PAGE_SIZE} ids per request")
+    if not request.ids:
+        return {"message": "Notifications marked as read", "count": 0}
+    
+    supabase = await get_async_supabase()
+    
+    try:
+        result = await db_call(supabase.table("notifications")\
+            .update({"read": True}, count=CountMethod.exact, returning=ReturnMethod.minimal)\
+            .in_("id", request.ids)\
             .eq("user_id", user_id)\
             .eq("read", False)\
-            .execute()
+            .execute())
+        changed = result.count or 0
+        if changed:
+            unread_counters.adjust(user_id, -changed)
         
-        return {"count": result.count or 0}
+        return {"message": "Notifications marked as read", "count": changed}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/notifications/unread-count")
+async def get_unread_count(
+    request: Request,
+    response: Response,
+    user_id: str = Depends(get_current_user)
+):
+    """Get count of unread notifications (supports If-None-Match -> 304)"""
+    try:
+        count = await unread_counters.get(user_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    etag = f'W/"unread-{count}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    
+    response.headers.update(headers)
+    return {"count": count}
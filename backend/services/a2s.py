@@ -0,0 +1,420 @@
+"""Batched A2S (Steam server query) poller for live server status.
+
+Every server's ``query_port`` is queried from one UDP socket. All
+A2S_INFO / A2S_PLAYERS requests of a round go out at once, and replies are
+matched by source address. Polling hundreds of servers therefore takes
+about one round-trip window, not one socket and one timeout per server.
+
+- Challenges: a server may answer with S2C_CHALLENGE ('A'). The request
+  is then resent with the challenge right away. Challenges are cached per
+  server, so the next round needs one round-trip.
+- Split replies (Source multi-packet format) are reassembled;
+  bzip2-compressed ones are rejected.
+- Unanswered requests are resent every ``A2S_TIMEOUT`` seconds, up to
+  ``A2S_RETRIES`` times. A server that never answers is offline for that
+  round.
+
+Results go into the in-memory ``status`` table (keyed by server id) and
+to listeners after every round. ASA servers list themselves through Epic
+Online Services and don't answer A2S, so only ``A2S_SERVER_TYPES`` (ASE
+by default) are polled.
+"""
+import asyncio
+import os
+import socket
+import struct
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+A2S_INTERVAL = float(os.getenv("A2S_INTERVAL", "10"))
+# Seconds to wait for replies before resending, and resends per round
+A2S_TIMEOUT = float(os.getenv("A2S_TIMEOUT", "1"))
+A2S_RETRIES = int(os.getenv("A2S_RETRIES", "2"))
+A2S_PLAYERS = os.getenv("A2S_PLAYERS", "1").lower() not in ("0", "false", "no")
+A2S_SERVER_TYPES = tuple(t.strip() for t in os.getenv("A2S_SERVER_TYPES", "ASE").split(",") if t.strip())
+# Seconds between reloads of the server list from the database
+A2S_TARGETS_REFRESH = float(os.getenv("A2S_TARGETS_REFRESH", "60"))
+DNS_TTL = 300
+
+HEADER_SIMPLE = b"\xFF\xFF\xFF\xFF"
+HEADER_SPLIT = b"\xFE\xFF\xFF\xFF"
+A2S_INFO_REQUEST = HEADER_SIMPLE + b"TSource Engine Query\x00"
+A2S_PLAYERS_REQUEST = HEADER_SIMPLE + b"U"
+NO_CHALLENGE = b"\xFF\xFF\xFF\xFF"
+S2C_CHALLENGE = 0x41
+INFO_RESPONSE = 0x49
+PLAYERS_RESPONSE = 0x44
+
+TARGET_COLUMNS = "id, name, server_type, status, query_port, hosts(hostname)"
+
+
+class A2SParseError(ValueError):
+    """Malformed A2S reply"""
+
+
+class _Reader:
+    def __init__(self, data: bytes, pos: int = 0):
+        self.data = data
+        self.pos = pos
+
+    def unpack(self, fmt: str):
+        size = struct.calcsize(fmt)
+        if self.pos + size > len(self.data):
+            raise A2SParseError("Truncated reply")
+        values = struct.unpack_from(fmt, self.data, self.pos)
+        self.pos += size
+        return values[0] if len(values) == 1 else values
+
+    def string(self) -> str:
+        end = self.data.find(b"\x00", self.pos)
+        if end < 0:
+            raise A2SParseError("Unterminated string")
+        value = self.data[self.pos:end].decode("utf-8", errors="replace")
+        self.pos = end + 1
+        return value
+
+    @property
+    def remaining(self) -> int:
+        return len(self.data) - self.pos
+
+
+def parse_info(payload: bytes) -> dict:
+    """A2S_INFO reply body (after the 'I' byte)"""
+    r = _Reader(payload)
+    info = {"protocol": r.unpack("<B")}
+    info["name"] = r.string()
+    info["map"] = r.string()
+    info["folder"] = r.string()
+    info["game"] = r.string()
+    info["app_id"] = r.unpack("<H")
+    info["players"], info["max_players"], info["bots"] = r.unpack("<BBB")
+    server_type, environment, visibility, vac = r.unpack("<ccBB")
+    info["server_type"] = server_type.decode(errors="replace")
+    info["environment"] = environment.decode(errors="replace")
+    info["password"] = bool(visibility)
+    info["vac"] = bool(vac)
+    info["version"] = r.string()
+    if r.remaining:
+        edf = r.unpack("<B")
+        if edf & 0x80:
+            info["port"] = r.unpack("<H")
+        if edf & 0x10:
+            info["steam_id"] = r.unpack("<Q")
+        if edf & 0x40:
+            r.unpack("<H")
+            r.string()
+        if edf & 0x20:
+            info["keywords"] = r.string()
+        if edf & 0x01:
+            info["game_id"] = r.unpack("<Q")
+    return info
+
+
+def parse_players(payload: bytes) -> List[dict]:
+    """A2S_PLAYERS reply body (after the 'D' byte)"""
+    r = _Reader(payload)
+    count = r.unpack("<B")
+    players = []
+    for _ in range(count):
+        if r.remaining < 10:
+            # Some servers announce more players than they send
+            break
+        r.unpack("<B")
+        name = r.string()
+        score, duration = r.unpack("<lf")
+        players.append({"name": name, "score": score, "duration_s": round(duration, 1)})
+    return players
+
+
+class _Query:
+    """One server address in one poll round"""
+
+    def __init__(self, addr: Tuple[str, int], challenge: Optional[bytes], players: bool):
+        self.addr = addr
+        self.challenge = challenge
+        self.info: Optional[dict] = None
+        self.players: Optional[List[dict]] = None if players else []
+        self.error: Optional[str] = None
+        self.sent_at = 0.0
+        self.ping_ms: Optional[float] = None
+        self.done = asyncio.get_running_loop().create_future()
+        # Split replies being reassembled: id -> {number: payload}
+        self.fragments: Dict[int, Dict[int, bytes]] = {}
+
+    def requests(self) -> List[bytes]:
+        packets = []
+        if self.info is None:
+            packets.append(A2S_INFO_REQUEST + (self.challenge or b""))
+        if self.players is None:
+            packets.append(A2S_PLAYERS_REQUEST + (self.challenge or NO_CHALLENGE))
+        return packets
+
+    def finish(self, error: Optional[str] = None):
+        if error is not None and self.error is None:
+            self.error = error
+        if not self.done.done():
+            self.done.set_result(None)
+
+
+class _Protocol(asyncio.DatagramProtocol):
+    def __init__(self, poller: "A2SPoller"):
+        self.poller = poller
+
+    def datagram_received(self, data: bytes, addr):
+        self.poller._received(data, addr[:2])
+
+    def error_received(self, exc):
+        # ICMP port unreachable etc. - the round's timeout handles it
+        pass
+
+
+class A2SPoller:
+    """Polls every server from one UDP socket; keeps the latest result per server"""
+
+    def __init__(self, interval: float = A2S_INTERVAL, timeout: float = A2S_TIMEOUT,
+                 retries: int = A2S_RETRIES, players: bool = A2S_PLAYERS):
+        self.interval = interval
+        self.timeout = timeout
+        self.retries = retries
+        self.players = players
+        # server id -> latest result
+        self.status: Dict[str, dict] = {}
+        self._transport: Optional[asyncio.DatagramTransport] = None
+        self._queries: Dict[Tuple[str, int], _Query] = {}
+        self._challenges: Dict[Tuple[str, int], bytes] = {}
+        self._dns: Dict[str, Tuple[float, Optional[str]]] = {}
+        self._listeners: List[Callable[[Dict[str, dict]], None]] = []
+        self._targets: List[dict] = []
+        # Optional in-memory target list ([{id, hostname, query_port}]) instead of the database
+        self.targets_source: Optional[Callable[[], List[dict]]] = None
+        self._targets_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self.rounds = 0
+        self.last_round_s: Optional[float] = None
+
+    # -- socket -----------------------------------------------------------
+
+    async def _socket(self) -> asyncio.DatagramTransport:
+        if self._transport is None or self._transport.is_closing():
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            # A round's replies arrive in one burst
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+            sock.bind(("0.0.0.0", 0))
+            self._transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+                lambda: _Protocol(self), sock=sock
+            )
+        return self._transport
+
+    def _send(self, query: _Query):
+        query.sent_at = time.monotonic()
+        for packet in query.requests():
+            self._transport.sendto(packet, query.addr)
+
+    def _received(self, data: bytes, addr: Tuple[str, int]):
+        query = self._queries.get(addr)
+        if query is None or query.done.done():
+            return
+        try:
+            if data.startswith(HEADER_SPLIT):
+                data = self._reassemble(query, data)
+                if data is None:
+                    return
+            if not data.startswith(HEADER_SIMPLE) or len(data) < 5:
+                raise A2SParseError("Unknown header")
+            kind, payload = data[4], data[5:]
+            if kind == S2C_CHALLENGE:
+                if len(payload) < 4:
+                    raise A2SParseError("Short challenge")
+                query.challenge = self._challenges[addr] = payload[:4]
+                # Resend right away - a challenge is not a lost packet
+                self._send(query)
+                return
+            if kind == INFO_RESPONSE:
+                if query.info is None:
+                    query.info = parse_info(payload)
+                    query.ping_ms = round((time.monotonic() - query.sent_at) * 1000, 1)
+            elif kind == PLAYERS_RESPONSE:
+                if query.players is None:
+                    query.players = parse_players(payload)
+            else:
+                return
+        except A2SParseError as e:
+            query.finish(f"bad reply: {e}")
+            return
+        if query.info is not None and query.players is not None:
+            query.finish()
+
+    def _reassemble(self, query: _Query, data: bytes) -> Optional[bytes]:
+        r = _Reader(data, 4)
+        packet_id, total, number, _size = r.unpack("<lBBH")
+        if packet_id & 0x80000000:
+            raise A2SParseError("Compressed split replies are not supported")
+        parts = query.fragments.setdefault(packet_id, {})
+        parts[number] = data[r.pos:]
+        if len(parts) < total:
+            return None
+        del query.fragments[packet_id]
+        return b"".join(parts[i] for i in range(total))
+
+    # -- polling ----------------------------------------------------------
+
+    async def _resolve(self, hostname: str) -> Optional[str]:
+        cached = self._dns.get(hostname)
+        if cached is not None and time.monotonic() - cached[0] < DNS_TTL:
+            return cached[1]
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(hostname, None, family=socket.AF_INET,
+                                                                 type=socket.SOCK_DGRAM)
+            address = infos[0][4][0]
+        except (OSError, IndexError):
+            address = None
+        self._dns[hostname] = (time.monotonic(), address)
+        return address
+
+    async def query(self, targets: Dict[str, Tuple[str, int]]) -> Dict[str, dict]:
+        """One round: {key: (hostname, port)} -> {key: result}, all in parallel"""
+        await self._socket()
+        hostnames = {host for host, _ in targets.values()}
+        resolved = dict(zip(hostnames, await asyncio.gather(*(self._resolve(h) for h in hostnames))))
+
+        keys_by_addr: Dict[Tuple[str, int], List[str]] = {}
+        results: Dict[str, dict] = {}
+        for key, (host, port) in targets.items():
+            address = resolved[host]
+            if address is None:
+                results[key] = {"online": False, "error": f"cannot resolve {host}"}
+                continue
+            keys_by_addr.setdefault((address, int(port)), []).append(key)
+
+        queries = {addr: _Query(addr, self._challenges.get(addr), self.players) for addr in keys_by_addr}
+        self._queries = queries
+        try:
+            pending = set(queries.values())
+            for attempt in range(self.retries + 1):
+                for query in pending:
+                    self._send(query)
+                await asyncio.wait([query.done for query in pending], timeout=self.timeout)
+                pending = {query for query in pending if not query.done.done()}
+                if not pending:
+                    break
+        finally:
+            self._queries = {}
+
+        now = time.time()
+        for addr, query in queries.items():
+            if query.info is None:
+                result = {"online": False, "error": query.error or "timeout"}
+                # A stale challenge may be why it didn't answer
+                self._challenges.pop(addr, None)
+            else:
+                result = {
+                    "online": True,
+                    "ping_ms": query.ping_ms,
+                    "name": query.info["name"],
+                    "map": query.info["map"],
+                    "players": query.info["players"],
+                    "max_players": query.info["max_players"],
+                    "bots": query.info["bots"],
+                    "version": query.info["version"],
+                    "password": query.info["password"],
+                    "player_list": query.players,
+                    "error": query.error
+                }
+            result["checked_at"] = now
+            for key in keys_by_addr[addr]:
+                results[key] = result
+        return results
+
+    # -- background loop --------------------------------------------------
+
+    def add_listener(self, callback: Callable[[Dict[str, dict]], None]):
+        """Called with {server_id: result} after every round"""
+        self._listeners.append(callback)
+
+    async def _load_targets(self) -> List[dict]:
+        from services.supabase_client import get_async_supabase, db_call
+        from services.server_state import OBSERVED_STATUSES
+        supabase = await get_async_supabase()
+        result = await db_call(
+            supabase.table("servers").select(TARGET_COLUMNS)
+            .in_("server_type", list(A2S_SERVER_TYPES))
+            .in_("status", list(OBSERVED_STATUSES))
+            .execute()
+        )
+        return [
+            {"id": str(row["id"]), "hostname": (row.get("hosts") or {}).get("hostname"), "query_port": row["query_port"]}
+            for row in result.data or []
+            if (row.get("hosts") or {}).get("hostname") and row.get("query_port")
+        ]
+
+    async def poll_once(self, servers: List[dict]) -> Dict[str, dict]:
+        """Query ``servers`` ({id, hostname, query_port}) and update the status table"""
+        started = time.monotonic()
+        results = await self.query({
+            str(server["id"]): (server["hostname"], server["query_port"]) for server in servers
+        })
+        for server_id, result in results.items():
+            previous = self.status.get(server_id) or {}
+            result["failures"] = 0 if result["online"] else previous.get("failures", 0) + 1
+            result["last_seen"] = result["checked_at"] if result["online"] else previous.get("last_seen")
+            self.status[server_id] = result
+        # Servers no longer polled (deleted, uninstalled) leave the table
+        for server_id in set(self.status) - set(results):
+            del self.status[server_id]
+        self.rounds += 1
+        self.last_round_s = round(time.monotonic() - started, 3)
+        for callback in self._listeners:
+            try:
+                callback(results)
+            except Exception as e:
+                print(f"⚠️ A2S listener failed: {e}", flush=True)
+        return results
+
+    async def _run(self):
+        while True:
+            started = time.monotonic()
+            try:
+                if self.targets_source is not None:
+                    self._targets = self.targets_source()
+                elif started - self._targets_at >= A2S_TARGETS_REFRESH:
+                    self._targets = await self._load_targets()
+                    self._targets_at = started
+                await self.poll_once(self._targets)
+            except Exception as e:
+                print(f"⚠️ A2S poll failed: {e}", flush=True)
+            await asyncio.sleep(max(self.interval - (time.monotonic() - started), 0))
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    def stats(self) -> dict:
+        online = sum(1 for result in self.status.values() if result["online"])
+        return {
+            "servers": len(self.status),
+            "online": online,
+            "rounds": self.rounds,
+            "last_round_s": self.last_round_s,
+            "interval": self.interval,
+            "challenges_cached": len(self._challenges)
+        }
+
+
+_poller: Optional[A2SPoller] = None
+
+
+def get_a2s_poller() -> A2SPoller:
+    """Get the process-wide A2S poller singleton"""
+    global _poller
+    if _poller is None:
+        _poller = A2SPoller()
+    return _poller
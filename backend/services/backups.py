@@ -0,0 +1,255 @@
+"""Scheduled, deduplicating backups of server saves.
+
+``agent/backup.py`` does the work on each server's host, locally or over
+the pooled SSH connection, against one chunk store per host
+(``BACKUP_ROOT``). Saves that didn't change are stored once, across
+snapshots and across the servers of that host. See the agent for the
+store format.
+
+Every ``BACKUP_INTERVAL`` seconds each installed server's
+``BACKUP_SOURCE`` (relative to its install_path) is backed up. Hosts run
+in parallel, the servers of one host one after another, so a round costs
+each host at most ``BACKUP_WORKERS`` compression processes. After its
+servers, a host's snapshots are pruned to the ``BACKUP_KEEP_*`` policy.
+Unreferenced chunks are deleted at most every ``BACKUP_GC_INTERVAL``
+seconds, because that pass reads every manifest.
+
+A restore first backs up the current saves (tag ``pre-restore``), so it
+can itself be undone, then makes the directory match the chosen
+snapshot exactly.
+"""
+import asyncio
+import json
+import os
+import posixpath
+import re
+import sys
+import time
+from typing import Dict, List, Optional
+
+from services.steamcmd import is_local, run_on_host
+
+# Chunk store on each host (see agent/backup.py); unset disables backups
+BACKUP_ROOT = os.getenv("BACKUP_ROOT")
+# agent/backup.py on remote hosts (run with their python3)
+BACKUP_TOOL = os.getenv("BACKUP_TOOL", "/opt/zedin-steam-manager/backend/agent/backup.py")
+# Directory backed up, relative to the server's install_path
+BACKUP_SOURCE = os.getenv("BACKUP_SOURCE", "ShooterGame/Saved/SavedArks")
+# Seconds between scheduled rounds over all servers (0 disables them)
+BACKUP_INTERVAL = float(os.getenv("BACKUP_INTERVAL", "3600"))
+BACKUP_WORKERS = int(os.getenv("BACKUP_WORKERS", "2"))
+BACKUP_ZSTD_LEVEL = int(os.getenv("BACKUP_ZSTD_LEVEL", "3"))
+BACKUP_KEEP_LAST = int(os.getenv("BACKUP_KEEP_LAST", "3"))
+BACKUP_KEEP_HOURLY = int(os.getenv("BACKUP_KEEP_HOURLY", "24"))
+BACKUP_KEEP_DAILY = int(os.getenv("BACKUP_KEEP_DAILY", "7"))
+BACKUP_KEEP_WEEKLY = int(os.getenv("BACKUP_KEEP_WEEKLY", "4"))
+BACKUP_KEEP_MONTHLY = int(os.getenv("BACKUP_KEEP_MONTHLY", "3"))
+BACKUP_GC_INTERVAL = float(os.getenv("BACKUP_GC_INTERVAL", "86400"))
+# Per agent run
+BACKUP_TIMEOUT = float(os.getenv("BACKUP_TIMEOUT", "3600"))
+_LOCAL_BACKUP_TOOL = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'agent', 'backup.py'))
+
+BACKUP_COLUMNS = "id, name, status, install_path, hosts(id, name, hostname, port, username, ssh_key_path)"
+# Snapshot ids the agent creates (UTC time, "-2" ... for several per second)
+SNAPSHOT_ID_RE = re.compile(r"^\d{8}T\d{6}Z(-\d+)?$")
+# Nothing to back up yet
+SKIP_STATUSES = ("NOT_INSTALLED", "INSTALLING")
+
+
+def backup_command(host: Optional[dict], *args: str) -> List[str]:
+    """agent/backup.py invocation on the server's host"""
+    if is_local(host):
+        return [sys.executable, _LOCAL_BACKUP_TOOL, *args]
+    return ["python3", BACKUP_TOOL, *args]
+
+
+def _host_key(host: Optional[dict]) -> str:
+    return "local" if is_local(host) else str(host["id"])
+
+
+class BackupManager:
+    """Runs the backup agent for servers and hosts, and the scheduled rounds"""
+
+    def __init__(self, root: Optional[str] = BACKUP_ROOT, interval: float = BACKUP_INTERVAL,
+                 gc_interval: float = BACKUP_GC_INTERVAL):
+        self.root = root
+        self.interval = interval
+        self.gc_interval = gc_interval
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # Latest progress event per server being backed up / restored
+        self.running: Dict[str, dict] = {}
+        self.last: Dict[str, dict] = {}
+        self.last_round: Optional[dict] = None
+        self._gc_at: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def _root(self) -> str:
+        if not self.root:
+            raise ValueError("BACKUP_ROOT is not set")
+        return self.root
+
+    def _lock(self, server_id: str) -> asyncio.Lock:
+        return self._locks.setdefault(str(server_id), asyncio.Lock())
+
+    async def _agent(self, host: Optional[dict], args: List[str], server_id: Optional[str] = None) -> dict:
+        """Run one agent command; returns its result event"""
+        lines: List[str] = []
+        result: Optional[dict] = None
+
+        def on_line(line: str):
+            nonlocal result
+            if line.startswith('{"event": "progress"') and server_id is not None:
+                self.running[server_id] = json.loads(line)
+            elif line.startswith('{"event": "result"'):
+                result = json.loads(line)
+            elif line.strip():
+                lines.append(line.strip())
+
+        command = backup_command(host, *args)
+        try:
+            exit_status = await asyncio.wait_for(run_on_host(host, command, on_line), BACKUP_TIMEOUT)
+        finally:
+            if server_id is not None:
+                self.running.pop(server_id, None)
+        if result is None or exit_status != 0:
+            raise RuntimeError(lines[-1] if lines else f"backup agent exited with status {exit_status}")
+        return {k: v for k, v in result.items() if k not in ("event", "step")}
+
+    @staticmethod
+    def _source(server: dict) -> str:
+        if not server.get("install_path"):
+            raise ValueError("Server has no install_path")
+        return posixpath.join(server["install_path"], BACKUP_SOURCE)
+
+    async def backup_server(self, server: dict, host: Optional[dict], tag: str = "manual") -> dict:
+        """Back up the server's saves now; unchanged saves add no snapshot"""
+        server_id = str(server["id"])
+        args = ["backup", self._root(), server_id, self._source(server), "--tag", tag,
+                "--workers", str(BACKUP_WORKERS), "--level", str(BACKUP_ZSTD_LEVEL), "--missing-ok"]
+        async with self._lock(server_id):
+            try:
+                result = await self._agent(host, args, server_id)
+            except Exception as e:
+                self.last[server_id] = {"at": time.time(), "tag": tag, "error": f"{type(e).__name__}: {e}"}
+                raise
+            self.last[server_id] = {"at": time.time(), **result}
+            return result
+
+    async def snapshots(self, server: dict, host: Optional[dict]) -> List[dict]:
+        result = await self._agent(host, ["list", self._root(), str(server["id"])])
+        return result["snapshots"]
+
+    async def restore(self, server: dict, host: Optional[dict], snapshot: Optional[str] = None,
+                      at: Optional[float] = None) -> dict:
+        """Put the server's saves back as of a snapshot, or the newest one at or before ``at``"""
+        server_id = str(server["id"])
+        args = ["restore", self._root(), server_id, self._source(server), "--delete"]
+        if snapshot:
+            if not SNAPSHOT_ID_RE.match(snapshot):
+                raise ValueError(f"Invalid snapshot id: {snapshot}")
+            args.append(f"--snapshot={snapshot}")
+        elif at is not None:
+            args += ["--at", repr(at)]
+        pre_restore = await self.backup_server(server, host, tag="pre-restore")
+        async with self._lock(server_id):
+            result = await self._agent(host, args, server_id)
+        return {**result, "pre_restore_snapshot": pre_restore["snapshot"]}
+
+    async def prune_host(self, host: Optional[dict], gc: bool = False) -> dict:
+        """Apply the retention policy to every snapshot on the host; with ``gc``, free unused chunks"""
+        args = ["prune", self._root(), "--keep-last", str(BACKUP_KEEP_LAST),
+                "--keep-hourly", str(BACKUP_KEEP_HOURLY), "--keep-daily", str(BACKUP_KEEP_DAILY),
+                "--keep-weekly", str(BACKUP_KEEP_WEEKLY), "--keep-monthly", str(BACKUP_KEEP_MONTHLY)]
+        result = await self._agent(host, args + (["--gc"] if gc else []))
+        if gc:
+            self._gc_at[_host_key(host)] = time.time()
+        return result
+
+    async def host_stats(self, host: Optional[dict]) -> dict:
+        """Chunk count / bytes and snapshots per server of a host's store"""
+        return await self._agent(host, ["stats", self._root()])
+
+    # -- background loop --------------------------------------------------
+
+    async def _load_servers(self) -> List[dict]:
+        from services.supabase_client import get_async_supabase, db_call
+        supabase = await get_async_supabase()
+        result = await db_call(supabase.table("servers").select(BACKUP_COLUMNS).execute())
+        return [row for row in result.data or []
+                if row.get("install_path") and row.get("status") not in SKIP_STATUSES]
+
+    async def run_once(self) -> Dict[str, dict]:
+        """Back up every server, then prune; hosts in parallel, servers of one host one after another"""
+        by_host: Dict[str, List[dict]] = {}
+        for server in await self._load_servers():
+            by_host.setdefault(_host_key(server.get("hosts") or None), []).append(server)
+        results: Dict[str, dict] = {}
+
+        async def backup_host(servers: List[dict]):
+            host = servers[0].get("hosts") or None
+            for server in servers:
+                try:
+                    results[str(server["id"])] = await self.backup_server(server, host, tag="scheduled")
+                except Exception as e:
+                    results[str(server["id"])] = {"error": f"{type(e).__name__}: {e}"}
+            try:
+                gc = time.time() - self._gc_at.get(_host_key(host), 0) >= self.gc_interval
+                await self.prune_host(host, gc=gc)
+            except Exception as e:
+                print(f"⚠️ Backup prune failed on {_host_key(host)}: {e}", flush=True)
+
+        started = time.monotonic()
+        await asyncio.gather(*(backup_host(servers) for servers in by_host.values()))
+        self.last_round = {
+            "at": time.time(),
+            "servers": len(results),
+            "failed": sum(1 for result in results.values() if "error" in result),
+            "unchanged": sum(1 for result in results.values() if result.get("unchanged")),
+            "new_bytes": sum(result.get("new_bytes", 0) for result in results.values()),
+            "stored_bytes": sum(result.get("stored_bytes", 0) for result in results.values()),
+            "duration_s": round(time.monotonic() - started, 3)
+        }
+        return results
+
+    async def _run(self):
+        while True:
+            started = time.monotonic()
+            try:
+                results = await self.run_once()
+                failed = [server_id for server_id, result in results.items() if "error" in result]
+                if failed:
+                    print(f"⚠️ Backup failed for {len(failed)} server(s): {failed[:5]}", flush=True)
+            except Exception as e:
+                print(f"⚠️ Backup round failed: {e}", flush=True)
+            # Rounds start every interval, however long the last one took
+            await asyncio.sleep(max(self.interval - (time.monotonic() - started), 0))
+
+    def start(self):
+        if self.root and self.interval > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": bool(self.root),
+            "interval_s": self.interval,
+            "running": self.running,
+            "last_round": self.last_round,
+            "failed": {server_id: last["error"] for server_id, last in self.last.items() if "error" in last}
+        }
+
+
+_manager: Optional[BackupManager] = None
+
+
+def get_backups() -> BackupManager:
+    """Get the process-wide backup manager singleton"""
+    global _manager
+    if _manager is None:
+        _manager = BackupManager()
+    return _manager
@@ -0,0 +1,124 @@
+"""In-process publish/subscribe channel for pushing data to many clients.
+
+A message is serialized once per publish and handed to every subscriber's
+bounded queue. A subscriber that cannot keep up loses its oldest frames
+instead of growing its buffer, so one slow client never holds memory for
+everyone else.
+"""
+import asyncio
+import json
+from typing import Any, Optional, Set
+
+# Frames buffered per subscriber before old ones are dropped
+DEFAULT_QUEUE_SIZE = 8
+
+
+class Subscription:
+    """One client's view of a broadcast channel"""
+
+    def __init__(self, channel: "Broadcaster", maxsize: int):
+        self.channel = channel
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def push(self, frame: Optional[str]):
+        """Enqueue without blocking; drop the oldest frame when full"""
+        if self.queue.full():
+            try:
+                self.queue.get_nowait()
+                self.dropped += 1
+            except asyncio.QueueEmpty:
+                pass
+        self.queue.put_nowait(frame)
+
+    async def get(self) -> Optional[str]:
+        """Next frame; None once the channel is closed"""
+        return await self.queue.get()
+
+    def close(self):
+        self.channel.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        frame = await self.queue.get()
+        if frame is None:
+            raise StopAsyncIteration
+        return frame
+
+
+class Broadcaster:
+    """Fan-out of serialized frames to all current subscribers"""
+
+    def __init__(self, name: str, queue_size: int = DEFAULT_QUEUE_SIZE, replay_last: bool = True):
+        self.name = name
+        self.queue_size = queue_size
+        self.replay_last = replay_last
+        self.subscribers: Set[Subscription] = set()
+        self.last_frame: Optional[str] = None
+        self.published = 0
+        self.dropped = 0
+        self.closed = False
+
+    def subscribe(self, queue_size: Optional[int] = None) -> Subscription:
+        sub = Subscription(self, queue_size or self.queue_size)
+        if self.replay_last and self.last_frame is not None:
+            # New viewers get the current state immediately
+            sub.push(self.last_frame)
+        if self.closed:
+            sub.push(None)
+        else:
+            self.subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        if sub in self.subscribers:
+            self.subscribers.discard(sub)
+            self.dropped += sub.dropped
+
+    def publish(self, message: Any) -> str:
+        """Serialize once and push to every subscriber (must run on the event loop)"""
+        frame = message if isinstance(message, str) else json.dumps(message, default=str)
+        self.last_frame = frame
+        self.published += 1
+        for sub in self.subscribers:
+            sub.push(frame)
+        return frame
+
+    def close(self):
+        """End every subscription after its queued frames (finite streams, e.g. a job)"""
+        self.closed = True
+        for sub in list(self.subscribers):
+            sub.push(None)
+            self.unsubscribe(sub)
+
+    def stats(self) -> dict:
+        return {
+            "channel": self.name,
+            "subscribers": len(self.subscribers),
+            "published": self.published,
+            "dropped": self.dropped + sum(sub.dropped for sub in self.subscribers)
+        }
+
+
+async def sse_stream(sub: Subscription, keepalive: float = 15.0):
+    """Yield Server-Sent Events for a subscription (use with StreamingResponse)"""
+    try:
+        while True:
+            try:
+                frame = await asyncio.wait_for(sub.get(), timeout=keepalive)
+                if frame is None:
+                    return
+                yield f"data: {frame}\n\n"
+            except asyncio.TimeoutError:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keepalive\n\n"
+    finally:
+        sub.close()
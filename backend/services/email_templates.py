@@ -0,0 +1,58 @@
+"""Email template registry.
+
+All email templates live in ``backend/templates/email`` and are compiled by
+one shared Jinja2 ``Environment``. Each template is parsed and compiled once
+(on first use, or upfront via ``warm_templates``) and then rendered from the
+in-memory cache. The compiled bytecode is also cached on disk, so a
+restarted backend skips the parse step. Layout, styles and common blocks
+(buttons, info boxes, footer) live in ``layout.html`` / ``_macros.html``.
+"""
+import os
+from typing import Optional
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, select_autoescape
+
+TEMPLATE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'templates', 'email'))
+# Unset: Jinja's default, a per-user directory (mode 0700, ownership checked)
+# in the temp dir - a fixed shared path could be pre-created by another user
+BYTECODE_CACHE_DIR = os.getenv("EMAIL_TEMPLATE_CACHE_DIR")
+
+_environment: Optional[Environment] = None
+
+
+def _bytecode_cache() -> Optional[FileSystemBytecodeCache]:
+    try:
+        if not BYTECODE_CACHE_DIR:
+            return FileSystemBytecodeCache()
+        os.makedirs(BYTECODE_CACHE_DIR, mode=0o700, exist_ok=True)
+        return FileSystemBytecodeCache(BYTECODE_CACHE_DIR)
+    except (OSError, RuntimeError) as e:
+        print(f"Email template bytecode cache disabled: {e}", flush=True)
+        return None
+
+
+def get_environment() -> Environment:
+    """Get the shared Jinja2 environment for email templates"""
+    global _environment
+    if _environment is None:
+        _environment = Environment(
+            loader=FileSystemLoader(TEMPLATE_DIR),
+            autoescape=select_autoescape(["html"]),
+            bytecode_cache=_bytecode_cache(),
+            # Templates only change on deploy (which restarts the backend)
+            auto_reload=False,
+            cache_size=-1
+        )
+    return _environment
+
+
+def render_email(name: str, **context) -> str:
+    """Render a compiled email template, e.g. ``render_email("token.html", ...)``"""
+    return get_environment().get_template(name).render(**context)
+
+
+def warm_templates():
+    """Compile every email template upfront"""
+    env = get_environment()
+    for name in env.list_templates(extensions=["html"]):
+        env.get_template(name)
@@ -0,0 +1,287 @@
+"""Token expiry warnings (email + in-app notification N days before expiry).
+
+The scheduler keeps a min-heap of upcoming warning deadlines
+(``expires_at - EXPIRY_WARNING_DAYS``). The heap is filled by range queries
+over the partial index ``idx_tokens_expiry_pending``. Each query covers
+active, not-yet-warned tokens that have not expired yet, and pages with an
+``(expires_at, id)`` cursor, so the table is never scanned. Each new window
+starts over from now, which picks up tokens activated elsewhere with an
+earlier expiry. Only ``EXPIRY_LOOKAHEAD_HOURS`` of deadlines are held in
+memory. The task sleeps until the earliest deadline, or until the loaded
+window runs out, whichever comes first.
+
+Idempotency: every warning email is enqueued with the job dedupe key
+``expiry:<token id>:<expires_at>``, and the token row is then stamped with
+``expiry_warned_at`` by a conditional UPDATE. Only the process whose
+UPDATE stamped a row creates its in-app notification, so restarts and
+several backend processes never send the same warning twice.
+"""
+import asyncio
+import heapq
+import math
+import os
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from services.jobs import enqueue_job
+from services.supabase_client import get_async_supabase, db_call
+from services.unread_counter import unread_counters
+
+EXPIRY_WARNING_DAYS = float(os.getenv("EXPIRY_WARNING_DAYS", "5"))
+EXPIRY_LOOKAHEAD_HOURS = float(os.getenv("EXPIRY_LOOKAHEAD_HOURS", "24"))
+EXPIRY_BATCH_SIZE = int(os.getenv("EXPIRY_BATCH_SIZE", "200"))
+# Deadlines this close together (seconds) go out in one batch
+EXPIRY_BATCH_WINDOW = float(os.getenv("EXPIRY_BATCH_WINDOW", "60"))
+# Upper bound on a single sleep, so clock jumps and missed wakeups self-heal
+EXPIRY_MAX_SLEEP = float(os.getenv("EXPIRY_MAX_SLEEP", "3600"))
+# Back-off after a failed load/dispatch (seconds)
+EXPIRY_RETRY_DELAY = float(os.getenv("EXPIRY_RETRY_DELAY", "60"))
+
+PENDING_COLUMNS = "id, expires_at"
+DISPATCH_COLUMNS = "id, token_code, assigned_to, expires_at"
+
+
+def _parse_ts(value: str) -> float:
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).isoformat()
+
+
+class ExpiryScheduler:
+    """Heap of upcoming expiry warnings, refilled from an indexed cursor"""
+
+    def __init__(self, warning_days: float = EXPIRY_WARNING_DAYS,
+                 lookahead_hours: float = EXPIRY_LOOKAHEAD_HOURS,
+                 batch_size: int = EXPIRY_BATCH_SIZE):
+        self.warning_seconds = warning_days * 86400
+        self.lookahead_seconds = lookahead_hours * 3600
+        self.batch_size = batch_size
+        # (warn_at, token id, expires_at iso)
+        self._heap: List[Tuple[float, str, str]] = []
+        self._queued: Dict[str, str] = {}
+        # Every pending token with expires_at <= _loaded_until is in the heap;
+        # _cursor is the last (expires_at, id) read in the current window
+        self._loaded_until: float = 0.0
+        self._cursor: Optional[Tuple[str, str]] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.loaded = 0
+        self.dispatched = 0
+        self.skipped = 0
+        self.last_error: Optional[str] = None
+
+    # -- heap -------------------------------------------------------------
+
+    def _push(self, token_id: str, expires_at: str):
+        if self._queued.get(token_id) == expires_at:
+            return
+        # A different expiry replaces the queued one (the old heap entry is skipped on pop)
+        self._queued[token_id] = expires_at
+        heapq.heappush(self._heap, (_parse_ts(expires_at) - self.warning_seconds, token_id, expires_at))
+
+    def track(self, token_id: str, expires_at: Optional[str]):
+        """Tell the scheduler about a newly activated (or re-dated) token.
+
+        Tokens beyond the loaded window are picked up by a later refill, so
+        only ones that fall inside it need to be pushed here.
+        """
+        if not expires_at or _parse_ts(expires_at) > self._loaded_until:
+            return
+        self._push(token_id, expires_at)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _refill(self, now: float):
+        """Load pending tokens up to now + warning period + lookahead (index range only)"""
+        target = now + self.warning_seconds + self.lookahead_seconds
+        supabase = await get_async_supabase()
+        while True:
+            query = supabase.table("tokens")\
+                .select(PENDING_COLUMNS)\
+                .eq("status", "active")\
+                .is_("expiry_warned_at", "null")\
+                .gt("expires_at", _iso(time.time()))\
+                .lte("expires_at", _iso(target))
+            if self._cursor is not None:
+                expires_at, token_id = self._cursor
+                query = query.or_(
+                    f'expires_at.gt."{expires_at}",'
+                    f'and(expires_at.eq."{expires_at}",id.gt."{token_id}")'
+                )
+            result = await db_call(query
+                .order("expires_at")
+                .order("id")
+                .limit(self.batch_size)
+                .execute())
+            rows = result.data or []
+            for row in rows:
+                self._push(row["id"], row["expires_at"])
+            self.loaded += len(rows)
+            if rows:
+                self._cursor = (rows[-1]["expires_at"], rows[-1]["id"])
+            if len(rows) < self.batch_size:
+                self._loaded_until = target
+                # Window complete: the next one rescans from now (queued tokens are deduplicated)
+                self._cursor = None
+                return
+            # Full page - keep the window as far as it is actually loaded and
+            # stop once a batch worth of deadlines is queued (the rest follows
+            # after those are dispatched)
+            self._loaded_until = _parse_ts(rows[-1]["expires_at"])
+            if len(self._heap) >= self.batch_size:
+                return
+
+    # -- dispatch ---------------------------------------------------------
+
+    def _pop_due(self, until: float) -> Dict[str, str]:
+        due: Dict[str, str] = {}
+        while self._heap and self._heap[0][0] <= until and len(due) < self.batch_size:
+            _, token_id, expires_at = heapq.heappop(self._heap)
+            # Skip entries superseded by a later track() with a new expiry
+            if self._queued.get(token_id) == expires_at:
+                del self._queued[token_id]
+                due[token_id] = expires_at
+        return due
+
+    async def _dispatch(self, due: Dict[str, str], now: float):
+        """Warn one batch: 3 queries + 1 insert, whatever the batch size"""
+        supabase = await get_async_supabase()
+
+        # Re-check: revoked, re-dated or already warned (by another process) tokens drop out
+        result = await db_call(supabase.table("tokens")\
+            .select(DISPATCH_COLUMNS)\
+            .in_("id", list(due))\
+            .eq("status", "active")\
+            .is_("expiry_warned_at", "null")\
+            .execute())
+        # Already expired (e.g. the backend was down over the deadline): too late to warn
+        tokens = [t for t in (result.data or [])
+                  if t["assigned_to"] and _parse_ts(t["expires_at"]) == _parse_ts(due[t["id"]])
+                  and _parse_ts(t["expires_at"]) > now]
+        self.skipped += len(due) - len(tokens)
+        if not tokens:
+            return
+
+        user_ids = list({t["assigned_to"] for t in tokens})
+        result = await db_call(supabase.table("profiles")\
+            .select("id, email, username")\
+            .in_("id", user_ids)\
+            .execute())
+        profiles = {p["id"]: p for p in (result.data or [])}
+
+        days_remaining = {
+            token["id"]: max(1, math.ceil((_parse_ts(token["expires_at"]) - now) / 86400)) for token in tokens
+        }
+        for token in tokens:
+            profile = profiles.get(token["assigned_to"])
+            if profile is not None:
+                await enqueue_job(
+                    "email.expiry",
+                    {
+                        "email": profile["email"],
+                        "username": profile.get("username") or profile["email"].split("@")[0],
+                        "token_code": token["token_code"],
+                        "days_remaining": days_remaining[token["id"]]
+                    },
+                    dedupe_key=f"expiry:{token['id']}:{token['expires_at']}"
+                )
+
+        # The conditional stamp decides which process warns in-app: only the
+        # rows it actually updated get a notification (emails are deduplicated
+        # by their job keys)
+        result = await db_call(supabase.table("tokens")\
+            .update({"expiry_warned_at": _iso(now)})\
+            .in_("id", [t["id"] for t in tokens])\
+            .is_("expiry_warned_at", "null")\
+            .execute())
+        stamped = {row["id"] for row in (result.data or [])}
+        notifications = [{
+            "user_id": token["assigned_to"],
+            "title": "Token hamarosan lejár",
+            "message": f"A tokened {days_remaining[token['id']]} nap múlva lejár.",
+            "type": "warning",
+            "link": "/tokens"
+        } for token in tokens if token["id"] in stamped]
+        if notifications:
+            await db_call(supabase.table("notifications").insert(notifications).execute())
+            unread_counters.incr(n["user_id"] for n in notifications)
+            print(f"📨 Expiry warnings queued for {len(notifications)} token(s)", flush=True)
+        self.dispatched += len(stamped)
+
+    # -- loop -------------------------------------------------------------
+
+    def _next_wakeup(self, now: float) -> float:
+        """Seconds until the earliest deadline or until the loaded window runs out"""
+        refill_at = self._loaded_until - self.warning_seconds - EXPIRY_BATCH_WINDOW
+        first_due = self._heap[0][0] - EXPIRY_BATCH_WINDOW if self._heap else refill_at
+        wake_at = min(first_due, refill_at)
+        return min(max(wake_at - now, 0.0), EXPIRY_MAX_SLEEP)
+
+    async def _run(self):
+        while True:
+            try:
+                now = time.time()
+                if self._loaded_until - self.warning_seconds <= now + EXPIRY_BATCH_WINDOW:
+                    await self._refill(now + EXPIRY_BATCH_WINDOW)
+                due = self._pop_due(now + EXPIRY_BATCH_WINDOW)
+                if due:
+                    try:
+                        await self._dispatch(due, now)
+                    except Exception:
+                        # Put the batch back so it is retried
+                        for token_id, expires_at in due.items():
+                            self._push(token_id, expires_at)
+                        raise
+                    continue
+                self.last_error = None
+                delay = self._next_wakeup(time.time())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                print(f"⚠️ Expiry scheduler error, retry in {EXPIRY_RETRY_DELAY:.0f}s: {e}", flush=True)
+                delay = EXPIRY_RETRY_DELAY
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        """Start the scheduler on the running event loop (idempotent)"""
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "queued": len(self._queued),
+            "next_warning_at": self._heap[0][0] if self._heap else None,
+            "loaded_until": self._loaded_until or None,
+            "loaded": self.loaded,
+            "dispatched": self.dispatched,
+            "skipped": self.skipped,
+            "last_error": self.last_error
+        }
+
+
+_scheduler: Optional[ExpiryScheduler] = None
+
+
+def get_expiry_scheduler() -> ExpiryScheduler:
+    """Get the process-wide expiry scheduler singleton"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = ExpiryScheduler()
+    return _scheduler
@@ -0,0 +1,128 @@
+"""Run commands on many hosts at once and stream their output.
+
+A fan-out is a list of targets ``(label, host, command)``, usually one per
+host. Targets run concurrently over the pooled SSH connections, limited at
+two levels:
+
+- ``FANOUT_MAX_CONCURRENCY``: commands in flight across the whole backend;
+- ``FANOUT_PER_HOST``: commands in flight on one host (shared by all
+  fan-outs, and kept below the pool's ``SSH_MAX_CHANNELS``).
+
+Every output line is handed to an async ``on_output(label, stream, line)``
+callback as it arrives. Awaiting the callback is what applies backpressure
+to a slow consumer. Each target has its own timeout. The result is one
+summary row per target.
+"""
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from services.ssh_pool import get_ssh_pool, SSHUnavailable
+
+FANOUT_MAX_CONCURRENCY = int(os.getenv("FANOUT_MAX_CONCURRENCY", "32"))
+FANOUT_PER_HOST = int(os.getenv("FANOUT_PER_HOST", "4"))
+FANOUT_TIMEOUT = float(os.getenv("FANOUT_TIMEOUT", "60"))
+# Longer output lines are cut (a binary blob must not become one huge frame)
+FANOUT_MAX_LINE = int(os.getenv("FANOUT_MAX_LINE", "4096"))
+
+OK = "ok"
+FAILED = "failed"
+TIMEOUT = "timeout"
+UNREACHABLE = "unreachable"
+ERROR = "error"
+
+OutputCallback = Callable[[str, str, str], Awaitable[None]]
+
+_global_slots: Optional[asyncio.Semaphore] = None
+_host_slots: Dict[str, asyncio.Semaphore] = {}
+
+
+def _slots(host_id: str) -> Tuple[asyncio.Semaphore, asyncio.Semaphore]:
+    global _global_slots
+    if _global_slots is None:
+        _global_slots = asyncio.Semaphore(FANOUT_MAX_CONCURRENCY)
+    per_host = _host_slots.get(host_id)
+    if per_host is None:
+        per_host = _host_slots[host_id] = asyncio.Semaphore(FANOUT_PER_HOST)
+    return _global_slots, per_host
+
+
+def _host_id(host) -> str:
+    return str(host["id"] if isinstance(host, dict) else host.id)
+
+
+async def _pump(label: str, stream_name: str, stream, on_output: OutputCallback) -> int:
+    lines = 0
+    while True:
+        line = await stream.readline()
+        if not line:
+            # EOF ("" - a blank line still has its newline)
+            break
+        lines += 1
+        await on_output(label, stream_name, line.rstrip("\r\n")[:FANOUT_MAX_LINE])
+    return lines
+
+
+async def _run_target(label: str, host, command: str, timeout: float,
+                      on_output: OutputCallback) -> dict:
+    row = {
+        "target": label,
+        "host_id": _host_id(host),
+        "status": None,
+        "exit_status": None,
+        "duration_s": None,
+        "stdout_lines": 0,
+        "stderr_lines": 0,
+        "error": None
+    }
+    global_slots, host_slots = _slots(row["host_id"])
+    async with global_slots, host_slots:
+        started = time.monotonic()
+
+        async def execute():
+            async with get_ssh_pool().process(host, command, errors="replace") as process:
+                row["stdout_lines"], row["stderr_lines"] = await asyncio.gather(
+                    _pump(label, "stdout", process.stdout, on_output),
+                    _pump(label, "stderr", process.stderr, on_output)
+                )
+                completed = await process.wait()
+                row["exit_status"] = completed.exit_status
+                if completed.exit_signal:
+                    row["error"] = f"killed by signal {completed.exit_signal[0]}"
+
+        try:
+            await asyncio.wait_for(execute(), timeout)
+            row["status"] = OK if row["exit_status"] == 0 else FAILED
+        except asyncio.TimeoutError:
+            row["status"] = TIMEOUT
+            row["error"] = f"timed out after {timeout:g}s"
+        except SSHUnavailable as e:
+            row["status"] = UNREACHABLE
+            row["error"] = str(e)
+        except Exception as e:
+            row["status"] = ERROR
+            row["error"] = f"{type(e).__name__}: {e}"
+        row["duration_s"] = round(time.monotonic() - started, 3)
+    return row
+
+
+async def run_fanout(targets: List[Tuple[str, object, str]], on_output: OutputCallback,
+                     timeout: float = FANOUT_TIMEOUT) -> List[dict]:
+    """Run every ``(label, host, command)`` target; returns summary rows in target order"""
+    return await asyncio.gather(*(
+        _run_target(label, host, command, timeout, on_output)
+        for label, host, command in targets
+    ))
+
+
+def summarize(rows: List[dict]) -> dict:
+    counts: Dict[str, int] = {}
+    for row in rows:
+        counts[row["status"]] = counts.get(row["status"], 0) + 1
+    durations = [row["duration_s"] for row in rows if row["duration_s"] is not None]
+    return {
+        "targets": len(rows),
+        "by_status": counts,
+        "slowest_s": max(durations) if durations else None
+    }
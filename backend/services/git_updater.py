@@ -0,0 +1,252 @@
+"""Non-blocking git status / self-update for the dashboard.
+
+git runs as an asyncio subprocess, so a slow ``git fetch`` never blocks the
+event loop. The behind-count is cached for ``GIT_STATUS_TTL`` seconds.
+Concurrent status checks share one in-flight fetch (single-flight). An
+update runs as a background task and exposes its progress (step, percent
+parsed from git's ``--progress`` output, log tail) for polling. The last
+update's state is also written to ``backend/data/git-update.json``, because
+the final step restarts this very backend.
+"""
+import asyncio
+import json
+import os
+import re
+import time
+import uuid
+from collections import deque
+from typing import Optional
+
+GIT_CMD = "/usr/bin/git"
+SYSTEMCTL_CMD = "/usr/bin/systemctl"
+GIT_APP_DIR = os.getenv("GIT_APP_DIR", "/opt/zedin-steam-manager")
+GIT_REMOTE = os.getenv("GIT_REMOTE", "origin")
+GIT_BRANCH = os.getenv("GIT_BRANCH", "main")
+# Seconds a fetched behind-count is served without fetching again
+GIT_STATUS_TTL = float(os.getenv("GIT_STATUS_TTL", "300"))
+# Per-command timeout (fetch / pull over a slow network)
+GIT_TIMEOUT = float(os.getenv("GIT_TIMEOUT", "120"))
+
+_state_file = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'git-update.json'))
+
+# "Receiving objects:  45% (450/1000)" etc.
+_PROGRESS_RE = re.compile(r"^(?:remote: )?([A-Za-z ]+):\s+(\d+)%")
+
+IDLE = "idle"
+RUNNING = "running"
+RESTARTING = "restarting"
+DONE = "done"
+UP_TO_DATE = "up_to_date"
+FAILED = "failed"
+
+
+class GitError(Exception):
+    """A git command exited with a non-zero status (or timed out)"""
+
+
+class GitUpdater:
+    """Cached, single-flight git status and background self-update"""
+
+    def __init__(self, app_dir: str = GIT_APP_DIR, remote: str = GIT_REMOTE,
+                 branch: str = GIT_BRANCH, status_ttl: float = GIT_STATUS_TTL):
+        self.app_dir = app_dir
+        self.remote = remote
+        self.branch = branch
+        self.status_ttl = status_ttl
+        self._status: Optional[dict] = None
+        self._status_at = 0.0
+        self._inflight: Optional[asyncio.Future] = None
+        # fetch / pull must not run concurrently on the same repository
+        self._repo_lock: Optional[asyncio.Lock] = None
+        self._update_task: Optional[asyncio.Task] = None
+        self._update = self._load_state()
+
+    # -- commands ---------------------------------------------------------
+
+    async def _git(self, *args: str, on_progress=None) -> str:
+        """Run git without blocking the loop; stderr lines go to ``on_progress``"""
+        process = await asyncio.create_subprocess_exec(
+            GIT_CMD, *args,
+            cwd=self.app_dir,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        stderr_tail = deque(maxlen=20)
+
+        async def read_stderr():
+            # git redraws progress with \r - split on both line endings
+            buffer = b""
+            while True:
+                chunk = await process.stderr.read(1024)
+                if not chunk:
+                    break
+                buffer += chunk
+                *lines, buffer = re.split(rb"[\r\n]", buffer)
+                for raw in lines:
+                    line = raw.decode(errors="replace").strip()
+                    if line:
+                        stderr_tail.append(line)
+                        if on_progress is not None:
+                            on_progress(line)
+
+        try:
+            stdout, _, _ = await asyncio.wait_for(
+                asyncio.gather(process.stdout.read(), read_stderr(), process.wait()),
+                GIT_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise GitError(f"git {args[0]} timed out after {GIT_TIMEOUT:.0f}s")
+        except asyncio.CancelledError:
+            process.kill()
+            raise
+        if process.returncode != 0:
+            detail = stderr_tail[-1] if stderr_tail else f"exit status {process.returncode}"
+            raise GitError(f"git {args[0]} failed: {detail}")
+        return stdout.decode(errors="replace").strip()
+
+    def _ensure_repo(self):
+        if not os.path.exists(os.path.join(self.app_dir, ".git")):
+            raise GitError("Not a git repository")
+
+    async def _fetch_behind(self, on_progress=None) -> int:
+        await self._git("fetch", "--progress", self.remote, self.branch, on_progress=on_progress)
+        count = await self._git("rev-list", f"HEAD...{self.remote}/{self.branch}", "--count")
+        return int(count)
+
+    # -- status -----------------------------------------------------------
+
+    def _lock(self) -> asyncio.Lock:
+        if self._repo_lock is None:
+            self._repo_lock = asyncio.Lock()
+        return self._repo_lock
+
+    async def status(self, refresh: bool = False) -> dict:
+        """Behind-count, fetched at most once per TTL (and once for concurrent callers)"""
+        fresh = self._status is not None and time.monotonic() - self._status_at < self.status_ttl
+        if fresh and not refresh:
+            return {**self._status, "cached": True}
+        if self._update.get("state") in (RUNNING, RESTARTING) and self._status is not None:
+            # Don't queue a fetch behind a running update - it changes the answer anyway
+            return {**self._status, "cached": True, "updating": True}
+
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._refresh_status())
+        # shield: one caller disconnecting must not cancel the shared fetch
+        return {**await asyncio.shield(self._inflight), "cached": False}
+
+    async def _refresh_status(self) -> dict:
+        try:
+            self._ensure_repo()
+            async with self._lock():
+                commits_behind = await self._fetch_behind()
+            self._status = {
+                "updates_available": commits_behind > 0,
+                "commits_behind": commits_behind,
+                "checked_at": time.time()
+            }
+            self._status_at = time.monotonic()
+            return self._status
+        finally:
+            self._inflight = None
+
+    # -- update -----------------------------------------------------------
+
+    def _load_state(self) -> dict:
+        try:
+            with open(_state_file) as f:
+                state = json.load(f)
+            if state.get("state") in (RUNNING, RESTARTING):
+                # We are the restarted backend: the pull went through
+                state["state"] = DONE if state.get("state") == RESTARTING else FAILED
+                if state["state"] == FAILED:
+                    state["error"] = "Backend stopped during the update"
+                state["finished_at"] = state.get("finished_at") or time.time()
+            return state
+        except (OSError, ValueError):
+            return {"state": IDLE}
+
+    def _save_state(self):
+        try:
+            os.makedirs(os.path.dirname(_state_file), exist_ok=True)
+            tmp = f"{_state_file}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(self._update, f)
+            os.replace(tmp, _state_file)
+        except OSError as e:
+            print(f"⚠️ Could not persist git update state: {e}", flush=True)
+
+    def _set(self, **changes):
+        self._update.update(changes)
+        self._save_state()
+
+    def _on_progress(self, line: str):
+        self._update["log"].append(line)
+        del self._update["log"][:-20]
+        match = _PROGRESS_RE.match(line)
+        if match:
+            self._update["phase"] = match.group(1).strip()
+            self._update["percent"] = int(match.group(2))
+
+    def update_state(self) -> dict:
+        return dict(self._update)
+
+    def start_update(self) -> dict:
+        """Start an update in the background; a running update is returned as-is"""
+        if self._update_task is not None and not self._update_task.done():
+            return self.update_state()
+        self._ensure_repo()
+        self._update = {
+            "id": uuid.uuid4().hex[:12],
+            "state": RUNNING,
+            "step": "fetch",
+            "phase": None,
+            "percent": None,
+            "commits_behind": None,
+            "log": [],
+            "error": None,
+            "started_at": time.time(),
+            "finished_at": None
+        }
+        self._save_state()
+        self._update_task = asyncio.create_task(self._run_update())
+        return self.update_state()
+
+    async def _run_update(self):
+        try:
+            async with self._lock():
+                commits_behind = await self._fetch_behind(on_progress=self._on_progress)
+                self._set(commits_behind=commits_behind)
+                if commits_behind == 0:
+                    self._set(state=UP_TO_DATE, step=None, finished_at=time.time())
+                    return
+
+                self._set(step="pull", phase=None, percent=None)
+                await self._git("pull", "--progress", self.remote, self.branch, on_progress=self._on_progress)
+
+            # Cached behind-count is now stale
+            self._status = None
+            self._set(state=RESTARTING, step="restart", phase=None, percent=None)
+            # --no-block: queue the restarts and return; restarting the backend ends this process
+            for service in ("zedin-frontend", "zedin-backend"):
+                process = await asyncio.create_subprocess_exec(
+                    SYSTEMCTL_CMD, "--no-block", "restart", service,
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.DEVNULL
+                )
+                await process.wait()
+        except Exception as e:
+            print(f"❌ Git update failed: {e}", flush=True)
+            self._set(state=FAILED, error=str(e), finished_at=time.time())
+
+
+_updater: Optional[GitUpdater] = None
+
+
+def get_git_updater() -> GitUpdater:
+    """Get the process-wide git updater singleton"""
+    global _updater
+    if _updater is None:
+        _updater = GitUpdater()
+    return _updater
@@ -0,0 +1,108 @@
+"""Metrics pushed by remote host agents (see ``agent/metrics_agent.py``).
+
+Every managed host runs a small agent. The agent keeps one WebSocket to the
+backend open and pushes a delta-encoded binary frame per sample
+(``services/metric_frames.py``). The backend never polls hosts over SSH for
+metrics. Decoded samples go into the host's time-series store
+(``agent_store(host_id)``), and the latest values are kept here for the
+all-hosts overview.
+
+Agents authenticate with a per-host key, ``HMAC-SHA256(AGENT_SECRET,
+host_id)``. A leaked key therefore only lets someone report for that one
+host.
+"""
+import hashlib
+import hmac
+import os
+import time
+from typing import Dict, Optional
+
+from services.timeseries import TimeSeriesStore, get_store
+
+AGENT_SECRET = os.getenv("AGENT_SECRET")
+# A host is shown as stale after this many seconds without a frame
+AGENT_STALE_SECONDS = float(os.getenv("AGENT_STALE_SECONDS", "10"))
+
+
+def agent_store(host_id: str) -> TimeSeriesStore:
+    """History store of a host's agent - namespaced apart from the backend's own "local" store"""
+    return get_store(f"agent:{host_id}")
+
+
+def agent_key(host_id: str) -> str:
+    if not AGENT_SECRET:
+        raise RuntimeError("AGENT_SECRET is not set")
+    return hmac.new(AGENT_SECRET.encode(), host_id.encode(), hashlib.sha256).hexdigest()
+
+
+def verify_agent_key(host_id: str, key: str) -> bool:
+    if not AGENT_SECRET or not host_id or not key:
+        return False
+    return hmac.compare_digest(agent_key(host_id), key)
+
+
+class HostMetrics:
+    """Latest sample and link statistics per agent"""
+
+    def __init__(self):
+        self._hosts: Dict[str, dict] = {}
+
+    def __contains__(self, host_id: str) -> bool:
+        return host_id in self._hosts
+
+    def connected(self, host_id: str, hello: dict):
+        entry = self._hosts.setdefault(host_id, {
+            "values": None,
+            "timestamp": None,
+            "frames": 0,
+            "bytes": 0,
+            "gaps": 0,
+            "connections": 0
+        })
+        entry.update({
+            "connected": True,
+            "connected_at": time.time(),
+            "link_bytes": 0,
+            "interval": hello.get("interval"),
+            "platform": hello.get("platform"),
+            "agent_version": hello.get("agent_version")
+        })
+        entry["connections"] += 1
+
+    def disconnected(self, host_id: str):
+        entry = self._hosts.get(host_id)
+        if entry is not None:
+            entry["connected"] = False
+
+    def ingest(self, host_id: str, ts: float, values: Dict[str, float], nbytes: int):
+        agent_store(host_id).add(values, ts)
+        entry = self._hosts[host_id]
+        entry["frames"] += 1
+        entry["bytes"] += nbytes
+        entry["link_bytes"] += nbytes
+        if entry["timestamp"] is None or ts >= entry["timestamp"]:
+            entry["timestamp"] = ts
+            entry["values"] = values
+
+    def gap(self, host_id: str):
+        self._hosts[host_id]["gaps"] += 1
+
+    def overview(self, host_id: Optional[str] = None) -> dict:
+        now = time.time()
+        hosts = {}
+        for key, entry in self._hosts.items():
+            if host_id is not None and key != host_id:
+                continue
+            age = now - entry["timestamp"] if entry["timestamp"] else None
+            uptime = now - entry["connected_at"]
+            hosts[key] = {
+                **entry,
+                "age_s": round(age, 3) if age is not None else None,
+                "stale": age is None or age > AGENT_STALE_SECONDS,
+                # Average link cost since connect (frame payload only)
+                "bytes_per_s": round(entry["link_bytes"] / uptime, 1) if entry["connected"] and uptime > 0 else 0.0
+            }
+        return hosts
+
+
+host_metrics = HostMetrics()
@@ -0,0 +1,415 @@
+"""Durable background job queue.
+
+Jobs are rows in a ``background_jobs`` table (SQLite by default, Postgres via
+``JOBS_DATABASE_URL``), so queued work survives backend restarts such as the
+one triggered by ``/git-update``. A pool of asyncio workers claims jobs with
+a lease, which the worker renews while the handler runs. A job whose worker
+died is picked up again once its lease expires, which gives at-least-once
+delivery. Handlers must therefore be idempotent. The queue owns retries:
+a handler that raises is retried with backoff, unless it raises
+``PermanentJobError``.
+A ``dedupe_key`` makes enqueueing idempotent: a second job with the same key
+is not created.
+
+Usage::
+
+    register_job("email.verification", send_verification_email)
+    await enqueue_job("email.verification", {"email": ..., ...}, dedupe_key=...)
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from sqlalchemy import (
+    Column, Float, Integer, MetaData, String, Table, Text,
+    create_engine, event, func, select, update, delete, or_, and_
+)
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+
+_default_db = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'jobs.db'))
+JOBS_DATABASE_URL = os.getenv("JOBS_DATABASE_URL", f"sqlite:///{_default_db}")
+JOBS_CONCURRENCY = int(os.getenv("JOBS_CONCURRENCY", "4"))
+# Seconds a claimed job stays invisible to other workers
+JOBS_LEASE_SECONDS = float(os.getenv("JOBS_LEASE_SECONDS", "300"))
+JOBS_POLL_INTERVAL = float(os.getenv("JOBS_POLL_INTERVAL", "1"))
+JOBS_RETRY_BASE = float(os.getenv("JOBS_RETRY_BASE", "5"))
+# Finished jobs are kept this long (seconds) so dedupe keys keep working
+JOBS_RETENTION = float(os.getenv("JOBS_RETENTION", str(7 * 86400)))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+metadata = MetaData()
+
+jobs_table = Table(
+    "background_jobs",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("kind", String(100), nullable=False),
+    Column("payload", Text, nullable=False),
+    Column("dedupe_key", String(255), unique=True, nullable=True),
+    Column("status", String(20), nullable=False, default=QUEUED, index=True),
+    Column("attempts", Integer, nullable=False, default=0),
+    Column("max_attempts", Integer, nullable=False, default=5),
+    Column("run_at", Float, nullable=False, index=True),
+    Column("locked_until", Float, nullable=True),
+    Column("created_at", Float, nullable=False),
+    Column("started_at", Float, nullable=True),
+    Column("finished_at", Float, nullable=True),
+    Column("last_error", Text, nullable=True),
+)
+
+JobHandler = Callable[..., Awaitable[Any]]
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler when retrying cannot help (the job fails at once)"""
+
+
+class JobQueue:
+    """Table-backed job queue with an asyncio worker pool"""
+
+    def __init__(self, database_url: str = JOBS_DATABASE_URL, concurrency: int = JOBS_CONCURRENCY,
+                 lease_seconds: float = JOBS_LEASE_SECONDS, poll_interval: float = JOBS_POLL_INTERVAL):
+        self.database_url = database_url
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.handlers: Dict[str, JobHandler] = {}
+        self._engine: Optional[Engine] = None
+        self._engine_lock = threading.Lock()
+        # SQLite cannot upgrade concurrent read transactions to writes - claim one at a time
+        self._claim_lock = threading.Lock() if database_url.startswith("sqlite") else None
+        self._workers = []
+        self._janitor_task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        # Recent (queue wait, run time) pairs for latency metrics
+        self._latencies = deque(maxlen=1000)
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+
+    # -- storage ----------------------------------------------------------
+
+    @property
+    def engine(self) -> Engine:
+        with self._engine_lock:
+            if self._engine is None:
+                self._engine = self._create_engine()
+        return self._engine
+
+    def _create_engine(self) -> Engine:
+        if not self.database_url.startswith("sqlite"):
+            engine = create_engine(self.database_url, pool_pre_ping=True)
+        else:
+            path = self.database_url.split("///", 1)[-1]
+            if path and path != ":memory:":
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            engine = create_engine(
+                self.database_url,
+                connect_args={"check_same_thread": False, "timeout": 30}
+            )
+
+            @event.listens_for(engine, "connect")
+            def _sqlite_pragmas(dbapi_conn, _record):
+                # WAL lets readers (stats) run while a worker writes
+                cursor = dbapi_conn.cursor()
+                cursor.execute("PRAGMA journal_mode=WAL")
+                cursor.execute("PRAGMA synchronous=NORMAL")
+                cursor.close()
+        metadata.create_all(engine)
+        return engine
+
+    def _insert(self, kind: str, payload: dict, dedupe_key: Optional[str],
+                run_at: float, max_attempts: int) -> int:
+        now = time.time()
+        with self.engine.begin() as conn:
+            try:
+                with conn.begin_nested():
+                    result = conn.execute(jobs_table.insert().values(
+                        kind=kind,
+                        payload=json.dumps(payload, default=str),
+                        dedupe_key=dedupe_key,
+                        status=QUEUED,
+                        attempts=0,
+                        max_attempts=max_attempts,
+                        run_at=run_at,
+                        created_at=now
+                    ))
+                    return result.inserted_primary_key[0]
+            except IntegrityError:
+                # Same dedupe key already queued (or done) - return that job
+                existing = conn.execute(
+                    select(jobs_table.c.id).where(jobs_table.c.dedupe_key == dedupe_key)
+                ).scalar()
+                return existing
+
+    def _claim(self) -> Optional[dict]:
+        """Lease the next runnable job (queued and due, or running with an expired lease)"""
+        now = time.time()
+        runnable = or_(
+            and_(jobs_table.c.status == QUEUED, jobs_table.c.run_at <= now),
+            and_(jobs_table.c.status == RUNNING, jobs_table.c.locked_until < now,
+                 jobs_table.c.attempts < jobs_table.c.max_attempts)
+        )
+        if self._claim_lock is not None:
+            with self._claim_lock:
+                return self._claim_next(runnable, now)
+        return self._claim_next(runnable, now)
+
+    def _claim_next(self, runnable, now: float) -> Optional[dict]:
+        with self.engine.begin() as conn:
+            # Lease expired on the last attempt (the handler took the process
+            # down every time) - give up instead of retrying it forever
+            conn.execute(
+                update(jobs_table)
+                .where(and_(
+                    jobs_table.c.status == RUNNING,
+                    jobs_table.c.locked_until < now,
+                    jobs_table.c.attempts >= jobs_table.c.max_attempts
+                ))
+                .values(status=FAILED, locked_until=None, finished_at=now,
+                        last_error="Lease expired on the last attempt")
+            )
+            candidates = conn.execute(
+                select(jobs_table.c.id, jobs_table.c.status)
+                .where(runnable)
+                .order_by(jobs_table.c.run_at)
+                .limit(self.concurrency)
+                .with_for_update(skip_locked=True)
+            ).all()
+            for job_id, status in candidates:
+                # Conditional update - only one worker (in any process) wins the row
+                claimed = conn.execute(
+                    update(jobs_table)
+                    .where(and_(jobs_table.c.id == job_id, runnable))
+                    .values(
+                        status=RUNNING,
+                        locked_until=now + self.lease_seconds,
+                        started_at=now,
+                        attempts=jobs_table.c.attempts + 1
+                    )
+                ).rowcount
+                if claimed:
+                    row = conn.execute(select(jobs_table).where(jobs_table.c.id == job_id)).mappings().one()
+                    return dict(row)
+        return None
+
+    def _renew(self, job_id: int, attempts: int) -> bool:
+        """Extend the lease of a running job. False if another worker took it over."""
+        with self.engine.begin() as conn:
+            return conn.execute(
+                update(jobs_table)
+                .where(and_(
+                    jobs_table.c.id == job_id,
+                    jobs_table.c.status == RUNNING,
+                    jobs_table.c.attempts == attempts
+                ))
+                .values(locked_until=time.time() + self.lease_seconds)
+            ).rowcount > 0
+
+    def _release(self, job_id: int, attempts: int):
+        """Put a running job back in the queue (attempts unchanged), if this worker still holds it"""
+        with self.engine.begin() as conn:
+            conn.execute(
+                update(jobs_table)
+                .where(and_(
+                    jobs_table.c.id == job_id,
+                    jobs_table.c.status == RUNNING,
+                    jobs_table.c.attempts == attempts
+                ))
+                .values(status=QUEUED, locked_until=None)
+            )
+
+    def _finish(self, job_id: int, status: str, error: Optional[str] = None,
+                run_at: Optional[float] = None):
+        values = {"status": status, "locked_until": None, "last_error": error}
+        if status in (DONE, FAILED):
+            values["finished_at"] = time.time()
+        if run_at is not None:
+            values["run_at"] = run_at
+        with self.engine.begin() as conn:
+            conn.execute(update(jobs_table).where(jobs_table.c.id == job_id).values(**values))
+
+    def _purge(self):
+        cutoff = time.time() - JOBS_RETENTION
+        with self.engine.begin() as conn:
+            conn.execute(delete(jobs_table).where(and_(
+                jobs_table.c.status.in_([DONE, FAILED]),
+                jobs_table.c.finished_at < cutoff
+            )))
+
+    def _counts(self) -> dict:
+        now = time.time()
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(jobs_table.c.status, func.count()).group_by(jobs_table.c.status)
+            ).all()
+            oldest = conn.execute(
+                select(func.min(jobs_table.c.run_at))
+                .where(and_(jobs_table.c.status == QUEUED, jobs_table.c.run_at <= now))
+            ).scalar()
+        counts = {status: count for status, count in rows}
+        counts["oldest_due_age_s"] = round(now - oldest, 3) if oldest else 0.0
+        return counts
+
+    # -- producer side ----------------------------------------------------
+
+    def register(self, kind: str, handler: JobHandler):
+        """Register the coroutine that runs jobs of ``kind`` (called with payload as kwargs)"""
+        self.handlers[kind] = handler
+
+    async def enqueue(self, kind: str, payload: dict, dedupe_key: Optional[str] = None,
+                      delay: float = 0, max_attempts: int = 5) -> int:
+        """Persist a job and wake a worker. Returns the job id."""
+        job_id = await asyncio.to_thread(
+            self._insert, kind, payload, dedupe_key, time.time() + delay, max_attempts
+        )
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    # -- workers ----------------------------------------------------------
+
+    def start(self):
+        """Start the worker pool on the running event loop (idempotent)"""
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        self._workers = [w for w in self._workers if not w.done()]
+        while len(self._workers) < self.concurrency:
+            self._workers.append(asyncio.create_task(self._worker()))
+        if self._janitor_task is None or self._janitor_task.done():
+            self._janitor_task = asyncio.create_task(self._janitor())
+
+    async def stop(self):
+        tasks = self._workers + ([self._janitor_task] if self._janitor_task else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._janitor_task = None
+
+    async def _worker(self):
+        while True:
+            try:
+                job = await asyncio.to_thread(self._claim)
+            except Exception as e:
+                print(f"Job queue claim error: {e}", flush=True)
+                job = None
+            if job is None:
+                # Idle: sleep until an enqueue in this process or the next poll
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self._run(job)
+            except Exception as e:
+                # e.g. recording the outcome failed - the lease expires and
+                # the job is claimed again; keep this worker alive
+                print(f"Job queue error on job {job['id']} ({job['kind']}): {e}", flush=True)
+
+    async def _heartbeat(self, job: dict):
+        """Keep renewing the lease so a slow handler is not claimed a second time"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                if not await asyncio.to_thread(self._renew, job["id"], job["attempts"]):
+                    print(f"⚠️ Job {job['id']} ({job['kind']}) lease lost", flush=True)
+                    return
+            except Exception as e:
+                print(f"Job queue lease renewal error: {e}", flush=True)
+
+    async def _run(self, job: dict):
+        handler = self.handlers.get(job["kind"])
+        started = time.time()
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for job kind '{job['kind']}'")
+            await handler(**json.loads(job["payload"]))
+        except asyncio.CancelledError:
+            # Shutting down - hand the job back now rather than waiting out the
+            # lease (only a crashed worker leaves that to lease expiry)
+            try:
+                await asyncio.shield(asyncio.to_thread(self._release, job["id"], job["attempts"]))
+            except Exception as e:
+                print(f"Job queue release error on job {job['id']}: {e}", flush=True)
+            raise
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if isinstance(e, PermanentJobError) or job["attempts"] >= job["max_attempts"]:
+                self.failed += 1
+                print(f"❌ Job {job['id']} ({job['kind']}) failed permanently: {error}", flush=True)
+                await asyncio.to_thread(self._finish, job["id"], FAILED, error)
+            else:
+                self.retried += 1
+                delay = JOBS_RETRY_BASE * (2 ** (job["attempts"] - 1))
+                print(f"⚠️ Job {job['id']} ({job['kind']}) failed, retry in {delay:.0f}s: {error}", flush=True)
+                await asyncio.to_thread(self._finish, job["id"], QUEUED, error, time.time() + delay)
+            return
+        finally:
+            heartbeat.cancel()
+
+        finished = time.time()
+        self.completed += 1
+        self._latencies.append((started - job["created_at"], finished - started))
+        await asyncio.to_thread(self._finish, job["id"], DONE)
+
+    async def _janitor(self):
+        while True:
+            try:
+                await asyncio.to_thread(self._purge)
+            except Exception as e:
+                print(f"Job queue purge error: {e}", flush=True)
+            await asyncio.sleep(3600)
+
+    # -- metrics ----------------------------------------------------------
+
+    async def stats(self) -> dict:
+        counts = await asyncio.to_thread(self._counts)
+        waits = [w for w, _ in self._latencies]
+        runs = [r for _, r in self._latencies]
+        return {
+            "backlog": counts.get(QUEUED, 0),
+            "running": counts.get(RUNNING, 0),
+            "done": counts.get(DONE, 0),
+            "failed": counts.get(FAILED, 0),
+            "oldest_due_age_s": counts["oldest_due_age_s"],
+            "workers": self.concurrency,
+            "completed_since_start": self.completed,
+            "retried_since_start": self.retried,
+            "failed_since_start": self.failed,
+            "avg_wait_s": round(sum(waits) / len(waits), 3) if waits else 0.0,
+            "max_wait_s": round(max(waits), 3) if waits else 0.0,
+            "avg_run_s": round(sum(runs) / len(runs), 3) if runs else 0.0
+        }
+
+
+_queue: Optional[JobQueue] = None
+
+
+def get_job_queue() -> JobQueue:
+    """Get the process-wide job queue singleton"""
+    global _queue
+    if _queue is None:
+        _queue = JobQueue()
+    return _queue
+
+
+def register_job(kind: str, handler: JobHandler):
+    get_job_queue().register(kind, handler)
+
+
+async def enqueue_job(kind: str, payload: dict, dedupe_key: Optional[str] = None,
+                      delay: float = 0, max_attempts: int = 5) -> int:
+    return await get_job_queue().enqueue(kind, payload, dedupe_key, delay, max_attempts)
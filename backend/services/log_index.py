@@ -0,0 +1,517 @@
+"""Incremental full-text index over game server logs.
+
+Every server gets a SQLite database (``LOG_INDEX_DIR/<server id>.db``)
+with an ``events`` table and an FTS5 index over it. Each run ingests the
+server's log files (``LOG_INDEX_GLOB`` under its install_path: the live
+ShooterGame.log and the rotated backups) from the offset stored for them:
+
+- A file is identified by a hash of its first bytes, not by its name, so
+  a log renamed at server restart keeps its offset and is not indexed
+  twice.
+- Only complete lines are indexed. The new offset is committed in the
+  same transaction as the lines, so an interrupted run resumes exactly
+  where it stopped.
+- Files on remote hosts are read from the offset with ``tail -c +N`` over
+  the pooled SSH connection. Files here are read directly.
+
+Lines are parsed into timestamp, event kind (join, leave, chat, kill,
+tribe, admin, save, error, warning, log), player and tribe. Searches
+filter on the indexed columns and the time range, and use FTS5 for the
+text, so weeks of logs answer in milliseconds. Rows older than
+``LOG_INDEX_RETENTION_DAYS`` are dropped.
+"""
+import asyncio
+import calendar
+import glob
+import hashlib
+import os
+import posixpath
+import re
+import shlex
+import sqlite3
+import time
+from typing import Dict, List, Optional, Tuple
+
+from services.ssh_pool import get_ssh_pool
+from services.steamcmd import is_local
+
+_default_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'log-index'))
+LOG_INDEX_DIR = os.getenv("LOG_INDEX_DIR", _default_dir)
+# Log files to index, relative to the server's install_path
+LOG_INDEX_GLOB = os.getenv("LOG_INDEX_GLOB", "ShooterGame/Saved/Logs/*.log")
+# Seconds between background runs over all servers (0 disables them)
+LOG_INDEX_INTERVAL = float(os.getenv("LOG_INDEX_INTERVAL", "300"))
+LOG_INDEX_RETENTION_DAYS = float(os.getenv("LOG_INDEX_RETENTION_DAYS", "90"))
+# Bytes ingested per file per run; a huge backlog is caught up over several runs
+LOG_INDEX_MAX_BYTES = int(os.getenv("LOG_INDEX_MAX_BYTES", str(512 * 1024 * 1024)))
+
+FINGERPRINT_BYTES = 64
+BATCH_LINES = 5000
+READ_CHUNK = 1 << 20
+MAX_SEARCH_LIMIT = 500
+KINDS = ("join", "leave", "chat", "kill", "tribe", "admin", "save", "error", "warning", "log")
+INDEX_COLUMNS = "id, name, install_path, hosts(id, name, hostname, port, username, ssh_key_path)"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    fingerprint TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    last_ts REAL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    kind TEXT NOT NULL,
+    player TEXT,
+    tribe TEXT,
+    file TEXT NOT NULL,
+    line TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+CREATE INDEX IF NOT EXISTS events_kind_ts ON events (kind, ts);
+CREATE INDEX IF NOT EXISTS events_player_ts ON events (player COLLATE NOCASE, ts);
+CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5 (
+    line, player, tribe, content='events', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS events_ad AFTER DELETE ON events BEGIN
+    INSERT INTO events_fts (events_fts, rowid, line, player, tribe)
+    VALUES ('delete', old.id, old.line, old.player, old.tribe);
+END;
+"""
+
+# [2024.01.15-12.34.56:789][123] - Unreal's log prefix (UTC)
+_UE_PREFIX = re.compile(r"^\[(\d{4})\.(\d\d)\.(\d\d)-(\d\d)\.(\d\d)\.(\d\d):(\d{3})\]\[\s*\d+\]")
+# 2024.01.15_12.34.56: - ARK's game log prefix
+_GAME_PREFIX = re.compile(r"^(\d{4})\.(\d\d)\.(\d\d)_(\d\d)\.(\d\d)\.(\d\d): ")
+_RICH_TEXT = re.compile(r"<RichColor[^>]*>|</>\)?")
+_NET_ID = re.compile(r"\s*\[(?:UniqueNetId|EOS)[^\]]*\]")
+_JOIN = re.compile(r"^(?P<player>.+?) joined this ARK!")
+_LEAVE = re.compile(r"^(?P<player>.+?) left this ARK!")
+_TRIBE = re.compile(r"^Tribe (?P<tribe>.+?), ID \d+: (?:Day \d+, [\d:]+: )?(?P<text>.*)$")
+_KILLED = re.compile(r"^(?P<player>.+?) - Lvl \d+.*? was killed")
+_ADMIN = re.compile(r"^AdminCmd: .*?\(PlayerName: (?P<player>[^,)]+)")
+_CHAT = re.compile(r"^(?P<account>[^():\[\]]{1,64}) \((?P<player>[^()]{1,64})\): ")
+_UE_SEVERITY = re.compile(r"^Log\w+: (?P<severity>Error|Fatal|Warning): ")
+
+
+def _epoch(match: re.Match) -> float:
+    year, month, day, hour, minute, second = (int(g) for g in match.groups()[:6])
+    ts = calendar.timegm((year, month, day, hour, minute, second))
+    if len(match.groups()) > 6:
+        ts += int(match.group(7)) / 1000
+    return ts
+
+
+def _player(name: str) -> str:
+    return _NET_ID.sub("", name).strip()
+
+
+def parse_line(line: str) -> Tuple[Optional[float], str, Optional[str], Optional[str], str]:
+    """Log line -> (timestamp or None, kind, player, tribe, text without prefixes)"""
+    ts = None
+    match = _UE_PREFIX.match(line)
+    if match:
+        ts = _epoch(match)
+        line = line[match.end():]
+    match = _GAME_PREFIX.match(line)
+    if match:
+        ts = _epoch(match)
+        line = line[match.end():]
+    text = _RICH_TEXT.sub("", line).strip()
+
+    match = _TRIBE.match(text)
+    if match:
+        killed = _KILLED.match(match.group("text"))
+        if killed:
+            return ts, "kill", _player(killed.group("player")), match.group("tribe"), text
+        return ts, "tribe", None, match.group("tribe"), text
+    for kind, pattern in (("join", _JOIN), ("leave", _LEAVE), ("admin", _ADMIN)):
+        match = pattern.match(text)
+        if match:
+            return ts, kind, _player(match.group("player")), None, text
+    match = _KILLED.match(text)
+    if match:
+        return ts, "kill", _player(match.group("player")), None, text
+    match = _CHAT.match(text)
+    if match:
+        return ts, "chat", match.group("player").strip(), None, text
+    if "World Save Complete" in text or text.startswith("Saving world"):
+        return ts, "save", None, None, text
+    match = _UE_SEVERITY.match(text)
+    if match:
+        return ts, "warning" if match.group("severity") == "Warning" else "error", None, None, text
+    return ts, "log", None, None, text
+
+
+def fts_query(text: str) -> str:
+    """User search text -> FTS5 query: every word must match, ``word*`` matches a prefix"""
+    terms = []
+    for word in text.split():
+        prefix = word.endswith("*")
+        word = word.rstrip("*").replace('"', '""')
+        if word:
+            terms.append(f'"{word}"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+def _safe_name(server_id: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", str(server_id))
+
+
+class ServerLogIndex:
+    """One server's index database"""
+
+    def __init__(self, server_id: str, directory: str = LOG_INDEX_DIR):
+        self.server_id = str(server_id)
+        self.path = os.path.join(directory, f"{_safe_name(server_id)}.db")
+        self._conn: Optional[sqlite3.Connection] = None
+        # One run at a time per server
+        self.lock = asyncio.Lock()
+        self.last_run: Optional[dict] = None
+
+    def _writer(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            # WAL lets searches run while a run writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _reader(self) -> Optional[sqlite3.Connection]:
+        if not os.path.exists(self.path):
+            return None
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    # -- writing (called in a worker thread) ------------------------------
+
+    def sources(self) -> Dict[str, Tuple[int, Optional[float]]]:
+        rows = self._writer().execute("SELECT fingerprint, offset, last_ts FROM sources").fetchall()
+        return {fingerprint: (offset, last_ts) for fingerprint, offset, last_ts in rows}
+
+    def ingest(self, fingerprint: str, path: str, last_ts: Optional[float],
+               lines: List[str], new_offset: int) -> Optional[float]:
+        """Insert parsed lines and move the file's offset, in one transaction"""
+        rows = []
+        name = posixpath.basename(path)
+        parsed = [parse_line(line) for line in lines]
+        if last_ts is None:
+            # Lines before the file's first timestamp (the "Log file open" header) take that timestamp
+            last_ts = next((ts for ts, *_ in parsed if ts is not None), time.time())
+        for ts, kind, player, tribe, text in parsed:
+            if not text:
+                continue
+            if ts is None:
+                # Unprefixed lines (e.g. startup output) belong to the last timestamp seen
+                ts = last_ts
+            last_ts = ts
+            rows.append((ts, kind, player, tribe, name, text))
+        conn = self._writer()
+        with conn:
+            last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+            conn.executemany(
+                "INSERT INTO events (ts, kind, player, tribe, file, line) VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+            # One FTS insert per batch is much cheaper than a trigger per row
+            conn.execute(
+                "INSERT INTO events_fts (rowid, line, player, tribe) "
+                "SELECT id, line, player, tribe FROM events WHERE id > ?", (last_id,)
+            )
+            conn.execute(
+                "INSERT INTO sources (fingerprint, path, offset, last_ts, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (fingerprint) DO UPDATE SET path = excluded.path, offset = excluded.offset, "
+                "last_ts = excluded.last_ts, updated_at = excluded.updated_at",
+                (fingerprint, path, new_offset, last_ts, time.time())
+            )
+        return last_ts
+
+    def expire(self, before: float) -> int:
+        conn = self._writer()
+        with conn:
+            return conn.execute("DELETE FROM events WHERE ts < ?", (before,)).rowcount
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    # -- reading ----------------------------------------------------------
+
+    def search(self, text: Optional[str] = None, kind: Optional[str] = None, player: Optional[str] = None,
+               since: Optional[float] = None, until: Optional[float] = None, limit: int = 100,
+               cursor: Optional[Tuple[float, int]] = None) -> dict:
+        """Newest first; ``cursor`` (ts, id) continues after the last row of a previous page.
+
+        Text searches come in log order, which is time order except for
+        log files that were copied in later.
+        """
+        conn = self._reader()
+        if conn is None:
+            return {"events": [], "next_cursor": None}
+        where, params = [], []
+        if since is not None:
+            where.append("e.ts >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("e.ts <= ?")
+            params.append(until)
+        if kind:
+            where.append("e.kind = ?")
+            params.append(kind)
+        if player:
+            where.append("e.player = ? COLLATE NOCASE")
+            params.append(player)
+        text_query = fts_query(text) if text else ""
+        if text_query:
+            # Matches in log (rowid) order: FTS5 stops after `limit`
+            # instead of sorting every match by time
+            source = "events_fts f JOIN events e ON e.id = f.rowid"
+            where.insert(0, "events_fts MATCH ?")
+            params.insert(0, text_query)
+            if cursor is not None:
+                where.append("f.rowid < ?")
+                params.append(cursor[1])
+            order = "f.rowid DESC"
+        else:
+            source = "events e"
+            if cursor is not None:
+                where.append("(e.ts < ? OR (e.ts = ? AND e.id < ?))")
+                params.extend((cursor[0], cursor[0], cursor[1]))
+            order = "e.ts DESC, e.id DESC"
+        sql = f"SELECT e.id, e.ts, e.kind, e.player, e.tribe, e.file, e.line FROM {source}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {order} LIMIT ?"
+        params.append(limit)
+        try:
+            rows = [dict(row) for row in conn.execute(sql, params).fetchall()]
+        except sqlite3.OperationalError as e:
+            # FTS5 syntax errors in the search text
+            raise ValueError(f"Invalid search: {e}") from e
+        finally:
+            conn.close()
+        next_cursor = f"{rows[-1]['ts']!r},{rows[-1]['id']}" if len(rows) == limit else None
+        return {"events": rows, "next_cursor": next_cursor}
+
+    def stats(self) -> dict:
+        conn = self._reader()
+        if conn is None:
+            return {"events": 0, "sources": []}
+        try:
+            events, first, last = conn.execute("SELECT COUNT(*), MIN(ts), MAX(ts) FROM events").fetchone()
+            sources = [dict(row) for row in conn.execute(
+                "SELECT path, offset, last_ts, updated_at FROM sources ORDER BY updated_at DESC"
+            ).fetchall()]
+        finally:
+            conn.close()
+        return {
+            "events": events,
+            "first_ts": first,
+            "last_ts": last,
+            "bytes": os.path.getsize(self.path),
+            "sources": sources,
+            "last_run": self.last_run
+        }
+
+
+def _list_local(pattern: str) -> List[Tuple[str, int, str]]:
+    """(path, size, fingerprint) of the matching files, oldest first"""
+    files = []
+    for path in glob.glob(pattern):
+        try:
+            with open(path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                mtime = os.fstat(f.fileno()).st_mtime
+                head = f.read(FINGERPRINT_BYTES)
+        except OSError:
+            continue
+        if len(head) == FINGERPRINT_BYTES:
+            files.append((mtime, path, size, hashlib.md5(head).hexdigest()))
+    return [(path, size, fingerprint) for _, path, size, fingerprint in sorted(files)]
+
+
+async def _list_remote(host: dict, pattern: str) -> List[Tuple[str, int, str]]:
+    directory, name = posixpath.split(pattern)
+    script = (
+        f"cd -- {shlex.quote(directory)} 2>/dev/null || exit 0; "
+        f"for f in {name}; do [ -f \"$f\" ] || continue; "
+        f"s=$(stat -c '%s %Y' -- \"$f\"); [ \"${{s%% *}}\" -ge {FINGERPRINT_BYTES} ] || continue; "
+        f"h=$(head -c {FINGERPRINT_BYTES} -- \"$f\" | md5sum); echo \"${{h%% *}} $s $f\"; done"
+    )
+    result = await get_ssh_pool().run(host, script, timeout=60, check=True)
+    files = []
+    for line in result.stdout.splitlines():
+        parts = line.split(" ", 3)
+        if len(parts) == 4:
+            fingerprint, size, mtime, filename = parts
+            files.append((int(mtime), posixpath.join(directory, filename), int(size), fingerprint))
+    return [(path, size, fingerprint) for _, path, size, fingerprint in sorted(files)]
+
+
+class LogIndexer:
+    """Runs incremental index passes per server and answers searches"""
+
+    def __init__(self, directory: str = LOG_INDEX_DIR, interval: float = LOG_INDEX_INTERVAL):
+        self.directory = directory
+        self.interval = interval
+        self._indexes: Dict[str, ServerLogIndex] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def index_for(self, server_id: str) -> ServerLogIndex:
+        index = self._indexes.get(str(server_id))
+        if index is None:
+            index = self._indexes[str(server_id)] = ServerLogIndex(server_id, self.directory)
+        return index
+
+    async def _read_chunks(self, host: Optional[dict], path: str, offset: int, end: int):
+        """Bytes of the file from ``offset`` up to ``end``"""
+        if is_local(host):
+            with open(path, "rb") as f:
+                while offset < end:
+                    data = os.pread(f.fileno(), min(READ_CHUNK, end - offset), offset)
+                    if not data:
+                        return
+                    offset += len(data)
+                    yield data
+            return
+        command = f"tail -c +{offset + 1} -- {shlex.quote(path)} | head -c {end - offset}"
+        async with get_ssh_pool().process(host, command, encoding=None) as process:
+            while True:
+                data = await process.stdout.read(READ_CHUNK)
+                if not data:
+                    return
+                yield data
+
+    async def _ingest_file(self, index: ServerLogIndex, host: Optional[dict], path: str, size: int,
+                           fingerprint: str, offset: int, last_ts: Optional[float]) -> Tuple[int, int]:
+        """Index the complete lines after ``offset``; returns (lines, bytes)"""
+        end = min(size, offset + LOG_INDEX_MAX_BYTES)
+        pending = b""
+        lines: List[str] = []
+        total_lines = 0
+        position = offset
+        async for data in self._read_chunks(host, path, offset, end):
+            pending += data
+            cut = pending.rfind(b"\n")
+            if cut < 0:
+                continue
+            complete, pending = pending[:cut + 1], pending[cut + 1:]
+            position += len(complete)
+            lines.extend(
+                line.rstrip("\r").lstrip("\ufeff")
+                for line in complete[:-1].decode("utf-8", errors="replace").split("\n")
+            )
+            if len(lines) >= BATCH_LINES:
+                last_ts = await asyncio.to_thread(index.ingest, fingerprint, path, last_ts, lines, position)
+                total_lines += len(lines)
+                lines = []
+        if lines or position != offset:
+            await asyncio.to_thread(index.ingest, fingerprint, path, last_ts, lines, position)
+            total_lines += len(lines)
+        return total_lines, position - offset
+
+    async def index_server(self, server: dict, host: Optional[dict]) -> dict:
+        """One incremental pass over the server's log files"""
+        if not server.get("install_path"):
+            raise ValueError("Server has no install_path")
+        index = self.index_for(server["id"])
+        async with index.lock:
+            started = time.monotonic()
+            if is_local(host):
+                files = await asyncio.to_thread(_list_local, os.path.join(server["install_path"], LOG_INDEX_GLOB))
+            else:
+                files = await _list_remote(host, posixpath.join(server["install_path"], LOG_INDEX_GLOB))
+            known = await asyncio.to_thread(index.sources)
+            lines = read = 0
+            for path, size, fingerprint in files:
+                offset, last_ts = known.get(fingerprint, (0, None))
+                if size <= offset:
+                    continue
+                file_lines, file_bytes = await self._ingest_file(index, host, path, size, fingerprint, offset, last_ts)
+                lines += file_lines
+                read += file_bytes
+            expired = 0
+            if LOG_INDEX_RETENTION_DAYS > 0:
+                expired = await asyncio.to_thread(index.expire, time.time() - LOG_INDEX_RETENTION_DAYS * 86400)
+            index.last_run = {
+                "at": time.time(),
+                "files": len(files),
+                "lines": lines,
+                "bytes": read,
+                "expired": expired,
+                "duration_s": round(time.monotonic() - started, 3)
+            }
+            return index.last_run
+
+    async def search(self, server_id: str, **filters) -> dict:
+        return await asyncio.to_thread(self.index_for(server_id).search, **filters)
+
+    async def stats(self, server_id: str) -> dict:
+        return await asyncio.to_thread(self.index_for(server_id).stats)
+
+    # -- background loop --------------------------------------------------
+
+    async def _load_servers(self) -> List[dict]:
+        from services.supabase_client import get_async_supabase, db_call
+        supabase = await get_async_supabase()
+        result = await db_call(supabase.table("servers").select(INDEX_COLUMNS).neq("status", "NOT_INSTALLED").execute())
+        return [row for row in result.data or [] if row.get("install_path")]
+
+    async def run_once(self) -> Dict[str, dict]:
+        """Index every server; hosts in parallel, servers of one host one after another"""
+        by_host: Dict[str, List[dict]] = {}
+        for server in await self._load_servers():
+            host = server.get("hosts") or None
+            by_host.setdefault(str(host["id"]) if host else "local", []).append(server)
+        results: Dict[str, dict] = {}
+
+        async def index_host(servers: List[dict]):
+            for server in servers:
+                try:
+                    results[str(server["id"])] = await self.index_server(server, server.get("hosts") or None)
+                except Exception as e:
+                    results[str(server["id"])] = {"error": f"{type(e).__name__}: {e}"}
+
+        await asyncio.gather(*(index_host(servers) for servers in by_host.values()))
+        return results
+
+    async def _run(self):
+        while True:
+            try:
+                results = await self.run_once()
+                failed = [server_id for server_id, result in results.items() if "error" in result]
+                if failed:
+                    print(f"⚠️ Log index failed for {len(failed)} server(s): {failed[:5]}", flush=True)
+            except Exception as e:
+                print(f"⚠️ Log index run failed: {e}", flush=True)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self.interval > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for index in self._indexes.values():
+            async with index.lock:
+                index.close()
+
+
+_indexer: Optional[LogIndexer] = None
+
+
+def get_log_indexer() -> LogIndexer:
+    """Get the process-wide log indexer singleton"""
+    global _indexer
+    if _indexer is None:
+        _indexer = LogIndexer()
+    return _indexer
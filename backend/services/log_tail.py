@@ -0,0 +1,546 @@
+"""Live game server logs (ShooterGame.log) with a backlog per server.
+
+Each watched server keeps its last ``LOG_TAIL_LINES`` lines in a ring
+buffer. New lines go to the server's ``Broadcaster`` channel, so a console
+client gets the backlog first and then live lines. Files are never read
+from the start: attaching reads at most ``LOG_TAIL_BACKLOG_BYTES`` from the
+end, and after that only what was appended since the tracked offset.
+
+- Servers on this machine: one inotify instance for all of them,
+  registered with the event loop (no threads, no polling). It watches the
+  log *directories*, so rotation (rename + new file), deletion and
+  truncation are seen as they happen. A log directory that doesn't exist
+  yet (server never started) is waited for by watching its nearest
+  existing parent.
+- Servers on other hosts: one SSH channel per host over the pooled
+  connection, running a ``tail -c +N -F`` per watched file from the byte
+  offset read so far. tail handles rotation and truncation on the host.
+  Adding files or re-establishing a lost connection (with backoff)
+  restarts the channel, and every file resumes where it left off.
+
+Servers are watched from their first subscriber on and stay watched, so
+the backlog survives reconnecting clients.
+"""
+import asyncio
+import ctypes
+import ctypes.util
+import errno
+import os
+import posixpath
+import shlex
+import struct
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from services.broadcast import Broadcaster
+from services.ssh_pool import get_ssh_pool
+from services.steamcmd import is_local
+
+LOG_TAIL_LINES = int(os.getenv("LOG_TAIL_LINES", "1000"))
+# Log files per server, relative to its install_path
+LOG_TAIL_FILES = tuple(
+    f.strip() for f in os.getenv("LOG_TAIL_FILES", "ShooterGame/Saved/Logs/ShooterGame.log").split(",") if f.strip()
+)
+LOG_TAIL_BACKLOG_BYTES = int(os.getenv("LOG_TAIL_BACKLOG_BYTES", str(256 * 1024)))
+LOG_TAIL_RETRY_MAX = float(os.getenv("LOG_TAIL_RETRY_MAX", "60"))
+# Bytes read per file per event before yielding to the event loop
+READ_CHUNK = 1 << 20
+MAX_LINE = 8192
+# Frames buffered per console client
+CONSOLE_QUEUE_SIZE = 256
+
+# inotify(7)
+IN_MODIFY = 0x00000002
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_ONLYDIR = 0x01000000
+IN_MASK_ADD = 0x20000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+FILE_EVENTS = IN_MODIFY | IN_CREATE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+PARENT_EVENTS = IN_CREATE | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF
+_EVENT = struct.Struct("iIII")
+
+
+class ServerLog:
+    """Ring buffer and live channel of one server's log lines"""
+
+    def __init__(self, server_id: str, maxlen: int = LOG_TAIL_LINES):
+        self.server_id = server_id
+        # [timestamp, file name, line]
+        self.lines: deque = deque(maxlen=maxlen)
+        self.channel = Broadcaster(f"log:{server_id}", queue_size=CONSOLE_QUEUE_SIZE, replay_last=False)
+        self.files: List[str] = []
+        self.total_lines = 0
+        self.rotations = 0
+
+    def append(self, path: str, lines: List[str], live: bool = True):
+        if not lines:
+            return
+        now = round(time.time(), 3)
+        name = posixpath.basename(path)
+        entries = [[now, name, line] for line in lines]
+        self.lines.extend(entries)
+        self.total_lines += len(entries)
+        if live and self.channel.subscribers:
+            self.channel.publish({"type": "lines", "lines": entries[-self.lines.maxlen:]})
+
+    def notice(self, path: str, event: str):
+        """Rotation / truncation marker for live clients"""
+        if event == "rotated":
+            self.rotations += 1
+        if self.channel.subscribers:
+            self.channel.publish({"type": event, "file": posixpath.basename(path)})
+
+    def backlog(self, limit: Optional[int] = None) -> List[list]:
+        lines = list(self.lines)
+        return lines[-limit:] if limit else lines
+
+
+def _split(data: bytes, partial: bytes) -> Tuple[List[str], bytes]:
+    """Complete lines of ``partial + data`` and the unterminated rest"""
+    chunks = (partial + data).split(b"\n")
+    rest = chunks.pop()
+    if len(rest) > MAX_LINE:
+        # A runaway line without newline: emit it in pieces
+        chunks.append(rest)
+        rest = b""
+    return [c.rstrip(b"\r").decode("utf-8", errors="replace").lstrip("\ufeff") for c in chunks], rest
+
+
+def _last_lines(fd: int, size: int, count: int) -> List[str]:
+    start = max(size - LOG_TAIL_BACKLOG_BYTES, 0)
+    data = os.pread(fd, size - start, start)
+    if start > 0:
+        # First line is probably cut
+        data = data[data.find(b"\n") + 1:]
+    lines, _ = _split(data, b"")
+    return lines[-count:]
+
+
+class _File:
+    """One followed local file: open descriptor, read offset, unterminated line"""
+
+    def __init__(self, path: str, log: ServerLog):
+        self.path = path
+        self.log = log
+        self.fd: Optional[int] = None
+        self.offset = 0
+        self.partial = b""
+        self.scheduled = False
+
+
+class _Inotify:
+    """Non-blocking inotify descriptor read from the event loop"""
+
+    def __init__(self, callback):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add = libc.inotify_add_watch
+        self._add.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm = libc.inotify_rm_watch
+        self._rm.argtypes = [ctypes.c_int, ctypes.c_int]
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, f"inotify_init1: {os.strerror(e)}")
+        self.callback = callback
+        asyncio.get_running_loop().add_reader(self.fd, self._read)
+
+    def add_watch(self, path: str, mask: int) -> int:
+        wd = self._add(self.fd, os.fsencode(path), mask | IN_MASK_ADD)
+        if wd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e), path)
+        return wd
+
+    def rm_watch(self, wd: int):
+        self._rm(self.fd, wd)
+
+    def _read(self):
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return
+            pos = 0
+            while pos < len(data):
+                wd, mask, _cookie, length = _EVENT.unpack_from(data, pos)
+                pos += _EVENT.size
+                name = os.fsdecode(data[pos:pos + length].rstrip(b"\x00"))
+                pos += length
+                self.callback(wd, mask, name)
+
+    def close(self):
+        asyncio.get_running_loop().remove_reader(self.fd)
+        os.close(self.fd)
+
+
+class LocalTailer:
+    """Follows files on this machine through a single inotify instance"""
+
+    def __init__(self):
+        self._inotify = _Inotify(self._on_event)
+        # wd -> directory, and directory -> {file name: _File} for watched log directories
+        self._wd_paths: Dict[int, str] = {}
+        self._dirs: Dict[str, Dict[str, _File]] = {}
+        # Existing ancestor -> log directories waiting to be created below it
+        self._waiting: Dict[str, set] = {}
+        self.events = 0
+
+    def add(self, path: str, log: ServerLog):
+        path = os.path.abspath(path)
+        directory, name = os.path.split(path)
+        files = self._dirs.get(directory)
+        if files is not None and name in files:
+            return
+        entry = _File(path, log)
+        self._dirs.setdefault(directory, {})[name] = entry
+        self._watch(directory)
+        self._open(entry, backlog=True)
+
+    def _watch(self, directory: str):
+        """Watch the directory, or its nearest existing ancestor until it appears"""
+        path = directory
+        while True:
+            try:
+                if path == directory:
+                    wd = self._inotify.add_watch(path, FILE_EVENTS | IN_ONLYDIR)
+                else:
+                    wd = self._inotify.add_watch(path, PARENT_EVENTS | IN_ONLYDIR)
+                    self._waiting.setdefault(path, set()).add(directory)
+                self._wd_paths[wd] = path
+                return
+            except OSError as e:
+                if e.errno not in (errno.ENOENT, errno.ENOTDIR) or path == os.path.dirname(path):
+                    print(f"⚠️ Cannot watch {directory}: {e}", flush=True)
+                    return
+                path = os.path.dirname(path)
+
+    def _open(self, entry: _File, backlog: bool = False):
+        try:
+            fd = os.open(entry.path, os.O_RDONLY | os.O_CLOEXEC)
+        except OSError:
+            # Not there yet: IN_CREATE / IN_MOVED_TO opens it
+            return
+        entry.fd, entry.partial = fd, b""
+        size = os.fstat(fd).st_size
+        if backlog:
+            entry.log.append(entry.path, _last_lines(fd, size, entry.log.lines.maxlen), live=False)
+            entry.offset = size
+        else:
+            # A new file (after rotation): everything in it is new
+            entry.offset = 0
+            self._read(entry)
+
+    def _close(self, entry: _File):
+        if entry.fd is not None:
+            # Whatever was appended before the rename / delete
+            self._read(entry, final=True)
+            os.close(entry.fd)
+            entry.fd = None
+
+    def _read(self, entry: _File, final: bool = False):
+        entry.scheduled = False
+        if entry.fd is None:
+            return
+        size = os.fstat(entry.fd).st_size
+        if size < entry.offset:
+            entry.offset, entry.partial = 0, b""
+            entry.log.notice(entry.path, "truncated")
+        data = os.pread(entry.fd, min(size - entry.offset, READ_CHUNK), entry.offset)
+        entry.offset += len(data)
+        lines, entry.partial = _split(data, entry.partial)
+        if final and entry.partial:
+            lines.append(entry.partial.decode("utf-8", errors="replace"))
+            entry.partial = b""
+        entry.log.append(entry.path, lines)
+        if entry.offset < size:
+            if final:
+                self._read(entry, final=True)
+            elif not entry.scheduled:
+                # Big burst: continue on the next loop iteration so others get a turn
+                entry.scheduled = True
+                asyncio.get_running_loop().call_soon(self._read, entry)
+
+    def _on_event(self, wd: int, mask: int, name: str):
+        self.events += 1
+        path = self._wd_paths.get(wd)
+        if path is None:
+            return
+        if mask & IN_IGNORED:
+            self._lost(wd, path)
+            return
+        if mask & IN_MOVE_SELF:
+            # The watch would follow the moved directory; drop it (IN_IGNORED follows)
+            self._inotify.rm_watch(wd)
+            return
+
+        if path in self._waiting and mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+            # A directory appeared on the way to some log directory: go one level deeper
+            for directory in self._waiting.pop(path):
+                self._watch(directory)
+                for entry in self._dirs.get(directory, {}).values():
+                    if entry.fd is None:
+                        self._open(entry)
+
+        entry = self._dirs.get(path, {}).get(name) if name else None
+        if entry is None:
+            return
+        if mask & IN_MODIFY:
+            self._read(entry)
+        elif mask & (IN_CREATE | IN_MOVED_TO):
+            # Replaced: finish the old file, follow the new one from its start
+            if entry.fd is not None:
+                self._close(entry)
+                entry.log.notice(entry.path, "rotated")
+            self._open(entry)
+        elif mask & (IN_MOVED_FROM | IN_DELETE) and entry.fd is not None:
+            # Rotated away (e.g. to ShooterGame_Last.log); the new file shows up as IN_CREATE
+            self._close(entry)
+            entry.log.notice(entry.path, "rotated")
+
+    def _lost(self, wd: int, path: str):
+        """Directory deleted or moved away: wait for it to come back"""
+        del self._wd_paths[wd]
+        for entry in self._dirs.get(path, {}).values():
+            self._close(entry)
+        if path in self._dirs:
+            self._watch(path)
+        for directory in self._waiting.pop(path, ()):
+            self._watch(directory)
+
+    def close(self):
+        for files in self._dirs.values():
+            for entry in files.values():
+                if entry.fd is not None:
+                    os.close(entry.fd)
+                    entry.fd = None
+        self._inotify.close()
+
+    def stats(self) -> dict:
+        files = [entry for files in self._dirs.values() for entry in files.values()]
+        return {
+            "watches": len(set(self._wd_paths)),
+            "files": len(files),
+            "open": sum(1 for entry in files if entry.fd is not None),
+            "waiting_dirs": sum(len(d) for d in self._waiting.values()),
+            "events": self.events
+        }
+
+
+class RemoteTailer:
+    """Follows files on one remote host over a single SSH channel.
+
+    Each file has its own ``tail -c +N -F`` from the byte offset consumed so
+    far, so restarting the channel (to add files, or after a lost
+    connection) neither skips nor repeats lines. Output lines are tagged
+    ``<index> `` by file, and tail's own notices ``<index>! ``.
+    """
+
+    def __init__(self, host: dict):
+        self.host = host
+        self.files: Dict[str, ServerLog] = {}
+        # path -> bytes of complete lines read (None: backlog not loaded yet)
+        self.offsets: Dict[str, Optional[int]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self.failures = 0
+        self.restarts = 0
+        self.last_error: Optional[str] = None
+
+    async def add(self, paths: List[str], log: ServerLog):
+        new = [path for path in paths if path not in self.files]
+        if not new:
+            return
+        async with self._lock:
+            for path in new:
+                self.files[path] = log
+                self.offsets[path] = None
+                try:
+                    self.offsets[path] = await self._backlog(path)
+                except Exception as e:
+                    # Loaded by _follow once the host is reachable
+                    self.last_error = f"{type(e).__name__}: {e}"
+            self._restart()
+
+    async def _backlog(self, path: str) -> int:
+        """Load the file's last lines; returns the offset to follow it from"""
+        quoted = shlex.quote(path)
+        limit = LOG_TAIL_BACKLOG_BYTES
+        # Size first, then exactly the bytes up to it (lines appended meanwhile come with the follow)
+        result = await get_ssh_pool().run(
+            self.host,
+            f"s=$(wc -c 2>/dev/null < {quoted}) || s=0; echo $s; "
+            f"tail -c +$((s > {limit} ? s - {limit} + 1 : 1)) -- {quoted} 2>/dev/null "
+            f"| head -c $((s > {limit} ? {limit} : s))",
+            timeout=30, encoding=None
+        )
+        size_line, _, data = result.stdout.partition(b"\n")
+        start = max(int(size_line or 0) - limit, 0)
+        # Only complete lines; an unterminated last line is read again by the follow
+        end = data.rfind(b"\n") + 1
+        complete = data[:end]
+        if start > 0:
+            # First line is probably cut
+            complete = complete[complete.find(b"\n") + 1:]
+        lines, _ = _split(complete, b"")
+        self.files[path].append(path, lines[-self.files[path].lines.maxlen:], live=False)
+        return start + end
+
+    def _command(self, paths: List[str]) -> str:
+        parts = ["export LC_ALL=C", "exec 4>&1"]
+        for index, path in enumerate(paths):
+            # tail's stdout -> fd 3 (tagged as lines), its notices -> tagged with "!"; both to fd 4
+            parts.append(
+                f"{{ tail -c +{self.offsets[path] + 1} -F -- {shlex.quote(path)} 2>&1 1>&3 "
+                f"| sed -u 's/^/{index}! /' >&4; }} 3>&1 | sed -u 's/^/{index} /' &"
+            )
+        # The channel closing ends stdin: take every tail down with it
+        parts.append("cat > /dev/null; kill 0")
+        return "\n".join(parts)
+
+    def _feed(self, paths: List[str], line: bytes):
+        if not line.endswith(b"\n"):
+            # Cut off by the channel closing; read again from the offset
+            return
+        tag, _, rest = line[:-1].partition(b" ")
+        try:
+            path = paths[int(tag.rstrip(b"!"))]
+        except (ValueError, IndexError):
+            return
+        log = self.files[path]
+        if tag.endswith(b"!"):
+            # tail follows a replaced or truncated file from its start
+            message = rest.decode("utf-8", errors="replace")
+            if "file truncated" in message:
+                self.offsets[path] = 0
+                log.notice(path, "truncated")
+            elif "following new file" in message:
+                if "has been replaced" in message:
+                    log.notice(path, "rotated")
+                self.offsets[path] = 0
+            return
+        self.offsets[path] += len(rest) + 1
+        log.append(path, [rest.rstrip(b"\r").decode("utf-8", errors="replace").lstrip("\ufeff")])
+
+    def _restart(self):
+        if self._task is not None:
+            self._task.cancel()
+        self.restarts += 1
+        self._task = asyncio.create_task(self._follow())
+
+    async def _follow(self):
+        while True:
+            try:
+                for path in [path for path, offset in self.offsets.items() if offset is None]:
+                    self.offsets[path] = await self._backlog(path)
+                paths = list(self.files)
+                async with get_ssh_pool().process(self.host, self._command(paths), encoding=None) as process:
+                    self.failures = 0
+                    self.last_error = None
+                    async for line in process.stdout:
+                        self._feed(paths, line)
+                    raise ConnectionError("tail exited")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failures += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+                delay = min(2 ** (self.failures - 1), LOG_TAIL_RETRY_MAX)
+                print(f"⚠️ Log tail on {self.host.get('hostname')} failed, retry in {delay:.0f}s: {e}", flush=True)
+                await asyncio.sleep(delay)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "files": len(self.files),
+            "restarts": self.restarts,
+            "failures": self.failures,
+            "last_error": self.last_error
+        }
+
+
+class LogTailService:
+    """Server id -> ServerLog, fed by the local inotify tailer or per-host remote tailers"""
+
+    def __init__(self):
+        self.logs: Dict[str, ServerLog] = {}
+        self._local: Optional[LocalTailer] = None
+        self._remote: Dict[str, RemoteTailer] = {}
+        self._lock = asyncio.Lock()
+
+    def log_paths(self, server: dict, local: bool) -> List[str]:
+        join = os.path.join if local else posixpath.join
+        return [join(server["install_path"], relative) for relative in LOG_TAIL_FILES]
+
+    async def watch(self, server: dict, host: Optional[dict]) -> ServerLog:
+        """The server's log, following its files from now on (idempotent)"""
+        server_id = str(server["id"])
+        log = self.logs.get(server_id)
+        if log is not None:
+            return log
+        if not server.get("install_path"):
+            raise ValueError("Server has no install_path")
+        async with self._lock:
+            log = self.logs.get(server_id)
+            if log is not None:
+                return log
+            log = ServerLog(server_id)
+            local = is_local(host)
+            log.files = self.log_paths(server, local)
+            if local:
+                if self._local is None:
+                    self._local = LocalTailer()
+                for path in log.files:
+                    self._local.add(path, log)
+            else:
+                key = str(host.get("id") or host["hostname"])
+                tailer = self._remote.get(key)
+                if tailer is None:
+                    tailer = self._remote[key] = RemoteTailer(host)
+                await tailer.add(log.files, log)
+            self.logs[server_id] = log
+            return log
+
+    async def close(self):
+        for tailer in self._remote.values():
+            await tailer.close()
+        self._remote.clear()
+        if self._local is not None:
+            self._local.close()
+            self._local = None
+        for log in self.logs.values():
+            log.channel.close()
+        self.logs.clear()
+
+    def stats(self) -> dict:
+        return {
+            "servers": len(self.logs),
+            "clients": sum(len(log.channel.subscribers) for log in self.logs.values()),
+            "lines": sum(log.total_lines for log in self.logs.values()),
+            "local": self._local.stats() if self._local is not None else None,
+            "remote": {key: tailer.stats() for key, tailer in self._remote.items()}
+        }
+
+
+_service: Optional[LogTailService] = None
+
+
+def get_log_tail() -> LogTailService:
+    """Get the process-wide log tail service singleton"""
+    global _service
+    if _service is None:
+        _service = LogTailService()
+    return _service
@@ -0,0 +1,309 @@
+"""Pooled SMTP sender with an in-memory outbox.
+
+``aiosmtplib.send`` opens a new TCP + STARTTLS + AUTH session per message.
+The mailer keeps a few authenticated connections open instead. Each one
+is owned by a worker that drains the outbox in batches. Idle connections
+are checked before reuse and reopened when the server dropped them.
+Transient failures are retried with exponential backoff. Callers that
+retry on their own (the durable job queue) send with ``max_attempts=1``.
+
+Point it at a local ``aiosmtpd`` for testing::
+
+    mailer = Mailer(hostname="127.0.0.1", port=8025, start_tls=False)
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from email.message import Message
+from typing import Dict, Optional
+
+import aiosmtplib
+
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "2"))
+SMTP_BATCH_SIZE = int(os.getenv("SMTP_BATCH_SIZE", "20"))
+# Reconnect instead of reusing a connection idle for longer than this (seconds)
+SMTP_IDLE_TIMEOUT = float(os.getenv("SMTP_IDLE_TIMEOUT", "60"))
+SMTP_MAX_ATTEMPTS = int(os.getenv("SMTP_MAX_ATTEMPTS", "5"))
+SMTP_RETRY_BASE = float(os.getenv("SMTP_RETRY_BASE", "2"))
+SMTP_QUEUE_SIZE = int(os.getenv("SMTP_QUEUE_SIZE", "10000"))
+
+
+class OutboxFull(Exception):
+    """The outbox queue is at capacity"""
+
+
+def is_permanent(error: Exception) -> bool:
+    """True for SMTP failures that a retry cannot fix (5xx replies, every recipient refused)"""
+    if isinstance(error, aiosmtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(error, aiosmtplib.SMTPResponseException) and 500 <= error.code < 600
+
+
+class _Envelope:
+    __slots__ = ("message", "attempts", "max_attempts", "queued_at", "future")
+
+    def __init__(self, message: Message, future: Optional[asyncio.Future], max_attempts: int):
+        self.message = message
+        self.attempts = 0
+        self.max_attempts = max_attempts
+        self.queued_at = time.monotonic()
+        self.future = future
+
+
+class _PooledConnection:
+    """One authenticated SMTP session, reopened on demand"""
+
+    def __init__(self, mailer: "Mailer"):
+        self.mailer = mailer
+        self.smtp: Optional[aiosmtplib.SMTP] = None
+        self.last_used = 0.0
+
+    async def ensure(self):
+        if self.smtp is not None and self.smtp.is_connected:
+            if time.monotonic() - self.last_used < self.mailer.idle_timeout:
+                return
+            # Idle for a while - servers drop quiet sessions, so probe first
+            try:
+                await self.smtp.noop()
+                return
+            except aiosmtplib.SMTPException:
+                await self.close()
+        m = self.mailer
+        self.smtp = aiosmtplib.SMTP(
+            hostname=m.hostname,
+            port=m.port,
+            # Empty credentials: relay without AUTH (e.g. a local aiosmtpd)
+            username=m.username or None,
+            password=m.password or None,
+            start_tls=m.start_tls,
+            timeout=m.timeout
+        )
+        await self.smtp.connect()
+        m.connects += 1
+
+    async def send(self, message: Message):
+        await self.ensure()
+        try:
+            await self.smtp.send_message(message)
+        except aiosmtplib.SMTPServerDisconnected:
+            # Dropped between probe and send - reconnect once
+            await self.close()
+            await self.ensure()
+            await self.smtp.send_message(message)
+        self.last_used = time.monotonic()
+
+    async def close(self):
+        if self.smtp is None:
+            return
+        try:
+            if self.smtp.is_connected:
+                await self.smtp.quit()
+        except aiosmtplib.SMTPException:
+            self.smtp.close()
+        self.smtp = None
+
+
+class Mailer:
+    """Outbox drained by a small pool of persistent SMTP connections"""
+
+    def __init__(
+        self,
+        hostname: Optional[str] = None,
+        port: Optional[int] = None,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        start_tls: bool = True,
+        timeout: float = 30,
+        pool_size: int = SMTP_POOL_SIZE,
+        batch_size: int = SMTP_BATCH_SIZE,
+        idle_timeout: float = SMTP_IDLE_TIMEOUT,
+        max_attempts: int = SMTP_MAX_ATTEMPTS,
+        retry_base: float = SMTP_RETRY_BASE,
+        queue_size: int = SMTP_QUEUE_SIZE
+    ):
+        self.hostname = hostname or os.getenv("SMTP_HOST", "smtp.gmail.com")
+        self.port = port or int(os.getenv("SMTP_PORT", 587))
+        self.username = username if username is not None else os.getenv("SMTP_USER")
+        self.password = password if password is not None else os.getenv("SMTP_PASSWORD")
+        self.start_tls = start_tls
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.batch_size = batch_size
+        self.idle_timeout = idle_timeout
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.queue: Optional[asyncio.Queue] = None
+        self.queue_size = queue_size
+        self._workers = []
+        # Backoff timer -> message waiting for its retry
+        self._retry_handles: Dict[asyncio.TimerHandle, _Envelope] = {}
+        self._stopping = False
+
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.connects = 0
+        self._sent_times = deque(maxlen=10000)
+        self._latency_total = 0.0
+
+    # -- lifecycle --------------------------------------------------------
+
+    def start(self):
+        """Start the pool workers on the running event loop (idempotent)"""
+        if self.queue is None:
+            self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self._workers = [w for w in self._workers if not w.done()]
+        while len(self._workers) < self.pool_size:
+            self._workers.append(asyncio.create_task(self._worker()))
+
+    async def stop(self, drain_timeout: float = 10):
+        """Try to flush the outbox (pending retries included), then close all connections"""
+        self._stopping = True
+        # Messages backing off get their remaining attempts now instead of being dropped
+        for handle, envelope in list(self._retry_handles.items()):
+            handle.cancel()
+            self._requeue(envelope)
+        self._retry_handles.clear()
+        failed_before = self.failed
+        drained = True
+        if self.queue is not None and self._workers:
+            try:
+                await asyncio.wait_for(self.queue.join(), drain_timeout)
+            except asyncio.TimeoutError:
+                drained = False
+        for worker in self._workers:
+            worker.cancel()
+        # Workers fail the unsent rest of the batch they were on
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        while self.queue is not None and not self.queue.empty():
+            self._drop(self.queue.get_nowait())
+            self.queue.task_done()
+        if not drained:
+            print(f"⚠️ Mail outbox not drained, {self.failed - failed_before} messages dropped", flush=True)
+        self._stopping = False
+
+    def _drop(self, envelope: _Envelope):
+        """Give up on a message at shutdown - don't leave its sender waiting"""
+        self.failed += 1
+        if envelope.future is not None and not envelope.future.done():
+            envelope.future.set_exception(OutboxFull("Mailer stopped"))
+
+    # -- producer side ----------------------------------------------------
+
+    def enqueue(self, message: Message, wait: bool = False,
+                max_attempts: Optional[int] = None) -> Optional[asyncio.Future]:
+        """Queue a message for delivery. Returns a future if ``wait`` is set."""
+        self.start()
+        future = asyncio.get_running_loop().create_future() if wait else None
+        envelope = _Envelope(message, future, max_attempts or self.max_attempts)
+        try:
+            self.queue.put_nowait(envelope)
+        except asyncio.QueueFull:
+            raise OutboxFull(f"Mail outbox full ({self.queue_size} messages)")
+        return future
+
+    async def send(self, message: Message, max_attempts: Optional[int] = None):
+        """Queue a message and wait until it is delivered (or finally fails)"""
+        await self.enqueue(message, wait=True, max_attempts=max_attempts)
+
+    # -- consumer side ----------------------------------------------------
+
+    async def _worker(self):
+        conn = _PooledConnection(self)
+        try:
+            while True:
+                batch = [await self.queue.get()]
+                while len(batch) < self.batch_size and not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+                for i, envelope in enumerate(batch):
+                    try:
+                        await self._deliver(conn, envelope)
+                    except asyncio.CancelledError:
+                        # Stopped mid-batch: this message and the rest were taken off the queue
+                        for unsent in batch[i:]:
+                            self._drop(unsent)
+                        for _ in batch[i + 1:]:
+                            self.queue.task_done()
+                        raise
+                    finally:
+                        self.queue.task_done()
+        finally:
+            await conn.close()
+
+    async def _deliver(self, conn: _PooledConnection, envelope: _Envelope):
+        envelope.attempts += 1
+        try:
+            await conn.send(envelope.message)
+        except Exception as e:
+            await conn.close()
+            if is_permanent(e) or envelope.attempts >= envelope.max_attempts:
+                self.failed += 1
+                print(f"❌ Failed to send email to {envelope.message['To']}: {e}", flush=True)
+                if envelope.future is not None and not envelope.future.done():
+                    envelope.future.set_exception(e)
+                return
+            self._schedule_retry(envelope, e)
+            return
+
+        now = time.monotonic()
+        self.sent += 1
+        self._sent_times.append(now)
+        self._latency_total += now - envelope.queued_at
+        print(f"✅ Email sent to {envelope.message['To']}", flush=True)
+        if envelope.future is not None and not envelope.future.done():
+            envelope.future.set_result(True)
+
+    def _schedule_retry(self, envelope: _Envelope, error: Exception):
+        self.retries += 1
+        if self._stopping:
+            # Shutting down: no time to back off
+            print(f"⚠️ Email to {envelope.message['To']} failed ({error}), retrying now", flush=True)
+            self._requeue(envelope)
+            return
+        delay = self.retry_base * (2 ** (envelope.attempts - 1))
+        print(f"⚠️ Email to {envelope.message['To']} failed ({error}), retry in {delay:.1f}s", flush=True)
+
+        def requeue():
+            self._retry_handles.pop(handle, None)
+            self._requeue(envelope)
+
+        handle = asyncio.get_running_loop().call_later(delay, requeue)
+        self._retry_handles[handle] = envelope
+
+    def _requeue(self, envelope: _Envelope):
+        try:
+            self.queue.put_nowait(envelope)
+        except asyncio.QueueFull:
+            self.failed += 1
+            if envelope.future is not None and not envelope.future.done():
+                envelope.future.set_exception(OutboxFull("Mail outbox full on retry"))
+
+    # -- metrics ----------------------------------------------------------
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        recent = sum(1 for t in self._sent_times if now - t <= 60)
+        return {
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+            "pending_retries": len(self._retry_handles),
+            "workers": len([w for w in self._workers if not w.done()]),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retries": self.retries,
+            "connects": self.connects,
+            "messages_per_sec": round(recent / 60, 3),
+            "avg_latency_s": round(self._latency_total / self.sent, 3) if self.sent else 0.0
+        }
+
+
+_mailer: Optional[Mailer] = None
+
+
+def get_mailer() -> Mailer:
+    """Get the process-wide mailer singleton"""
+    global _mailer
+    if _mailer is None:
+        _mailer = Mailer()
+    return _mailer
@@ -0,0 +1,170 @@
+"""Compact binary metric frames (remote agent -> backend).
+
+Samples are quantized to integers per metric (``METRIC_SCALES``), so CPU
+42.37% becomes 4237. Most samples then change little from the previous
+one, and each frame carries only the zigzag-varint differences of the
+metrics that changed.
+
+Frame layout (all integers are LEB128 varints)::
+
+    header   1 byte    version << 4 | kind      (kind: 0 key, 1 delta)
+    seq      varint    frame counter (wraps at 2**32)
+    time     varint    key: epoch ms; delta: zigzag ms since previous frame
+    mask     varint    bit i set = metric i present / changed
+    values   varint*   key: zigzag absolute; delta: zigzag difference
+
+A 5-metric delta frame is typically 8-15 bytes. A keyframe is sent first,
+every ``keyframe_interval`` frames, and whenever the receiver asks for one
+(after a gap in ``seq``).
+"""
+from typing import Dict, List, Optional, Tuple
+
+FRAME_VERSION = 1
+KEY = 0
+DELTA = 1
+
+# Quantization: stored value = round(value * scale)
+METRIC_SCALES = {
+    "cpu": 100,            # 0.01 %
+    "memory": 100,
+    "disk": 100,
+    "network_sent": 1000,  # 0.001 MB/s
+    "network_recv": 1000
+}
+DEFAULT_SCALE = 100
+
+
+class FrameError(ValueError):
+    """Malformed frame"""
+
+
+class FrameGap(Exception):
+    """A delta frame arrived without its base (lost frame or no keyframe yet)"""
+
+
+def _write_varint(out: bytearray, value: int):
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    result = shift = 0
+    while True:
+        if pos >= len(data) or shift > 63:
+            raise FrameError("Truncated varint")
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def _unzigzag(value: int) -> int:
+    return (value >> 1) ^ -(value & 1)
+
+
+class FrameEncoder:
+    """Agent side: samples -> frames"""
+
+    def __init__(self, metrics: List[str], keyframe_interval: int = 60):
+        self.metrics = list(metrics)
+        self.scales = [METRIC_SCALES.get(m, DEFAULT_SCALE) for m in self.metrics]
+        self.keyframe_interval = keyframe_interval
+        self._seq = 0
+        self.reset()
+
+    def reset(self):
+        """Next frame is a keyframe (new connection, or the receiver asked)"""
+        self._previous: Optional[List[int]] = None
+        self._last_ms = 0
+        self._since_key = 0
+
+    def encode(self, ts: float, values: Dict[str, float]) -> bytes:
+        current = [round(values.get(m, 0.0) * scale) for m, scale in zip(self.metrics, self.scales)]
+        ts_ms = int(ts * 1000)
+        key = self._previous is None or self._since_key >= self.keyframe_interval
+
+        out = bytearray([FRAME_VERSION << 4 | (KEY if key else DELTA)])
+        _write_varint(out, self._seq)
+        self._seq = (self._seq + 1) & 0xFFFFFFFF
+
+        if key:
+            _write_varint(out, ts_ms)
+            _write_varint(out, (1 << len(current)) - 1)
+            for value in current:
+                _write_varint(out, _zigzag(value))
+            self._since_key = 0
+        else:
+            _write_varint(out, _zigzag(ts_ms - self._last_ms))
+            diffs = [value - prev for value, prev in zip(current, self._previous)]
+            mask = 0
+            for i, diff in enumerate(diffs):
+                if diff:
+                    mask |= 1 << i
+            _write_varint(out, mask)
+            for diff in diffs:
+                if diff:
+                    _write_varint(out, _zigzag(diff))
+            self._since_key += 1
+
+        self._previous = current
+        self._last_ms = ts_ms
+        return bytes(out)
+
+
+class FrameDecoder:
+    """Backend side: frames -> (timestamp, values)"""
+
+    def __init__(self, metrics: List[str]):
+        self.metrics = list(metrics)
+        self.scales = [METRIC_SCALES.get(m, DEFAULT_SCALE) for m in self.metrics]
+        self._previous: Optional[List[int]] = None
+        self._last_ms = 0
+        self._next_seq: Optional[int] = None
+
+    def decode(self, frame: bytes) -> Tuple[float, Dict[str, float]]:
+        if not frame:
+            raise FrameError("Empty frame")
+        version, kind = frame[0] >> 4, frame[0] & 0x0F
+        if version != FRAME_VERSION or kind not in (KEY, DELTA):
+            raise FrameError(f"Unsupported frame (version {version}, kind {kind})")
+        seq, pos = _read_varint(frame, 1)
+
+        if kind == DELTA and (self._previous is None or seq != self._next_seq):
+            # Wait for a keyframe - applying this delta would corrupt every later value
+            self._previous = None
+            raise FrameGap(f"Expected frame {self._next_seq}, got {seq}")
+
+        raw_time, pos = _read_varint(frame, pos)
+        mask, pos = _read_varint(frame, pos)
+        if mask >> len(self.metrics):
+            raise FrameError("Mask names unknown metrics")
+
+        if kind == KEY:
+            ts_ms = raw_time
+            current = [0] * len(self.metrics)
+        else:
+            ts_ms = self._last_ms + _unzigzag(raw_time)
+            current = list(self._previous)
+        for i in range(len(self.metrics)):
+            if mask & (1 << i):
+                value, pos = _read_varint(frame, pos)
+                current[i] = _unzigzag(value) if kind == KEY else current[i] + _unzigzag(value)
+        if pos != len(frame):
+            raise FrameError("Trailing bytes")
+
+        self._previous = current
+        self._last_ms = ts_ms
+        self._next_seq = (seq + 1) & 0xFFFFFFFF
+        return ts_ms / 1000, {m: value / scale for m, value, scale in zip(self.metrics, current, self.scales)}
@@ -0,0 +1,205 @@
+"""Background system metrics sampler.
+
+psutil calls are synchronous (and ``cpu_percent`` with an interval sleeps), so
+they must never run inside an ``async def`` handler. The sampler collects a
+snapshot on a fixed cadence in a worker thread and publishes it; API handlers
+only read the latest snapshot.
+"""
+import asyncio
+import platform
+import time
+from typing import Callable, Dict, List, Optional
+
+import psutil
+
+# Seconds between samples (the dashboard polls every 2 seconds)
+SAMPLE_INTERVAL = 2.0
+
+
+def history_values(snapshot: dict) -> Dict[str, float]:
+    """The values recorded into history for a snapshot (timeseries.SYSTEM_METRICS)"""
+    net = snapshot["network"]
+    return {
+        "cpu": snapshot["cpu"]["percent"],
+        "memory": snapshot["memory"]["percent"],
+        "disk": snapshot["disk"]["percent"],
+        "network_sent": net["sent_rate"] / 1024 / 1024,  # MB/s
+        "network_recv": net["recv_rate"] / 1024 / 1024   # MB/s
+    }
+
+
+class MetricsSampler:
+    """Collects CPU/memory/disk/network metrics into a shared snapshot."""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL, disk_path: str = "/"):
+        self.interval = interval
+        self.disk_path = disk_path
+        self.snapshot: Optional[dict] = None
+        self._listeners: List[Callable[[dict], None]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._last_net = None
+        self._static = None
+        self._stats = {
+            "samples": 0,
+            "errors": 0,
+            "last_duration_ms": 0.0,
+            "max_duration_ms": 0.0,
+            "total_duration_ms": 0.0,
+            "last_lag_ms": 0.0,
+            "last_error": None,
+        }
+
+    def add_listener(self, callback: Callable[[dict], None]):
+        """Register a callback invoked (on the event loop) with every new snapshot."""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[dict], None]):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _static_info(self) -> dict:
+        if self._static is None:
+            self._static = {
+                "cores": psutil.cpu_count(logical=False),
+                "threads": psutil.cpu_count(logical=True),
+                "platform": platform.system(),
+                "version": platform.version(),
+            }
+        return self._static
+
+    def collect(self) -> dict:
+        """Take one sample. Blocking - run it in a worker thread."""
+        static = self._static_info()
+        now = time.time()
+        mem = psutil.virtual_memory()
+        disk = psutil.disk_usage(self.disk_path)
+        net_io = psutil.net_io_counters()
+
+        # Network rates (bytes per second) since the previous sample
+        sent_rate = recv_rate = 0.0
+        if self._last_net:
+            last_time, last_sent, last_recv = self._last_net
+            elapsed = now - last_time
+            if elapsed > 0:
+                sent_rate = max(net_io.bytes_sent - last_sent, 0) / elapsed
+                recv_rate = max(net_io.bytes_recv - last_recv, 0) / elapsed
+        self._last_net = (now, net_io.bytes_sent, net_io.bytes_recv)
+
+        return {
+            "timestamp": now,
+            "cpu": {
+                # Non-blocking: percentage since the previous call
+                "percent": psutil.cpu_percent(interval=None),
+                "cores": static["cores"],
+                "threads": static["threads"]
+            },
+            "memory": {
+                "total": mem.total,
+                "used": mem.used,
+                "free": mem.available,
+                "percent": mem.percent
+            },
+            "disk": {
+                "total": disk.total,
+                "used": disk.used,
+                "free": disk.free,
+                "percent": disk.percent
+            },
+            "network": {
+                "bytes_sent": net_io.bytes_sent,
+                "bytes_recv": net_io.bytes_recv,
+                "packets_sent": net_io.packets_sent,
+                "packets_recv": net_io.packets_recv,
+                "sent_rate": round(sent_rate, 2),
+                "recv_rate": round(recv_rate, 2)
+            },
+            "platform": static["platform"],
+            "version": static["version"]
+        }
+
+    async def sample_once(self) -> dict:
+        """Collect a sample off the event loop and publish it."""
+        started = time.perf_counter()
+        snapshot = await asyncio.to_thread(self.collect)
+        duration_ms = (time.perf_counter() - started) * 1000
+
+        stats = self._stats
+        stats["samples"] += 1
+        stats["last_duration_ms"] = round(duration_ms, 3)
+        stats["max_duration_ms"] = round(max(stats["max_duration_ms"], duration_ms), 3)
+        stats["total_duration_ms"] += duration_ms
+
+        self.snapshot = snapshot
+        for callback in list(self._listeners):
+            try:
+                callback(snapshot)
+            except Exception as e:
+                print(f"Metrics listener error: {e}", flush=True)
+        return snapshot
+
+    async def _run(self):
+        # Prime cpu_percent so the first real sample has a baseline
+        await asyncio.to_thread(psutil.cpu_percent, None)
+        next_tick = time.monotonic()
+        while True:
+            # Lag = how late this tick started versus its schedule
+            self._stats["last_lag_ms"] = round(max(time.monotonic() - next_tick, 0) * 1000, 3)
+            try:
+                await self.sample_once()
+            except Exception as e:
+                self._stats["errors"] += 1
+                self._stats["last_error"] = str(e)
+                print(f"Metrics sampler error: {e}", flush=True)
+
+            # Fixed cadence: schedule against the clock, skip ticks we missed
+            next_tick += self.interval
+            now = time.monotonic()
+            if next_tick < now:
+                next_tick = now
+            await asyncio.sleep(next_tick - now)
+
+    def start(self):
+        """Start the sampler task on the running event loop (idempotent)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def stats(self) -> dict:
+        """Sampler self-timing, reported alongside the snapshot."""
+        stats = self._stats
+        samples = stats["samples"]
+        return {
+            "running": self.running,
+            "interval": self.interval,
+            "samples": samples,
+            "errors": stats["errors"],
+            "last_duration_ms": stats["last_duration_ms"],
+            "avg_duration_ms": round(stats["total_duration_ms"] / samples, 3) if samples else 0.0,
+            "max_duration_ms": stats["max_duration_ms"],
+            "last_lag_ms": stats["last_lag_ms"],
+            "last_error": stats["last_error"],
+            "age_s": round(time.time() - self.snapshot["timestamp"], 3) if self.snapshot else None,
+        }
+
+
+_sampler: Optional[MetricsSampler] = None
+
+
+def get_sampler() -> MetricsSampler:
+    """Get the process-wide metrics sampler singleton"""
+    global _sampler
+    if _sampler is None:
+        _sampler = MetricsSampler()
+    return _sampler
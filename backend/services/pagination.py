@@ -0,0 +1,58 @@
+"""Keyset (cursor) pagination helpers for PostgREST listings.
+
+Listings are ordered newest first by ``(created_at, id)``. A cursor encodes
+the last row of a page, and the next page asks for rows strictly after it.
+The database walks the ``(created_at, id)`` index from that point, so page
+N costs the same as page 1. OFFSET pagination would scan and discard every
+earlier row.
+"""
+import base64
+import json
+import uuid
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(row: dict) -> str:
+    raw = json.dumps([row["created_at"], row["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Decode and validate a cursor - both values end up in a PostgREST filter"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        # Re-serialized from the parsed values, so nothing but a timestamp and a UUID gets through
+        created_at = datetime.fromisoformat(created_at.replace("Z", "+00:00")).isoformat()
+        return created_at, str(uuid.UUID(row_id))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_page(query, cursor: Optional[str], limit: int):
+    """Order newest first and continue after ``cursor`` (fetches one extra row)"""
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        # Quoted values - timestamps contain PostgREST reserved characters (: .)
+        query = query.or_(
+            f'created_at.lt."{created_at}",'
+            f'and(created_at.eq."{created_at}",id.lt."{row_id}")'
+        )
+    return query\
+        .order("created_at", desc=True)\
+        .order("id", desc=True)\
+        .limit(limit + 1)
+
+
+def page_result(rows: List[dict], limit: int) -> Tuple[List[dict], Optional[str]]:
+    """Trim the look-ahead row and build the next cursor"""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
@@ -0,0 +1,378 @@
+"""Pooled Source RCON client (ASE/ASA ``rcon_port``).
+
+One authenticated TCP connection is kept per server and reused. Commands
+are pipelined: each gets its own request id, many can be in flight on one
+connection (up to ``RCON_MAX_INFLIGHT``), and responses are routed back by
+id. A response longer than one packet arrives as several packets with the
+same id. Each command is therefore followed by an empty RESPONSE_VALUE
+packet that the server mirrors once the real response is complete.
+Servers that don't mirror it need ``RCON_MULTI_PACKET=0``; responses are
+then one packet.
+
+A dropped connection is reopened on next use, and failed connects back off
+per server. A command is never resent once written, because ``DoExit``
+must not run twice. ``broadcast()`` sends one command to many servers
+concurrently.
+
+Servers are ``Server`` rows (dicts or model objects) with ``id``,
+``hostname`` (of their host), ``rcon_port`` and ``rcon_password``::
+
+    players = await get_rcon_pool().command(server, "ListPlayers")
+    rows = await get_rcon_pool().broadcast(servers, "ServerChat Restart in 5 minutes")
+"""
+import asyncio
+import itertools
+import os
+import struct
+import time
+from typing import Dict, List, Optional, Tuple
+
+from services.fanout import OK, ERROR, TIMEOUT, UNREACHABLE
+
+RCON_TIMEOUT = float(os.getenv("RCON_TIMEOUT", "10"))
+RCON_CONNECT_TIMEOUT = float(os.getenv("RCON_CONNECT_TIMEOUT", "5"))
+RCON_IDLE_TIMEOUT = float(os.getenv("RCON_IDLE_TIMEOUT", "300"))
+# Commands in flight per connection
+RCON_MAX_INFLIGHT = int(os.getenv("RCON_MAX_INFLIGHT", "16"))
+RCON_MULTI_PACKET = os.getenv("RCON_MULTI_PACKET", "1").lower() not in ("0", "false", "no")
+RCON_BROADCAST_CONCURRENCY = int(os.getenv("RCON_BROADCAST_CONCURRENCY", "64"))
+RCON_RETRY_BASE = float(os.getenv("RCON_RETRY_BASE", "1"))
+RCON_RETRY_MAX = float(os.getenv("RCON_RETRY_MAX", "60"))
+
+# Packet types
+SERVERDATA_AUTH = 3
+SERVERDATA_AUTH_RESPONSE = 2
+SERVERDATA_EXECCOMMAND = 2
+SERVERDATA_RESPONSE_VALUE = 0
+
+# Largest packet the protocol allows (size field excluded)
+MAX_PACKET = 4096 + 10
+AUTH_FAILED = "auth_failed"
+
+_HEADER = struct.Struct("<iii")
+
+
+class RCONError(Exception):
+    """Connection lost or protocol error"""
+
+
+class RCONUnavailable(RCONError):
+    """The server could not be connected to (or is backing off after failures)"""
+
+
+class RCONAuthError(RCONUnavailable):
+    """Wrong RCON password"""
+
+
+def encode_packet(request_id: int, kind: int, body: str) -> bytes:
+    payload = body.encode("utf-8") + b"\x00\x00"
+    return _HEADER.pack(len(payload) + 8, request_id, kind) + payload
+
+
+async def read_packet(reader: asyncio.StreamReader) -> Tuple[int, int, bytes]:
+    """(id, type, body) of the next packet"""
+    size, request_id, kind = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    if not 10 <= size <= MAX_PACKET:
+        raise RCONError(f"Bad packet size {size}")
+    payload = await reader.readexactly(size - 8)
+    return request_id, kind, payload[:-2]
+
+
+def _field(server, name: str, default=None):
+    if isinstance(server, dict):
+        return server.get(name, default)
+    return getattr(server, name, default)
+
+
+class RCONConnection:
+    """One authenticated connection with pipelined commands"""
+
+    def __init__(self, hostname: str, port: int, password: str, multi_packet: bool = RCON_MULTI_PACKET):
+        self.hostname = hostname
+        self.port = port
+        self.password = password
+        self.multi_packet = multi_packet
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._ids = itertools.count(1)
+        # request id -> (future, response parts); a terminator id -> its command's id
+        self._pending: Dict[int, Tuple[asyncio.Future, List[bytes]]] = {}
+        self._terminators: Dict[int, int] = {}
+        self._inflight = asyncio.Semaphore(RCON_MAX_INFLIGHT)
+
+    @property
+    def connected(self) -> bool:
+        return self._reader_task is not None and not self._reader_task.done()
+
+    def _next_id(self) -> int:
+        request_id = next(self._ids)
+        if request_id >= 2 ** 31 - 1:
+            self._ids = itertools.count(1)
+            request_id = next(self._ids)
+        return request_id
+
+    async def connect(self, timeout: float = RCON_CONNECT_TIMEOUT):
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.hostname, self.port), timeout
+        )
+        try:
+            auth_id = self._next_id()
+            self._writer.write(encode_packet(auth_id, SERVERDATA_AUTH, self.password))
+            await self._writer.drain()
+
+            async def await_auth():
+                while True:
+                    # An empty RESPONSE_VALUE may come before the AUTH_RESPONSE
+                    request_id, kind, _ = await read_packet(self._reader)
+                    if kind == SERVERDATA_AUTH_RESPONSE:
+                        return request_id
+
+            if await asyncio.wait_for(await_auth(), timeout) != auth_id:
+                raise RCONAuthError(f"{self.hostname}:{self.port}: authentication failed")
+        except BaseException:
+            self._writer.close()
+            raise
+        self._reader_task = asyncio.create_task(self._read_responses())
+
+    async def _read_responses(self):
+        error: Exception = RCONError("Connection closed")
+        try:
+            while True:
+                request_id, kind, body = await read_packet(self._reader)
+                if kind != SERVERDATA_RESPONSE_VALUE:
+                    continue
+                command_id = self._terminators.pop(request_id, None)
+                if command_id is not None:
+                    # Mirrored terminator: everything for command_id has arrived
+                    self._complete(command_id)
+                    continue
+                pending = self._pending.get(request_id)
+                if pending is None:
+                    # Late reply of a timed-out command, or the terminator's second packet
+                    continue
+                pending[1].append(body)
+                if not self.multi_packet:
+                    self._complete(request_id)
+        except (asyncio.IncompleteReadError, ConnectionError, OSError) as e:
+            error = RCONError(f"Connection lost: {type(e).__name__}")
+        except RCONError as e:
+            error = e
+        finally:
+            self._writer.close()
+            for future, _ in self._pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            self._pending.clear()
+            self._terminators.clear()
+
+    def _complete(self, request_id: int):
+        future, parts = self._pending.pop(request_id, (None, None))
+        if future is not None and not future.done():
+            future.set_result(b"".join(parts).decode("utf-8", errors="replace"))
+
+    async def command(self, command: str, timeout: float = RCON_TIMEOUT) -> str:
+        if not self.connected:
+            raise RCONError("Not connected")
+        async with self._inflight:
+            request_id = self._next_id()
+            future = asyncio.get_running_loop().create_future()
+            self._pending[request_id] = (future, [])
+            packets = encode_packet(request_id, SERVERDATA_EXECCOMMAND, command)
+            terminator_id = None
+            if self.multi_packet:
+                terminator_id = self._next_id()
+                self._terminators[terminator_id] = request_id
+                packets += encode_packet(terminator_id, SERVERDATA_RESPONSE_VALUE, "")
+            try:
+                # One write: the command and its terminator are never split by another command
+                self._writer.write(packets)
+                try:
+                    await self._writer.drain()
+                except (ConnectionError, OSError) as e:
+                    raise RCONError(f"Connection lost: {type(e).__name__}") from e
+                return await asyncio.wait_for(future, timeout)
+            finally:
+                self._pending.pop(request_id, None)
+                self._terminators.pop(terminator_id, None)
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._reader_task is not None:
+            await asyncio.gather(self._reader_task, return_exceptions=True)
+
+
+class _ServerEntry:
+    """Connection state for one server"""
+
+    def __init__(self, key: str, params: Tuple[str, int, str]):
+        self.key = key
+        self.params = params
+        self.conn: Optional[RCONConnection] = None
+        self.connect_lock = asyncio.Lock()
+        self.active = 0
+        self.last_used = time.monotonic()
+        self.failures = 0
+        self.retry_at = 0.0
+        self.last_error: Optional[str] = None
+        self.connects = 0
+        self.commands = 0
+
+    @property
+    def connected(self) -> bool:
+        return self.conn is not None and self.conn.connected
+
+
+class RCONPool:
+    """Per-server persistent RCON connections"""
+
+    def __init__(self, idle_timeout: float = RCON_IDLE_TIMEOUT, multi_packet: bool = RCON_MULTI_PACKET):
+        self.idle_timeout = idle_timeout
+        self.multi_packet = multi_packet
+        self._servers: Dict[str, _ServerEntry] = {}
+        self._janitor_task: Optional[asyncio.Task] = None
+        self._broadcast_slots: Optional[asyncio.Semaphore] = None
+
+    def _entry(self, server) -> _ServerEntry:
+        params = (_field(server, "hostname"), int(_field(server, "rcon_port")), _field(server, "rcon_password") or "")
+        key = str(_field(server, "id") or f"{params[0]}:{params[1]}")
+        entry = self._servers.get(key)
+        if entry is not None and entry.params != params:
+            # Port or password changed - reconnect with the new ones
+            if entry.active == 0 and entry.conn is not None:
+                asyncio.ensure_future(entry.conn.close())
+            entry = None
+        if entry is None:
+            entry = self._servers[key] = _ServerEntry(key, params)
+        if self._janitor_task is None or self._janitor_task.done():
+            self._janitor_task = asyncio.create_task(self._janitor())
+        return entry
+
+    async def _connection(self, entry: _ServerEntry) -> RCONConnection:
+        if entry.connected:
+            return entry.conn
+        async with entry.connect_lock:
+            if entry.connected:
+                return entry.conn
+            now = time.monotonic()
+            if now < entry.retry_at:
+                raise RCONUnavailable(f"{entry.key}: retrying in {entry.retry_at - now:.0f}s ({entry.last_error})")
+            conn = RCONConnection(*entry.params, multi_packet=self.multi_packet)
+            try:
+                await conn.connect()
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, RCONError) as e:
+                entry.conn = None
+                entry.failures += 1
+                entry.last_error = str(e) if isinstance(e, RCONAuthError) else f"{type(e).__name__}: {e}"
+                delay = min(RCON_RETRY_BASE * (2 ** (entry.failures - 1)), RCON_RETRY_MAX)
+                entry.retry_at = time.monotonic() + delay
+                print(f"⚠️ RCON connect to {entry.key} failed, retry in {delay:.0f}s: {entry.last_error}", flush=True)
+                if isinstance(e, RCONAuthError):
+                    raise
+                raise RCONUnavailable(f"{entry.key}: {entry.last_error}") from e
+            entry.conn = conn
+            entry.failures = 0
+            entry.retry_at = 0.0
+            entry.last_error = None
+            entry.connects += 1
+            return conn
+
+    async def command(self, server, command: str, timeout: float = RCON_TIMEOUT) -> str:
+        """Run one command; raises RCONUnavailable / RCONError / asyncio.TimeoutError"""
+        entry = self._entry(server)
+        entry.active += 1
+        try:
+            conn = await self._connection(entry)
+            entry.commands += 1
+            return await conn.command(command, timeout)
+        finally:
+            entry.active -= 1
+            entry.last_used = time.monotonic()
+            if entry.active == 0 and self._servers.get(entry.key) is not entry and entry.conn is not None:
+                # Replaced after the server was edited
+                await entry.conn.close()
+
+    async def broadcast(self, servers: List, command: str, timeout: float = RCON_TIMEOUT) -> List[dict]:
+        """Send one command to every server concurrently; one result row per server, in order"""
+        if self._broadcast_slots is None:
+            self._broadcast_slots = asyncio.Semaphore(RCON_BROADCAST_CONCURRENCY)
+
+        async def send(server) -> dict:
+            row = {
+                "server_id": str(_field(server, "id")),
+                "name": _field(server, "name"),
+                "status": None,
+                "response": None,
+                "error": None,
+                "duration_s": None
+            }
+            async with self._broadcast_slots:
+                started = time.monotonic()
+                try:
+                    row["response"] = await self.command(server, command, timeout)
+                    row["status"] = OK
+                except asyncio.TimeoutError:
+                    row["status"] = TIMEOUT
+                    row["error"] = f"timed out after {timeout:g}s"
+                except RCONAuthError as e:
+                    row["status"] = AUTH_FAILED
+                    row["error"] = str(e)
+                except RCONUnavailable as e:
+                    row["status"] = UNREACHABLE
+                    row["error"] = str(e)
+                except RCONError as e:
+                    row["status"] = ERROR
+                    row["error"] = str(e)
+                row["duration_s"] = round(time.monotonic() - started, 3)
+            return row
+
+        return await asyncio.gather(*(send(server) for server in servers))
+
+    async def _janitor(self):
+        interval = max(self.idle_timeout / 4, 1)
+        while True:
+            await asyncio.sleep(interval)
+            cutoff = time.monotonic() - self.idle_timeout
+            for key, entry in list(self._servers.items()):
+                if entry.active == 0 and entry.last_used < cutoff:
+                    if entry.conn is not None:
+                        await entry.conn.close()
+                        entry.conn = None
+                    if time.monotonic() >= entry.retry_at:
+                        del self._servers[key]
+
+    async def close(self):
+        if self._janitor_task is not None:
+            self._janitor_task.cancel()
+            await asyncio.gather(self._janitor_task, return_exceptions=True)
+            self._janitor_task = None
+        await asyncio.gather(*(
+            entry.conn.close() for entry in self._servers.values() if entry.conn is not None
+        ), return_exceptions=True)
+        self._servers.clear()
+
+    def stats(self) -> dict:
+        return {
+            key: {
+                "connected": entry.connected,
+                "in_use": entry.active,
+                "connects": entry.connects,
+                "commands": entry.commands,
+                "failures": entry.failures,
+                "last_error": entry.last_error,
+                "idle_s": round(time.monotonic() - entry.last_used, 1)
+            }
+            for key, entry in self._servers.items()
+        }
+
+
+_pool: Optional[RCONPool] = None
+
+
+def get_rcon_pool() -> RCONPool:
+    """Get the process-wide RCON pool singleton"""
+    global _pool
+    if _pool is None:
+        _pool = RCONPool()
+    return _pool
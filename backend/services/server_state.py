@@ -0,0 +1,314 @@
+"""Authoritative in-memory state of every game server.
+
+Live status, player counts and process health arrive every few seconds.
+Writing each observation to ``servers`` would flood the database, so
+observations go into this table instead (keyed by server id):
+
+- Live fields (players, map, ping, last_seen) are kept in memory only.
+- A status change is debounced. A server becomes RUNNING after
+  ``STATE_UP_CONFIRM`` consecutive online observations and STOPPED after
+  ``STATE_DOWN_CONFIRM`` consecutive offline ones, so one lost UDP reply
+  doesn't flap it.
+- Only real transitions are written: ``status`` / ``updated_at``, at most
+  every ``STATE_FLUSH_INTERVAL`` seconds. All servers making the same
+  transition share one UPDATE. A server that flaps back within the window
+  writes nothing.
+- Writes are conditional on the status last written. A row changed
+  meanwhile by someone else (e.g. an install claiming it) keeps the
+  database value, and memory adopts it.
+
+Dashboards read ``snapshot()`` / ``visible()``, not SQL. The table
+reloads from the database every ``STATE_RESYNC_SECONDS`` to pick up new,
+deleted or externally edited servers. Status writes made elsewhere in
+this backend (SteamCMD jobs) are mirrored in with ``record()``.
+"""
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from postgrest.types import CountMethod, ReturnMethod
+
+from services.supabase_client import get_async_supabase, db_call
+
+# ServerStatus values (models/server.py)
+RUNNING = "RUNNING"
+STOPPED = "STOPPED"
+INSTALLING = "INSTALLING"
+NOT_INSTALLED = "NOT_INSTALLED"
+# Statuses that observations may move between; others belong to their owner (installs)
+OBSERVED_STATUSES = (RUNNING, STOPPED)
+
+STATE_UP_CONFIRM = int(os.getenv("STATE_UP_CONFIRM", "1"))
+STATE_DOWN_CONFIRM = int(os.getenv("STATE_DOWN_CONFIRM", "3"))
+STATE_FLUSH_INTERVAL = float(os.getenv("STATE_FLUSH_INTERVAL", "2"))
+STATE_RESYNC_SECONDS = float(os.getenv("STATE_RESYNC_SECONDS", "300"))
+
+STATE_COLUMNS = "id, name, server_type, status, owner_id, host_id, query_port, updated_at, hosts(hostname)"
+# Copied from an observation into the row as-is
+LIVE_FIELDS = ("players", "max_players", "map", "ping_ms", "version")
+# Internal bookkeeping, not part of snapshots
+_PRIVATE = ("persisted", "candidate", "streak")
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).isoformat()
+
+
+class ServerStateTable:
+    """server id -> status and live fields; writes only debounced transitions"""
+
+    def __init__(self, up_confirm: int = STATE_UP_CONFIRM, down_confirm: int = STATE_DOWN_CONFIRM,
+                 flush_interval: float = STATE_FLUSH_INTERVAL, resync_seconds: float = STATE_RESYNC_SECONDS):
+        self.up_confirm = max(up_confirm, 1)
+        self.down_confirm = max(down_confirm, 1)
+        self.flush_interval = flush_interval
+        self.resync_seconds = resync_seconds
+        self._rows: Dict[str, dict] = {}
+        # Servers whose status differs from what was last written
+        self._dirty: set = set()
+        self._wakeup = asyncio.Event()
+        self._loaded_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self.observations = 0
+        self.transitions = 0
+        self.writes = 0
+        self.conflicts = 0
+
+    # -- loading ----------------------------------------------------------
+
+    def _from_db(self, row: dict) -> dict:
+        existing = self._rows.get(str(row["id"])) or {}
+        state = dict(existing)
+        state.update({
+            "id": str(row["id"]),
+            "name": row.get("name"),
+            "server_type": row.get("server_type"),
+            "owner_id": row.get("owner_id"),
+            "host_id": row.get("host_id"),
+            "hostname": (row.get("hosts") or {}).get("hostname"),
+            "query_port": row.get("query_port"),
+        })
+        if state["id"] not in self._dirty:
+            state.update(status=row.get("status"), persisted=row.get("status"), updated_at=row.get("updated_at"))
+        state.setdefault("online", None)
+        state.setdefault("candidate", None)
+        state.setdefault("streak", 0)
+        return state
+
+    async def load(self):
+        """(Re)read every server; unflushed transitions win over the database"""
+        supabase = await get_async_supabase()
+        result = await db_call(supabase.table("servers").select(STATE_COLUMNS).execute())
+        self._rows = {str(row["id"]): self._from_db(row) for row in result.data or []}
+        self._dirty &= set(self._rows)
+        self._loaded_at = time.monotonic()
+
+    async def refresh(self, server_ids: Iterable[str]):
+        """Re-read some servers (e.g. after a conflicting write)"""
+        ids = list(server_ids)
+        if not ids:
+            return
+        supabase = await get_async_supabase()
+        result = await db_call(supabase.table("servers").select(STATE_COLUMNS).in_("id", ids).execute())
+        found = set()
+        for row in result.data or []:
+            self._dirty.discard(str(row["id"]))
+            self._rows[str(row["id"])] = self._from_db(row)
+            found.add(str(row["id"]))
+        for server_id in set(ids) - found:
+            self._rows.pop(server_id, None)
+            self._dirty.discard(server_id)
+
+    # -- observations -----------------------------------------------------
+
+    def observe(self, server_id: str, online: bool, **live) -> Optional[str]:
+        """Record one observation; returns the new status if it caused a transition"""
+        row = self._rows.get(str(server_id))
+        if row is None:
+            return None
+        self.observations += 1
+        now = time.time()
+        row["online"] = online
+        row["checked_at"] = now
+        if online:
+            row["last_seen"] = now
+            for field in LIVE_FIELDS:
+                if field in live:
+                    row[field] = live[field]
+        else:
+            row["players"] = 0
+
+        observed = RUNNING if online else STOPPED
+        if row["status"] not in OBSERVED_STATUSES or observed == row["status"]:
+            row["candidate"], row["streak"] = None, 0
+            return None
+        if row["candidate"] == observed:
+            row["streak"] += 1
+        else:
+            row["candidate"], row["streak"] = observed, 1
+        if row["streak"] < (self.up_confirm if online else self.down_confirm):
+            return None
+
+        row["status"] = observed
+        row["updated_at"] = _iso(now)
+        row["candidate"], row["streak"] = None, 0
+        self.transitions += 1
+        if row["status"] == row["persisted"]:
+            # Flapped back before the flush - nothing to write
+            self._dirty.discard(row["id"])
+        else:
+            self._dirty.add(row["id"])
+            self._wakeup.set()
+        return observed
+
+    def observe_a2s(self, results: Dict[str, dict]):
+        """A2S poller listener: one observation per polled server"""
+        for server_id, result in results.items():
+            self.observe(server_id, result["online"], **{
+                field: result[field] for field in LIVE_FIELDS if field in result
+            })
+
+    def record(self, server_id: str, status: str):
+        """A status this backend already wrote to the database"""
+        row = self._rows.get(str(server_id))
+        if row is None:
+            return
+        row["status"] = row["persisted"] = status
+        row["updated_at"] = _iso(time.time())
+        row["candidate"], row["streak"] = None, 0
+        self._dirty.discard(row["id"])
+
+    # -- writing ----------------------------------------------------------
+
+    async def flush(self) -> int:
+        """Write pending transitions, one UPDATE per (from, to) pair; returns rows written"""
+        groups: Dict[Tuple[str, str], List[str]] = {}
+        for server_id in list(self._dirty):
+            row = self._rows.get(server_id)
+            if row is None or row["status"] == row["persisted"]:
+                self._dirty.discard(server_id)
+                continue
+            groups.setdefault((row["persisted"], row["status"]), []).append(server_id)
+        if not groups:
+            return 0
+
+        supabase = await get_async_supabase()
+        written = 0
+        stale: List[str] = []
+        for (previous, status), ids in groups.items():
+            query = supabase.table("servers")\
+                .update({"status": status, "updated_at": _iso(time.time())},
+                        count=CountMethod.exact, returning=ReturnMethod.minimal)\
+                .in_("id", ids)
+            query = query.eq("status", previous) if previous is not None else query.is_("status", "null")
+            result = await db_call(query.execute())
+            count = result.count or 0
+            written += count
+            if count < len(ids):
+                # Some rows were no longer `previous`: adopt what the database has now
+                self.conflicts += len(ids) - count
+                stale.extend(ids)
+                continue
+            for server_id in ids:
+                row = self._rows.get(server_id)
+                if row is not None:
+                    row["persisted"] = status
+                    # Still dirty if it transitioned again while awaiting
+                    if row["status"] == status:
+                        self._dirty.discard(server_id)
+        self.writes += written
+        if stale:
+            await self.refresh(stale)
+        return written
+
+    async def _run(self):
+        while True:
+            timeout = max(self.resync_seconds - (time.monotonic() - self._loaded_at), 0)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                # Coalesce everything that transitions within the window
+                await asyncio.sleep(self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                if self._dirty:
+                    await self.flush()
+                if time.monotonic() - self._loaded_at >= self.resync_seconds:
+                    await self.load()
+            except Exception as e:
+                print(f"⚠️ Server state sync failed: {e}", flush=True)
+                if self._dirty:
+                    self._wakeup.set()
+                self._loaded_at = max(self._loaded_at, time.monotonic() - self.resync_seconds + self.flush_interval)
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            try:
+                await self.load()
+            except Exception as e:
+                print(f"⚠️ Could not load server state: {e}", flush=True)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the loop and write what is still pending"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._dirty:
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"⚠️ Could not write server state: {e}", flush=True)
+
+    # -- reads ------------------------------------------------------------
+
+    def get(self, server_id: str) -> Optional[dict]:
+        row = self._rows.get(str(server_id))
+        return {k: v for k, v in row.items() if k not in _PRIVATE} if row is not None else None
+
+    def snapshot(self) -> List[dict]:
+        return [self.get(server_id) for server_id in self._rows]
+
+    def visible(self, user_id: str, admin: bool) -> List[dict]:
+        """Rows the caller may see: all for admins, else the servers they own"""
+        return [row for row in self.snapshot() if admin or row["owner_id"] == user_id]
+
+    def a2s_targets(self) -> List[dict]:
+        """Servers for the A2S poller: installed, with a host and a query port"""
+        from services.a2s import A2S_SERVER_TYPES
+        return [
+            {"id": row["id"], "hostname": row["hostname"], "query_port": row["query_port"]}
+            for row in self._rows.values()
+            if row["server_type"] in A2S_SERVER_TYPES and row["status"] in OBSERVED_STATUSES
+            and row["hostname"] and row["query_port"]
+        ]
+
+    def stats(self) -> dict:
+        by_status: Dict[str, int] = {}
+        for row in self._rows.values():
+            by_status[row["status"]] = by_status.get(row["status"], 0) + 1
+        return {
+            "servers": len(self._rows),
+            "by_status": by_status,
+            "players": sum(row.get("players") or 0 for row in self._rows.values()),
+            "pending_writes": len(self._dirty),
+            "observations": self.observations,
+            "transitions": self.transitions,
+            "writes": self.writes,
+            "conflicts": self.conflicts
+        }
+
+
+_table: Optional[ServerStateTable] = None
+
+
+def get_server_state() -> ServerStateTable:
+    """Get the process-wide server state table singleton"""
+    global _table
+    if _table is None:
+        _table = ServerStateTable()
+    return _table
@@ -0,0 +1,259 @@
+"""Pooled SSH connections to managed hosts.
+
+One SSH connection is kept per active host and reused: every command opens
+a new channel on it (a few ms) instead of doing a full TCP + key-exchange +
+auth handshake (hundreds of ms). Around that:
+
+- keepalives detect dead peers, and a closed connection is reopened on its
+  next use;
+- at most ``SSH_MAX_CHANNELS`` channels are open per host at once (OpenSSH
+  allows 10 sessions per connection by default), and further callers wait;
+- failed connects back off exponentially per host, so an unreachable host
+  fails fast instead of being hammered;
+- connections unused for ``SSH_IDLE_TIMEOUT`` seconds are closed.
+
+Hosts are ``Host`` rows (model objects or dicts) with ``hostname``,
+``port``, ``username`` and an optional ``ssh_key_path``. Usage::
+
+    result = await get_ssh_pool().run(host, "df -h /")
+    async with get_ssh_pool().process(host, "tail -f log") as process:
+        async for line in process.stdout: ...
+"""
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Tuple
+
+import asyncssh
+
+SSH_MAX_CHANNELS = int(os.getenv("SSH_MAX_CHANNELS", "8"))
+SSH_IDLE_TIMEOUT = float(os.getenv("SSH_IDLE_TIMEOUT", "300"))
+SSH_KEEPALIVE = float(os.getenv("SSH_KEEPALIVE", "30"))
+SSH_CONNECT_TIMEOUT = float(os.getenv("SSH_CONNECT_TIMEOUT", "10"))
+SSH_RETRY_BASE = float(os.getenv("SSH_RETRY_BASE", "1"))
+SSH_RETRY_MAX = float(os.getenv("SSH_RETRY_MAX", "60"))
+# known_hosts file; "none" disables host key checking (development only)
+SSH_KNOWN_HOSTS = os.getenv("SSH_KNOWN_HOSTS")
+
+
+class SSHUnavailable(Exception):
+    """The host could not be connected to (or is backing off after failures)"""
+
+
+def _field(host, name: str, default=None):
+    if isinstance(host, dict):
+        return host.get(name, default)
+    return getattr(host, name, default)
+
+
+def _host_params(host) -> Tuple[str, int, str, Optional[str]]:
+    return (
+        _field(host, "hostname"),
+        int(_field(host, "port") or 22),
+        _field(host, "username"),
+        _field(host, "ssh_key_path")
+    )
+
+
+class _HostConnection:
+    """Connection state for one host"""
+
+    def __init__(self, key: str, params: Tuple[str, int, str, Optional[str]], max_channels: int):
+        self.key = key
+        self.params = params
+        self.conn: Optional[asyncssh.SSHClientConnection] = None
+        self.channels = asyncio.Semaphore(max_channels)
+        self.connect_lock = asyncio.Lock()
+        self.active = 0
+        self.last_used = time.monotonic()
+        self.failures = 0
+        self.retry_at = 0.0
+        self.last_error: Optional[str] = None
+        self.connects = 0
+        self.commands = 0
+
+    @property
+    def connected(self) -> bool:
+        return self.conn is not None and not self.conn.is_closed()
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class SSHPool:
+    """Per-host multiplexed SSH connections"""
+
+    def __init__(self, max_channels: int = SSH_MAX_CHANNELS, idle_timeout: float = SSH_IDLE_TIMEOUT,
+                 keepalive: float = SSH_KEEPALIVE, connect_timeout: float = SSH_CONNECT_TIMEOUT):
+        self.max_channels = max_channels
+        self.idle_timeout = idle_timeout
+        self.keepalive = keepalive
+        self.connect_timeout = connect_timeout
+        self._hosts: Dict[str, _HostConnection] = {}
+        self._janitor_task: Optional[asyncio.Task] = None
+
+    # -- connections ------------------------------------------------------
+
+    def _entry(self, host) -> _HostConnection:
+        params = _host_params(host)
+        key = str(_field(host, "id") or f"{params[2]}@{params[0]}:{params[1]}")
+        entry = self._hosts.get(key)
+        if entry is not None and entry.params != params:
+            # Host was edited - drop the old connection once it is idle
+            if entry.active == 0:
+                entry.close()
+            entry = None
+        if entry is None:
+            entry = _HostConnection(key, params, self.max_channels)
+            self._hosts[key] = entry
+        if self._janitor_task is None or self._janitor_task.done():
+            self._janitor_task = asyncio.create_task(self._janitor())
+        return entry
+
+    def _connect_options(self, entry: _HostConnection) -> dict:
+        hostname, port, username, key_path = entry.params
+        options = {
+            "host": hostname,
+            "port": port,
+            "username": username,
+            "keepalive_interval": self.keepalive,
+            "keepalive_count_max": 3,
+            "connect_timeout": self.connect_timeout
+        }
+        if key_path:
+            options["client_keys"] = [key_path]
+        if SSH_KNOWN_HOSTS:
+            options["known_hosts"] = None if SSH_KNOWN_HOSTS.lower() == "none" else SSH_KNOWN_HOSTS
+        return options
+
+    async def _connection(self, entry: _HostConnection) -> asyncssh.SSHClientConnection:
+        if entry.connected:
+            return entry.conn
+        async with entry.connect_lock:
+            # Another caller may have connected while we waited
+            if entry.connected:
+                return entry.conn
+            now = time.monotonic()
+            if now < entry.retry_at:
+                raise SSHUnavailable(
+                    f"{entry.key}: retrying in {entry.retry_at - now:.0f}s ({entry.last_error})"
+                )
+            try:
+                entry.conn = await asyncssh.connect(**self._connect_options(entry))
+            except (OSError, asyncio.TimeoutError, asyncssh.Error) as e:
+                entry.conn = None
+                entry.failures += 1
+                entry.last_error = f"{type(e).__name__}: {e}"
+                delay = min(SSH_RETRY_BASE * (2 ** (entry.failures - 1)), SSH_RETRY_MAX)
+                entry.retry_at = time.monotonic() + delay
+                print(f"⚠️ SSH connect to {entry.key} failed, retry in {delay:.0f}s: {e}", flush=True)
+                raise SSHUnavailable(f"{entry.key}: {entry.last_error}") from e
+            entry.failures = 0
+            entry.retry_at = 0.0
+            entry.last_error = None
+            entry.connects += 1
+            return entry.conn
+
+    @asynccontextmanager
+    async def _channel(self, host):
+        """Reserve a channel slot on the host's (re)connected connection"""
+        entry = self._entry(host)
+        # Counted while waiting too, so the janitor never evicts a host in use
+        entry.active += 1
+        try:
+            async with entry.channels:
+                yield entry, await self._connection(entry)
+        finally:
+            entry.active -= 1
+            entry.last_used = time.monotonic()
+            if entry.active == 0 and self._hosts.get(entry.key) is not entry:
+                # Replaced after the host was edited
+                entry.close()
+
+    async def _create_process(self, entry: _HostConnection, conn, command: str, **kwargs):
+        """Open a channel; a pooled connection that died silently is replaced once.
+
+        Only the channel open is retried - the command has not started yet.
+        """
+        entry.commands += 1
+        try:
+            return await conn.create_process(command, **kwargs)
+        except (asyncssh.ConnectionLost, asyncssh.DisconnectError, BrokenPipeError, ConnectionResetError):
+            entry.close()
+            conn = await self._connection(entry)
+            return await conn.create_process(command, **kwargs)
+
+    # -- commands ---------------------------------------------------------
+
+    async def run(self, host, command: str, timeout: Optional[float] = None,
+                  check: bool = False, **kwargs) -> asyncssh.SSHCompletedProcess:
+        """Run a command to completion on one channel of the pooled connection"""
+        async with self._channel(host) as (entry, conn):
+            process = await self._create_process(entry, conn, command, **kwargs)
+            try:
+                return await process.wait(check=check, timeout=timeout)
+            finally:
+                process.close()
+
+    @asynccontextmanager
+    async def process(self, host, command: str, **kwargs):
+        """Open a process for streaming I/O; the channel is closed on exit"""
+        async with self._channel(host) as (entry, conn):
+            process = await self._create_process(entry, conn, command, **kwargs)
+            try:
+                yield process
+            finally:
+                process.close()
+
+    # -- housekeeping -----------------------------------------------------
+
+    async def _janitor(self):
+        interval = max(self.idle_timeout / 4, 1)
+        while True:
+            await asyncio.sleep(interval)
+            cutoff = time.monotonic() - self.idle_timeout
+            for key, entry in list(self._hosts.items()):
+                if entry.active == 0 and entry.last_used < cutoff:
+                    entry.close()
+                    # Keep a failing host's backoff state until it runs out
+                    if time.monotonic() >= entry.retry_at:
+                        del self._hosts[key]
+
+    async def close(self):
+        if self._janitor_task is not None:
+            self._janitor_task.cancel()
+            await asyncio.gather(self._janitor_task, return_exceptions=True)
+            self._janitor_task = None
+        conns = [entry.conn for entry in self._hosts.values() if entry.conn is not None]
+        for entry in self._hosts.values():
+            entry.close()
+        await asyncio.gather(*(conn.wait_closed() for conn in conns), return_exceptions=True)
+        self._hosts.clear()
+
+    def stats(self) -> dict:
+        return {
+            key: {
+                "connected": entry.connected,
+                "in_use": entry.active,
+                "connects": entry.connects,
+                "commands": entry.commands,
+                "failures": entry.failures,
+                "last_error": entry.last_error,
+                "idle_s": round(time.monotonic() - entry.last_used, 1)
+            }
+            for key, entry in self._hosts.items()
+        }
+
+
+_pool: Optional[SSHPool] = None
+
+
+def get_ssh_pool() -> SSHPool:
+    """Get the process-wide SSH pool singleton"""
+    global _pool
+    if _pool is None:
+        _pool = SSHPool()
+    return _pool
@@ -0,0 +1,648 @@
+"""SteamCMD install / update jobs for game servers.
+
+A job runs ``steamcmd +force_install_dir <install_path> +login anonymous
++app_update <app id> [validate] +quit``. It runs as an asyncio subprocess
+when the server's host is this machine, and over the pooled SSH connection
+otherwise (with a pty, so steamcmd flushes its progress lines immediately
+and a dropped channel hangs it up). Each output line is parsed into
+structured events::
+
+    Update state (0x61) downloading, progress: 45.12 (1234 / 5678)
+    -> {"phase": "downloading", "percent": 45.12, "bytes_done": 1234, "bytes_total": 5678}
+
+Progress and log lines are published on the job's ``Broadcaster`` at most
+every ``STEAMCMD_PROGRESS_INTERVAL`` seconds. The server row moves
+NOT_INSTALLED/STOPPED -> INSTALLING -> STOPPED, or back to its previous
+status when the job fails or is cancelled. Every claimed server is also
+recorded in ``data/steamcmd-claims/<pid>.json`` until its job finishes, so
+after a crash the next startup restores exactly those servers (and only
+once their process is gone). At most ``STEAMCMD_PER_HOST``
+jobs run per host; further jobs wait as "queued", because parallel
+downloads only share the same disk and link.
+
+With ``GAME_CACHE_ROOT`` set, servers share their game files: steamcmd
+updates one staging copy per app and host, ``agent/game_cache.py`` ingests
+it into a content-addressed store, and the server's ``install_path`` is
+materialized from it by reflink or hardlink. A second server then costs
+seconds and almost no disk. ``SERVER_PRIVATE_DIRS`` (configs, saves, mods)
+stay per server.
+
+Try it without Steam: ``python check_steamcmd.py`` (uses ``fake_steamcmd.py``).
+"""
+import asyncio
+import json
+import os
+import posixpath
+import re
+import shlex
+import sys
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+
+from postgrest.types import CountMethod, ReturnMethod
+
+from services.broadcast import Broadcaster
+from services.server_state import RUNNING, STOPPED, INSTALLING, NOT_INSTALLED, get_server_state
+from services.ssh_pool import get_ssh_pool
+from services.supabase_client import get_async_supabase, db_call
+
+STEAMCMD_PER_HOST = int(os.getenv("STEAMCMD_PER_HOST", "1"))
+# Extra attempts after a failed run (steamcmd resumes partial downloads)
+STEAMCMD_RETRIES = int(os.getenv("STEAMCMD_RETRIES", "2"))
+STEAMCMD_RETRY_DELAY = float(os.getenv("STEAMCMD_RETRY_DELAY", "10"))
+# Whole-run timeout per attempt (a full ASA download is ~15 GB)
+STEAMCMD_TIMEOUT = float(os.getenv("STEAMCMD_TIMEOUT", "14400"))
+# Seconds between progress frames sent to clients
+STEAMCMD_PROGRESS_INTERVAL = float(os.getenv("STEAMCMD_PROGRESS_INTERVAL", "0.5"))
+# Finished jobs kept for status queries
+STEAMCMD_JOBS_KEPT = 100
+STEAMCMD_LOG_LINES = 200
+
+# Shared game files per host (see agent/game_cache.py); unset = install into each install_path
+GAME_CACHE_ROOT = os.getenv("GAME_CACHE_ROOT")
+# agent/game_cache.py on remote hosts (run with their python3)
+GAME_CACHE_TOOL = os.getenv("GAME_CACHE_TOOL", "/opt/zedin-steam-manager/backend/agent/game_cache.py")
+# auto (reflink, else hardlink), reflink, hardlink or copy
+GAME_CACHE_LINK = os.getenv("GAME_CACHE_LINK", "auto")
+GAME_CACHE_KEEP_BUILDS = int(os.getenv("GAME_CACHE_KEEP_BUILDS", "2"))
+_claims_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'steamcmd-claims'))
+_LOCAL_CACHE_TOOL = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'agent', 'game_cache.py'))
+
+# Dedicated server app ids
+STEAM_APP_IDS = {"ASE": 376030, "ASA": 2430930}
+# Never shared between servers: configs / saves / logs, and mods
+SERVER_PRIVATE_DIRS = {
+    "ASE": ["ShooterGame/Saved", "ShooterGame/Content/Mods"],
+    "ASA": ["ShooterGame/Saved", "ShooterGame/Binaries/Win64/ShooterGame/Mods"]
+}
+LOCAL_HOSTNAMES = {"localhost", "127.0.0.1", "::1"}
+
+# Job states
+QUEUED = "queued"
+ACTIVE = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+_UPDATE_RE = re.compile(
+    r"Update state \(0x([0-9a-fA-F]+)\) ([^,]+), progress: ([\d.]+) \((\d+) / (\d+)\)"
+)
+# steamcmd updating itself: "[ 45%] Downloading update (12,345 of 40,000 KB)..."
+_SELF_UPDATE_RE = re.compile(r"^\[\s*(\d+)%\]\s+(.+?)\.*$")
+_SUCCESS_RE = re.compile(r"Success! App '(\d+)' (?:fully installed|already up to date)")
+_ERROR_RE = re.compile(r"^(?:ERROR|Error)! (.+)")
+
+# (server_id, new status, allowed current statuses or None) -> row was updated
+StatusCallback = Callable[[str, str, Optional[Sequence[str]]], Awaitable[bool]]
+
+
+class InstallConflict(Exception):
+    """The server is running or already being installed"""
+
+
+def parse_line(line: str) -> Optional[dict]:
+    """Structured event for a steamcmd output line, or None for plain log output"""
+    match = _UPDATE_RE.search(line)
+    if match:
+        return {
+            "type": "progress",
+            "state": int(match.group(1), 16),
+            "phase": match.group(2).strip(),
+            "percent": float(match.group(3)),
+            "bytes_done": int(match.group(4)),
+            "bytes_total": int(match.group(5))
+        }
+    match = _SELF_UPDATE_RE.match(line)
+    if match:
+        return {
+            "type": "progress",
+            "state": None,
+            "phase": "steamcmd update",
+            "percent": float(match.group(1)),
+            "bytes_done": None,
+            "bytes_total": None
+        }
+    if _SUCCESS_RE.search(line):
+        return {"type": "success"}
+    match = _ERROR_RE.match(line)
+    if match:
+        return {"type": "error", "error": match.group(1).strip()}
+    return None
+
+
+def app_id_for(server: dict) -> int:
+    app_id = STEAM_APP_IDS.get(server.get("server_type"))
+    if app_id is None:
+        raise ValueError(f"Unknown server type {server.get('server_type')!r}")
+    return app_id
+
+
+def build_command(server: dict, validate: bool = False, install_path: Optional[str] = None) -> List[str]:
+    app_id = app_id_for(server)
+    command = [server["steamcmd_path"]]
+    if server["server_type"] == "ASA":
+        # ASA only ships a Windows server (run under Proton on Linux hosts)
+        command += ["+@sSteamCmdForcePlatformType", "windows"]
+    command += ["+force_install_dir", install_path or server["install_path"], "+login", "anonymous", "+app_update", str(app_id)]
+    if validate:
+        command.append("validate")
+    command.append("+quit")
+    return command
+
+
+def is_local(host: Optional[dict]) -> bool:
+    return host is None or host.get("hostname") in LOCAL_HOSTNAMES
+
+
+def cache_command(host: Optional[dict], *args: str) -> List[str]:
+    """agent/game_cache.py invocation on the server's host"""
+    if is_local(host):
+        return [sys.executable, _LOCAL_CACHE_TOOL, *args]
+    return ["python3", GAME_CACHE_TOOL, *args]
+
+
+async def _run_local(command: List[str], on_line: Callable[[str], None]) -> int:
+    process = await asyncio.create_subprocess_exec(
+        *command,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT
+    )
+    try:
+        buffer = b""
+        while True:
+            chunk = await process.stdout.read(4096)
+            if not chunk:
+                break
+            buffer += chunk
+            *lines, buffer = re.split(rb"[\r\n]", buffer)
+            for raw in lines:
+                on_line(raw.decode(errors="replace"))
+        if buffer:
+            on_line(buffer.decode(errors="replace"))
+        return await process.wait()
+    except BaseException:
+        # Timeout / cancel: don't leave steamcmd writing into the install dir
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+
+
+async def _run_remote(host: dict, command: List[str], on_line: Callable[[str], None]) -> int:
+    async with get_ssh_pool().process(host, shlex.join(command), term_type="dumb", errors="replace") as process:
+        buffer = ""
+        while True:
+            chunk = await process.stdout.read(4096)
+            if not chunk:
+                break
+            buffer += chunk
+            *lines, buffer = re.split(r"[\r\n]", buffer)
+            for line in lines:
+                on_line(line)
+        if buffer:
+            on_line(buffer)
+        completed = await process.wait()
+        return completed.exit_status if completed.exit_status is not None else -1
+
+
+async def run_on_host(host: Optional[dict], command: List[str], on_line: Callable[[str], None]) -> int:
+    """Run a command here or over the host's pooled SSH connection; returns its exit status"""
+    if is_local(host):
+        return await _run_local(command, on_line)
+    return await _run_remote(host, command, on_line)
+
+
+async def game_cache_stats(host: Optional[dict]) -> dict:
+    """Object count / bytes and the current build per app of a host's game cache"""
+    if not GAME_CACHE_ROOT:
+        raise ValueError("GAME_CACHE_ROOT is not set")
+    lines: List[str] = []
+    command = cache_command(host, "stats", GAME_CACHE_ROOT)
+    exit_status = await asyncio.wait_for(run_on_host(host, command, lines.append), STEAMCMD_TIMEOUT)
+    for line in reversed(lines):
+        if line.startswith('{"event": "result"'):
+            result = json.loads(line)
+            return {k: v for k, v in result.items() if k not in ("event", "step")}
+    raise RuntimeError(lines[-1] if lines else f"game cache stats exited with status {exit_status}")
+
+
+class InstallJob:
+    """One install / update of one server"""
+
+    def __init__(self, server: dict, host: Optional[dict], validate: bool):
+        self.id = uuid.uuid4().hex[:12]
+        self.server_id = str(server["id"])
+        self.server = server
+        self.host = host
+        self.host_key = "local" if is_local(host) else str(host["id"])
+        self.validate = validate
+        self.previous_status = server.get("status") or NOT_INSTALLED
+        self.state = QUEUED
+        self.step: Optional[str] = None
+        self.attempt = 0
+        self.phase: Optional[str] = None
+        self.percent: Optional[float] = None
+        self.bytes_done: Optional[int] = None
+        self.bytes_total: Optional[int] = None
+        self.error: Optional[str] = None
+        self.exit_status: Optional[int] = None
+        self.cache: Dict[str, dict] = {}
+        self.log = deque(maxlen=STEAMCMD_LOG_LINES)
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.channel = Broadcaster(f"steamcmd-{self.id}", queue_size=32)
+        self.task: Optional[asyncio.Task] = None
+        self._pending: List[str] = []
+        self._published_at = 0.0
+
+    @property
+    def finished(self) -> bool:
+        return self.state in (DONE, FAILED, CANCELLED)
+
+    def snapshot(self, log: bool = False) -> dict:
+        data = {
+            "id": self.id,
+            "server_id": self.server_id,
+            "host": self.host_key,
+            "validate": self.validate,
+            "state": self.state,
+            "step": self.step,
+            "attempt": self.attempt,
+            "phase": self.phase,
+            "percent": self.percent,
+            "bytes_done": self.bytes_done,
+            "bytes_total": self.bytes_total,
+            "error": self.error,
+            "exit_status": self.exit_status,
+            "cache": self.cache,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+        if log:
+            data["log"] = list(self.log)
+        return data
+
+    def publish_state(self):
+        self._pending.clear()
+        self.channel.publish({"type": "state", **self.snapshot(log=True)})
+
+    def on_line(self, line: str):
+        line = line.strip()
+        if not line:
+            return
+        if line.startswith('{"event"'):
+            self._on_cache_event(line)
+            return
+        self.log.append(line)
+        self._pending.append(line)
+        event = parse_line(line)
+        if event is not None:
+            if event["type"] == "progress":
+                phase_changed = event["phase"] != self.phase
+                self.phase = event["phase"]
+                self.percent = event["percent"]
+                self.bytes_done = event["bytes_done"]
+                self.bytes_total = event["bytes_total"]
+                if phase_changed:
+                    self.flush()
+                    return
+            elif event["type"] == "error":
+                self.error = event["error"]
+        if time.monotonic() - self._published_at >= STEAMCMD_PROGRESS_INTERVAL:
+            self.flush()
+
+    def _on_cache_event(self, line: str):
+        try:
+            event = json.loads(line)
+        except ValueError:
+            return
+        if event["event"] == "progress":
+            phase_changed = event["step"] != self.phase
+            self.phase = event["step"]
+            self.bytes_done = event["bytes_done"]
+            self.bytes_total = event["bytes_total"]
+            self.percent = round(self.bytes_done * 100 / self.bytes_total, 2) if self.bytes_total else 100.0
+            if not phase_changed and time.monotonic() - self._published_at < STEAMCMD_PROGRESS_INTERVAL:
+                return
+        else:
+            if event["event"] == "result":
+                self.cache[event["step"]] = {k: v for k, v in event.items() if k not in ("event", "step")}
+            else:
+                self.error = event.get("error")
+            self.log.append(line)
+            self._pending.append(line)
+        self.flush()
+
+    def flush(self):
+        """Publish progress plus the lines seen since the last frame"""
+        self._published_at = time.monotonic()
+        self.channel.publish({
+            "type": "progress",
+            "phase": self.phase,
+            "percent": self.percent,
+            "bytes_done": self.bytes_done,
+            "bytes_total": self.bytes_total,
+            "lines": self._pending
+        })
+        self._pending = []
+
+
+async def update_server_status(server_id: str, status: str,
+                               only_from: Optional[Sequence[str]] = None) -> bool:
+    """Set servers.status; with ``only_from`` only when the current status is one of them"""
+    supabase = await get_async_supabase()
+    query = supabase.table("servers")\
+        .update({"status": status}, count=CountMethod.exact, returning=ReturnMethod.minimal)\
+        .eq("id", server_id)
+    if only_from is not None:
+        query = query.in_("status", list(only_from))
+    result = await db_call(query.execute())
+    if result.count:
+        get_server_state().record(server_id, status)
+    return bool(result.count)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Exists, owned by another user
+        pass
+    return True
+
+
+class SteamCMDManager:
+    """Runs install jobs with a per-host concurrency cap"""
+
+    def __init__(self, per_host: int = STEAMCMD_PER_HOST, on_status: StatusCallback = update_server_status,
+                 claims_dir: str = _claims_dir):
+        self.per_host = per_host
+        self.on_status = on_status
+        self.claims_dir = claims_dir
+        # server id -> status to restore, persisted while this process owns the install
+        self._claims: Dict[str, str] = {}
+        self.jobs: "OrderedDict[str, InstallJob]" = OrderedDict()
+        self._active: Dict[str, InstallJob] = {}
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+        # One staging copy per app and host: its steamcmd / ingest must not overlap
+        self._app_locks: Dict[tuple, asyncio.Lock] = {}
+
+    def _slots(self, host_key: str) -> asyncio.Semaphore:
+        slots = self._host_slots.get(host_key)
+        if slots is None:
+            slots = self._host_slots[host_key] = asyncio.Semaphore(self.per_host)
+        return slots
+
+    def _claims_file(self, pid: int) -> str:
+        return os.path.join(self.claims_dir, f"{pid}.json")
+
+    def _save_claims(self):
+        path = self._claims_file(os.getpid())
+        try:
+            if not self._claims:
+                if os.path.exists(path):
+                    os.unlink(path)
+                return
+            os.makedirs(self.claims_dir, exist_ok=True)
+            tmp = f"{path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(self._claims, f)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"⚠️ Could not persist install claims: {e}", flush=True)
+
+    def _claim(self, server_id: str, previous_status: Optional[str]):
+        if previous_status is None:
+            self._claims.pop(server_id, None)
+        else:
+            self._claims[server_id] = previous_status
+        self._save_claims()
+
+    async def recover(self) -> int:
+        """Restore servers left INSTALLING by a backend process that died mid-install.
+
+        Only claims of processes that are gone are touched. A server changed
+        since (by another backend) keeps its status.
+        """
+        try:
+            names = os.listdir(self.claims_dir)
+        except FileNotFoundError:
+            return 0
+        restored = 0
+        for name in names:
+            if not name.endswith(".json") or not name[:-5].isdigit():
+                continue
+            pid = int(name[:-5])
+            # Our own pid is stale only if we have claimed nothing yet (pid reused after a restart)
+            if pid == os.getpid() and self._claims:
+                continue
+            if pid != os.getpid() and _pid_alive(pid):
+                continue
+            path = os.path.join(self.claims_dir, name)
+            try:
+                with open(path) as f:
+                    claims = json.load(f)
+            except (OSError, ValueError):
+                claims = {}
+            remaining = {}
+            for server_id, previous_status in claims.items():
+                try:
+                    if await self.on_status(server_id, previous_status, (INSTALLING,)):
+                        restored += 1
+                except Exception as e:
+                    print(f"⚠️ Could not restore server {server_id} to {previous_status}: {e}", flush=True)
+                    remaining[server_id] = previous_status
+            if remaining:
+                with open(path, "w") as f:
+                    json.dump(remaining, f)
+            else:
+                os.unlink(path)
+        return restored
+
+    def get(self, job_id: str) -> Optional[InstallJob]:
+        return self.jobs.get(job_id)
+
+    def for_server(self, server_id: str) -> Optional[InstallJob]:
+        """The server's running job, else its most recent one"""
+        job = self._active.get(str(server_id))
+        if job is not None:
+            return job
+        for job in reversed(self.jobs.values()):
+            if job.server_id == str(server_id):
+                return job
+        return None
+
+    async def start(self, server: dict, host: Optional[dict] = None, validate: bool = False) -> InstallJob:
+        """Queue an install / update; raises InstallConflict if one is running or the server is"""
+        server_id = str(server["id"])
+        if server_id in self._active:
+            raise InstallConflict("An install is already running for this server")
+        app_id_for(server)
+        # Claim the server in the database: guards against other backends and a running server
+        if not await self.on_status(server_id, INSTALLING, (STOPPED, NOT_INSTALLED)):
+            raise InstallConflict("Server must be stopped to install or update")
+
+        job = InstallJob(server, host, validate)
+        self._claim(server_id, job.previous_status)
+        self._active[server_id] = job
+        self.jobs[job.id] = job
+        while len(self.jobs) > STEAMCMD_JOBS_KEPT:
+            oldest_id, oldest = next(iter(self.jobs.items()))
+            if not oldest.finished:
+                break
+            del self.jobs[oldest_id]
+        job.publish_state()
+        job.task = asyncio.create_task(self._run(job))
+        return job
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.jobs.get(job_id)
+        if job is None or job.finished or job.task is None:
+            return False
+        job.task.cancel()
+        return True
+
+    def _app_lock(self, host_key: str, app_id: int) -> asyncio.Lock:
+        lock = self._app_locks.get((host_key, app_id))
+        if lock is None:
+            lock = self._app_locks[(host_key, app_id)] = asyncio.Lock()
+        return lock
+
+    async def _run(self, job: InstallJob):
+        try:
+            async with self._slots(job.host_key):
+                job.state = ACTIVE
+                job.started_at = time.time()
+                job.publish_state()
+                while True:
+                    job.attempt += 1
+                    job.error = None
+                    if await self._install(job):
+                        job.state = DONE
+                        job.percent = 100.0
+                        break
+                    if job.attempt > STEAMCMD_RETRIES:
+                        job.state = FAILED
+                        break
+                    print(f"⚠️ steamcmd for server {job.server_id} failed ({job.error}), "
+                          f"retrying (attempt {job.attempt + 1})", flush=True)
+                    job.log.append(f"--- retrying: {job.error}")
+                    job.publish_state()
+                    await asyncio.sleep(STEAMCMD_RETRY_DELAY * job.attempt)
+        except asyncio.CancelledError:
+            job.state = CANCELLED
+            job.error = "Cancelled"
+        except Exception as e:
+            job.state = FAILED
+            job.error = f"{type(e).__name__}: {e}"
+        finally:
+            job.finished_at = time.time()
+            self._active.pop(job.server_id, None)
+            status = STOPPED if job.state == DONE else job.previous_status
+            try:
+                await self.on_status(job.server_id, status, None)
+                self._claim(job.server_id, None)
+            except Exception as e:
+                print(f"❌ Could not set server {job.server_id} to {status}: {e}", flush=True)
+            if job.state == DONE:
+                print(f"✅ Server {job.server_id} installed (attempt {job.attempt})", flush=True)
+            else:
+                print(f"❌ Install of server {job.server_id} {job.state}: {job.error}", flush=True)
+            job.publish_state()
+            job.channel.close()
+
+    async def _install(self, job: InstallJob) -> bool:
+        if not GAME_CACHE_ROOT:
+            return await self._step(job, "download", build_command(job.server, job.validate), steam=True)
+
+        app_id = app_id_for(job.server)
+        root = GAME_CACHE_ROOT
+        materialize = ["materialize", root, str(app_id), job.server["install_path"], "--link", GAME_CACHE_LINK]
+        for path in SERVER_PRIVATE_DIRS[job.server["server_type"]]:
+            materialize += ["--keep", path]
+        if job.validate:
+            # Re-place every file, not only the ones that changed
+            materialize.append("--force")
+
+        async with self._app_lock(job.host_key, app_id):
+            staging = posixpath.join(root, "staging", str(app_id))
+            if not (await self._step(job, "download", build_command(job.server, job.validate, staging), steam=True)
+                    and await self._step(job, "ingest", cache_command(job.host, "ingest", root, str(app_id)))
+                    and await self._step(job, "materialize", cache_command(job.host, *materialize))):
+                return False
+            if job.cache["ingest"]["new_objects"]:
+                await self._step(job, "gc", cache_command(
+                    job.host, "gc", root, str(app_id), "--keep-builds", str(GAME_CACHE_KEEP_BUILDS)
+                ))
+        return True
+
+    async def _step(self, job: InstallJob, step: str, command: List[str], steam: bool = False) -> bool:
+        """Run one command of the job; steamcmd steps must also report success"""
+        job.step = step
+        job.phase = job.percent = job.bytes_done = job.bytes_total = None
+        job.publish_state()
+        succeeded = not steam
+        last_line = None
+
+        def on_line(line: str):
+            nonlocal succeeded, last_line
+            job.on_line(line)
+            if line.strip():
+                last_line = line.strip()
+            if steam and _SUCCESS_RE.search(line):
+                succeeded = True
+
+        try:
+            job.exit_status = await asyncio.wait_for(run_on_host(job.host, command, on_line), STEAMCMD_TIMEOUT)
+        except asyncio.TimeoutError:
+            job.error = f"{step} timed out after {STEAMCMD_TIMEOUT:.0f}s"
+            return False
+        except OSError as e:
+            job.error = str(e)
+            return False
+        finally:
+            job.flush()
+
+        if succeeded and job.exit_status == 0:
+            return True
+        if job.error is None:
+            job.error = f"{step} exited with status {job.exit_status}"
+            if not steam and last_line:
+                job.error += f": {last_line}"
+        return False
+
+    async def shutdown(self):
+        """Cancel running jobs (their servers go back to the previous status)"""
+        tasks = [job.task for job in self._active.values() if job.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        by_host: Dict[str, dict] = {}
+        for job in self._active.values():
+            entry = by_host.setdefault(job.host_key, {"running": 0, "queued": 0})
+            entry["running" if job.state == ACTIVE else "queued"] += 1
+        return {
+            "per_host": self.per_host,
+            "active": len(self._active),
+            "hosts": by_host,
+            "jobs_kept": len(self.jobs)
+        }
+
+
+_manager: Optional[SteamCMDManager] = None
+
+
+def get_steamcmd() -> SteamCMDManager:
+    """Get the process-wide install job manager singleton"""
+    global _manager
+    if _manager is None:
+        _manager = SteamCMDManager()
+    return _manager
@@ -1,17 +1,91 @@
-from supabase import create_client, Client
+from supabase import create_client, Client, acreate_client, AsyncClient, AsyncClientOptions
+import asyncio
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Max Supabase calls in flight at once, and per-call timeout (seconds)
+SUPABASE_MAX_CONCURRENCY = int(os.getenv("SUPABASE_MAX_CONCURRENCY", "20"))
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "10"))
+
 _supabase_client: Client = None
+_async_client: AsyncClient = None
+_async_auth_client: AsyncClient = None
+_semaphore: asyncio.Semaphore = None
+_init_lock: asyncio.Lock = None
+
+class SupabaseTimeout(Exception):
+    """A Supabase call exceeded its timeout"""
+
+def _credentials():
+    url = os.getenv("SUPABASE_URL")
+    # Use SERVICE_KEY for backend operations to bypass RLS
+    key = os.getenv("SUPABASE_SERVICE_KEY") or os.getenv("SUPABASE_KEY")
+    return url, key
+
+def _client_options() -> AsyncClientOptions:
+    # Server-side clients never keep a user session around
+    return AsyncClientOptions(
+        auto_refresh_token=False,
+        persist_session=False,
+        postgrest_client_timeout=SUPABASE_TIMEOUT
+    )
 
 def get_supabase() -> Client:
-    """Get Supabase client singleton with service role key for backend operations"""
+    """Get Supabase client singleton with service role key for backend operations.
+
+    Synchronous - for scripts only. Request handlers use get_async_supabase().
+    """
     global _supabase_client
     if _supabase_client is None:
-        url = os.getenv("SUPABASE_URL")
-        # Use SERVICE_KEY for backend operations to bypass RLS
-        key = os.getenv("SUPABASE_SERVICE_KEY") or os.getenv("SUPABASE_KEY")
+        url, key = _credentials()
         _supabase_client = create_client(url, key)
     return _supabase_client
+
+async def get_async_supabase() -> AsyncClient:
+    """Get the async service-role client.
+
+    The client (and its keep-alive HTTP connection pools) is created once and
+    shared by all requests. Never sign users in with it - use
+    get_async_auth_client() so the service credentials stay in place.
+    """
+    global _async_client, _init_lock
+    if _async_client is None:
+        if _init_lock is None:
+            _init_lock = asyncio.Lock()
+        async with _init_lock:
+            if _async_client is None:
+                url, key = _credentials()
+                _async_client = await acreate_client(url, key, _client_options())
+    return _async_client
+
+async def get_async_auth_client() -> AsyncClient:
+    """Get the async client used for end-user sign-up / sign-in.
+
+    A successful sign-in switches a supabase client over to the user's access
+    token, so these calls get their own client instead of the service one.
+    """
+    global _async_auth_client, _init_lock
+    if _async_auth_client is None:
+        if _init_lock is None:
+            _init_lock = asyncio.Lock()
+        async with _init_lock:
+            if _async_auth_client is None:
+                url, key = _credentials()
+                _async_auth_client = await acreate_client(url, key, _client_options())
+    return _async_auth_client
+
+async def db_call(awaitable, timeout: float = None):
+    """Await a Supabase call with bounded concurrency and a timeout.
+
+    Usage: ``await db_call(supabase.table("x").select("*").execute())``
+    """
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(SUPABASE_MAX_CONCURRENCY)
+    async with _semaphore:
+        try:
+            return await asyncio.wait_for(awaitable, timeout or SUPABASE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise SupabaseTimeout(f"Supabase call timed out after {timeout or SUPABASE_TIMEOUT}s")
@@ -0,0 +1,174 @@
+"""Compact multi-resolution time-series store for system metrics.
+
+Each resolution tier is a fixed-size ring of time buckets backed by
+``array`` columns (no per-sample Python objects). Every ingested sample is
+folded into the current bucket of every tier, so rollups (raw 5s -> 1 min ->
+1 h) happen on write and queries never re-slice lists.
+"""
+import re
+import time
+from array import array
+from typing import Dict, Iterable, List, Optional
+
+# (name, bucket step in seconds, number of buckets)
+DEFAULT_TIERS = [
+    ("5s", 5, 720),        # 1 hour of raw samples
+    ("1m", 60, 1440),      # 24 hours
+    ("1h", 3600, 24 * 42), # 6 weeks
+]
+
+_DURATION_RE = re.compile(r"^(\d+)([smhdw])$")
+_DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def parse_duration(value: str) -> int:
+    """Parse a duration such as ``90s``, ``15m``, ``24h``, ``7d`` or ``2w`` into seconds."""
+    match = _DURATION_RE.match(value.strip().lower())
+    if not match:
+        raise ValueError(f"Invalid duration: {value}")
+    return int(match.group(1)) * _DURATION_UNITS[match.group(2)]
+
+
+class _Tier:
+    """One resolution: a ring of buckets with min/sum/max per metric."""
+
+    def __init__(self, name: str, step: int, capacity: int, metrics: List[str]):
+        self.name = name
+        self.step = step
+        self.capacity = capacity
+        self.bucket_ts = array("q", bytes(8 * capacity))   # bucket start, 0 = empty
+        self.count = array("I", bytes(4 * capacity))
+        self.min = {m: array("d", bytes(8 * capacity)) for m in metrics}
+        self.max = {m: array("d", bytes(8 * capacity)) for m in metrics}
+        self.sum = {m: array("d", bytes(8 * capacity)) for m in metrics}
+
+    @property
+    def retention(self) -> int:
+        return self.step * self.capacity
+
+    def add(self, ts: float, values: Dict[str, float]):
+        bucket = int(ts) - int(ts) % self.step
+        idx = (bucket // self.step) % self.capacity
+        if self.bucket_ts[idx] != bucket:
+            if bucket < self.bucket_ts[idx]:
+                return  # Older than what the slot holds - already expired
+            # Recycle the slot for the new bucket
+            self.bucket_ts[idx] = bucket
+            self.count[idx] = 0
+        first = self.count[idx] == 0
+        self.count[idx] += 1
+        for metric, value in values.items():
+            if metric not in self.sum:
+                continue
+            if first:
+                self.min[metric][idx] = value
+                self.max[metric][idx] = value
+                self.sum[metric][idx] = value
+            else:
+                if value < self.min[metric][idx]:
+                    self.min[metric][idx] = value
+                if value > self.max[metric][idx]:
+                    self.max[metric][idx] = value
+                self.sum[metric][idx] += value
+
+    def query(self, start: float, end: float, metrics: Iterable[str]) -> dict:
+        metrics = list(metrics)
+        timestamps = []
+        series = {m: {"min": [], "avg": [], "max": []} for m in metrics}
+        bucket = int(start) - int(start) % self.step
+        # Never walk further back than the ring holds
+        oldest = int(end) - int(end) % self.step - self.retention + self.step
+        bucket = max(bucket, oldest)
+        while bucket <= end:
+            idx = (bucket // self.step) % self.capacity
+            count = self.count[idx]
+            if self.bucket_ts[idx] == bucket and count:
+                timestamps.append(bucket)
+                for m in metrics:
+                    series[m]["min"].append(round(self.min[m][idx], 2))
+                    series[m]["avg"].append(round(self.sum[m][idx] / count, 2))
+                    series[m]["max"].append(round(self.max[m][idx], 2))
+            bucket += self.step
+        return {"timestamps": timestamps, "series": series}
+
+    def nbytes(self) -> int:
+        columns = [self.bucket_ts, self.count]
+        for group in (self.min, self.max, self.sum):
+            columns.extend(group.values())
+        return sum(col.itemsize * len(col) for col in columns)
+
+
+class TimeSeriesStore:
+    """Multi-resolution metric history for a single host."""
+
+    def __init__(self, metrics: List[str], tiers=DEFAULT_TIERS):
+        self.metrics = list(metrics)
+        self.tiers = [_Tier(name, step, capacity, self.metrics) for name, step, capacity in tiers]
+        self._by_name = {tier.name: tier for tier in self.tiers}
+        self.last_ts: Optional[float] = None
+
+    @property
+    def resolutions(self) -> List[str]:
+        return [tier.name for tier in self.tiers]
+
+    def add(self, values: Dict[str, float], ts: Optional[float] = None):
+        """Fold one sample into every tier."""
+        ts = time.time() if ts is None else ts
+        for tier in self.tiers:
+            tier.add(ts, values)
+        if self.last_ts is None or ts > self.last_ts:
+            self.last_ts = ts
+
+    def pick_tier(self, span: float, resolution: Optional[str] = None) -> _Tier:
+        """Explicit resolution, or the finest tier whose retention covers the span."""
+        if resolution:
+            tier = self._by_name.get(resolution)
+            if tier is None:
+                raise ValueError(f"Unknown resolution: {resolution} (expected one of {', '.join(self.resolutions)})")
+            return tier
+        for tier in self.tiers:
+            if tier.retention >= span:
+                return tier
+        return self.tiers[-1]
+
+    def query(self, span: float, resolution: Optional[str] = None,
+              end: Optional[float] = None, metrics: Optional[Iterable[str]] = None) -> dict:
+        end = time.time() if end is None else end
+        tier = self.pick_tier(span, resolution)
+        result = tier.query(end - span, end, metrics or self.metrics)
+        result["resolution"] = tier.name
+        result["step"] = tier.step
+        return result
+
+    def nbytes(self) -> int:
+        return sum(tier.nbytes() for tier in self.tiers)
+
+
+# Metrics recorded for every host
+SYSTEM_METRICS = ["cpu", "memory", "disk", "network_sent", "network_recv"]
+
+_stores: Dict[str, TimeSeriesStore] = {}
+
+
+def get_store(host_id: str = "local") -> TimeSeriesStore:
+    """Get (or create) the history store for a host"""
+    store = _stores.get(host_id)
+    if store is None:
+        store = _stores[host_id] = TimeSeriesStore(SYSTEM_METRICS)
+    return store
+
+
+def history_payload(store: TimeSeriesStore, range_: str, resolution: Optional[str] = None) -> dict:
+    """Chart-ready history for a range like "2h" (ValueError on a bad range/resolution)"""
+    result = store.query(parse_duration(range_), resolution)
+    series = result["series"]
+    return {
+        "range": range_,
+        "resolution": result["resolution"],
+        "step": result["step"],
+        "timestamps": result["timestamps"],  # epoch seconds (bucket start)
+        # Averages per bucket (chart series)
+        **{metric: series[metric]["avg"] for metric in store.metrics},
+        # Min/avg/max per bucket for every metric
+        "aggregates": series
+    }
@@ -0,0 +1,99 @@
+"""Cache of verified access tokens -> (user_id, role).
+
+Decoding and verifying a JWT on every request is wasted work for a token
+we have already checked, and resolving a role through the auth admin API
+costs a network round-trip. Entries are bounded (LRU) and expire after a
+TTL or when the token itself expires, whichever comes first.
+
+Roles are embedded in tokens at login, so a role change would otherwise
+stay invisible until the user logs in again. The database records it in
+``profiles.role_changed_at`` (set by the auth.users sync trigger), and a
+token issued before that no longer has its embedded role trusted, see
+``role_claim_trusted``. ``invalidate_user`` drops this process's cached
+entries at once; other processes pick the change up within the TTL.
+"""
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, Set, Tuple
+
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", "300"))
+
+
+class TokenCache:
+    """Bounded LRU + TTL cache of verified tokens"""
+
+    def __init__(self, maxsize: int = TOKEN_CACHE_SIZE, ttl: float = TOKEN_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # token -> (user_id, role, cache expiry as epoch seconds)
+        self._entries: "OrderedDict[str, Tuple[str, Optional[str], float]]" = OrderedDict()
+        self._by_user: Dict[str, Set[str]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[Tuple[str, Optional[str]]]:
+        entry = self._entries.get(token)
+        if entry is None:
+            self.misses += 1
+            return None
+        user_id, role, expires = entry
+        if expires <= time.time():
+            self._remove(token)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(token)
+        self.hits += 1
+        return user_id, role
+
+    def put(self, token: str, user_id: str, role: Optional[str], token_exp: Optional[float] = None):
+        expires = time.time() + self.ttl
+        if token_exp is not None:
+            expires = min(expires, token_exp)
+        if token in self._entries:
+            self._remove(token)
+        self._entries[token] = (user_id, role, expires)
+        self._by_user.setdefault(user_id, set()).add(token)
+        while len(self._entries) > self.maxsize:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+
+    def _remove(self, token: str):
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return
+        tokens = self._by_user.get(entry[0])
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._by_user[entry[0]]
+
+    def invalidate_user(self, user_id: str):
+        """Forget cached tokens for a user whose role changed"""
+        for token in list(self._by_user.get(user_id, ())):
+            self._remove(token)
+
+    def clear(self):
+        self._entries.clear()
+        self._by_user.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+def role_claim_trusted(issued_at: Optional[float], role_changed_at: Optional[str]) -> bool:
+    """Whether a token's embedded role still reflects the user's role (profiles.role_changed_at)"""
+    if not role_changed_at:
+        return True
+    changed = datetime.fromisoformat(role_changed_at.replace('Z', '+00:00')).timestamp()
+    return issued_at is not None and issued_at > changed
+
+
+token_cache = TokenCache()
@@ -0,0 +1,95 @@
+"""Per-user unread notification counters.
+
+The bell icon polls the unread count, and a ``count="exact"`` query per poll
+is wasted work while nothing changes. Counters are kept in memory. They
+are incremented when this backend inserts notifications and decremented
+when it marks them read. A count is re-read from the database after
+``UNREAD_RESYNC_SECONDS``, which picks up writes from other processes or
+scripts.
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+from services.supabase_client import get_async_supabase, db_call
+
+UNREAD_RESYNC_SECONDS = float(os.getenv("UNREAD_RESYNC_SECONDS", "60"))
+UNREAD_CACHE_SIZE = int(os.getenv("UNREAD_CACHE_SIZE", "10000"))
+
+
+async def _count_unread(user_id: str) -> int:
+    """Authoritative count (partial index idx_notifications_unread)"""
+    supabase = await get_async_supabase()
+    result = await db_call(supabase.table("notifications")\
+        .select("id", count="exact", head=True)\
+        .eq("user_id", user_id)\
+        .eq("read", False)\
+        .execute())
+    return result.count or 0
+
+
+class UnreadCounters:
+    """Bounded cache of user_id -> unread count with periodic resync"""
+
+    def __init__(self, resync_seconds: float = UNREAD_RESYNC_SECONDS, maxsize: int = UNREAD_CACHE_SIZE):
+        self.resync_seconds = resync_seconds
+        self.maxsize = maxsize
+        # user_id -> [count, synced_at]
+        self._counts: "OrderedDict[str, list]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def get(self, user_id: str) -> int:
+        entry = self._counts.get(user_id)
+        if entry is not None and time.monotonic() - entry[1] < self.resync_seconds:
+            self._counts.move_to_end(user_id)
+            return entry[0]
+        return await self.resync(user_id)
+
+    async def resync(self, user_id: str) -> int:
+        # Concurrent polls for the same user share one count query
+        pending = self._inflight.get(user_id)
+        if pending is not None:
+            return await pending
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[user_id] = future
+        try:
+            count = await _count_unread(user_id)
+            self._set(user_id, count)
+            future.set_result(count)
+            return count
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an unawaited future doesn't warn
+            future.exception()
+            raise
+        finally:
+            del self._inflight[user_id]
+
+    def _set(self, user_id: str, count: int):
+        self._counts[user_id] = [max(count, 0), time.monotonic()]
+        self._counts.move_to_end(user_id)
+        while len(self._counts) > self.maxsize:
+            self._counts.popitem(last=False)
+
+    def adjust(self, user_id: str, delta: int):
+        """Apply a known change; users not in the cache are read on next access"""
+        entry = self._counts.get(user_id)
+        if entry is not None:
+            entry[0] = max(entry[0] + delta, 0)
+
+    def incr(self, user_ids: Iterable[str], amount: int = 1):
+        for user_id in user_ids:
+            self.adjust(user_id, amount)
+
+    def set(self, user_id: str, count: int):
+        """Record a count known to be exact (e.g. 0 after mark-all-read)"""
+        self._set(user_id, count)
+
+    def peek(self, user_id: str) -> Optional[int]:
+        entry = self._counts.get(user_id)
+        return entry[0] if entry is not None else None
+
+
+unread_counters = UnreadCounters()
@@ -92,6 +92,22 @@ export default function NotificationBell() {
     }
   }
 
+  const markAllAsRead = async () => {
+    try {
+      const token = localStorage.getItem('token')
+      if (!token) return
+
+      await api.patch('/notifications/read-all', null, {
+        params: { token }
+      })
+
+      setNotifications(prev => prev.map(n => ({ ...n, read: true })))
+      setUnreadCount(0)
+    } catch (err) {
+      console.error('Failed to mark all as read:', err)
+    }
+  }
+
   const handleNotificationClick = (notification: Notification) => {
     // Mark as read
     if (!notification.read) {
@@ -217,10 +233,7 @@ export default function NotificationBell() {
             <Divider />
             <MenuItem
               onClick={async () => {
-                const unreadNotifications = notifications.filter(n => !n.read)
-                for (const n of unreadNotifications) {
-                  await markAsRead(n.id)
-                }
+                await markAllAsRead()
                 handleClose()
               }}
             >
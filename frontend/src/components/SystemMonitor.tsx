@@ -48,6 +48,8 @@ interface SystemInfo {
     bytes_recv: number
     packets_sent: number
     packets_recv: number
+    sent_rate: number  // bytes/s
+    recv_rate: number  // bytes/s
   }
 }
 
@@ -56,7 +58,7 @@ interface SystemHistory {
   memory: number[]
   network_sent: number[]
   network_recv: number[]
-  timestamps: string[]
+  timestamps: number[]  // epoch seconds
 }
 
 export default function SystemMonitor() {
@@ -73,64 +75,57 @@ export default function SystemMonitor() {
   const [realtimeNetworkSent, setRealtimeNetworkSent] = useState<number[]>([])
   const [realtimeNetworkRecv, setRealtimeNetworkRecv] = useState<number[]>([])
   const [realtimeLabels, setRealtimeLabels] = useState<string[]>([])
-  const [lastNetworkBytes, setLastNetworkBytes] = useState<{sent: number, recv: number} | null>(null)
 
-  // Fetch real-time data every 2 seconds
+  // Real-time data pushed by the backend sampler (one frame every 2 seconds)
   useEffect(() => {
-    const fetchRealtime = async () => {
+    const handleSnapshot = (data: any) => {
+      setSystemInfo(data)
+
+      // Network rates (MB/s) computed server-side between samples
+      setRealtimeNetworkSent(prev => {
+        const newData = [...prev, parseFloat((data.network.sent_rate / 1024 / 1024).toFixed(2))]
+        return newData.slice(-30)
+      })
+
+      setRealtimeNetworkRecv(prev => {
+        const newData = [...prev, parseFloat((data.network.recv_rate / 1024 / 1024).toFixed(2))]
+        return newData.slice(-30)
+      })
+
+      // Update realtime chart (last 30 samples = 1 minute)
+      const now = new Date(data.timestamp * 1000).toLocaleTimeString('hu-HU', { hour: '2-digit', minute: '2-digit', second: '2-digit' })
+
+      setRealtimeCpu(prev => {
+        const newData = [...prev, data.cpu.percent]
+        return newData.slice(-30) // Keep last 30 samples (1 minute)
+      })
+
+      setRealtimeMemory(prev => {
+        const newData = [...prev, data.memory.percent]
+        return newData.slice(-30)
+      })
+
+      setRealtimeLabels(prev => {
+        const newLabels = [...prev, now]
+        return newLabels.slice(-30)
+      })
+    }
+
+    const source = new EventSource('/api/system/stream')
+    source.onmessage = (event) => {
       try {
-        const response = await api.get('/system/info')
-        const data = response.data
-        setSystemInfo(data)
-
-        // Calculate network rates (MB/s)
-        if (lastNetworkBytes) {
-          const sentRate = ((data.network.bytes_sent - lastNetworkBytes.sent) / 2 / 1024 / 1024).toFixed(2) // MB/s over 2 seconds
-          const recvRate = ((data.network.bytes_recv - lastNetworkBytes.recv) / 2 / 1024 / 1024).toFixed(2) // MB/s over 2 seconds
-          
-          setRealtimeNetworkSent(prev => {
-            const newData = [...prev, parseFloat(sentRate)]
-            return newData.slice(-30)
-          })
-          
-          setRealtimeNetworkRecv(prev => {
-            const newData = [...prev, parseFloat(recvRate)]
-            return newData.slice(-30)
-          })
-        }
-        
-        setLastNetworkBytes({
-          sent: data.network.bytes_sent,
-          recv: data.network.bytes_recv
-        })
-
-        // Update realtime chart (last 30 samples = 1 minute)
-        const now = new Date().toLocaleTimeString('hu-HU', { hour: '2-digit', minute: '2-digit', second: '2-digit' })
-        
-        setRealtimeCpu(prev => {
-          const newData = [...prev, data.cpu.percent]
-          return newData.slice(-30) // Keep last 30 samples (1 minute)
-        })
-        
-        setRealtimeMemory(prev => {
-          const newData = [...prev, data.memory.percent]
-          return newData.slice(-30)
-        })
-        
-        setRealtimeLabels(prev => {
-          const newLabels = [...prev, now]
-          return newLabels.slice(-30)
-        })
+        handleSnapshot(JSON.parse(event.data))
       } catch (err) {
-        console.error('Failed to fetch system info:', err)
+        console.error('Failed to parse system info:', err)
       }
     }
+    source.onerror = (err) => {
+      // EventSource reconnects on its own
+      console.error('System info stream error:', err)
+    }
 
-    fetchRealtime()
-    const interval = setInterval(fetchRealtime, 2000) // Every 2 seconds
-
-    return () => clearInterval(interval)
-  }, [lastNetworkBytes])
+    return () => source.close()
+  }, [])
 
   // Fetch historical data every 2 minutes
   useEffect(() => {
@@ -217,8 +212,12 @@ export default function SystemMonitor() {
     }]
   }
 
+  const historyLabels = history.timestamps.map(ts =>
+    new Date(ts * 1000).toLocaleTimeString('hu-HU', { hour: '2-digit', minute: '2-digit' })
+  )
+
   const historyCpuData = {
-    labels: history.timestamps,
+    labels: historyLabels,
     datasets: [{
       label: 'CPU használat (2 óra)',
       data: history.cpu,
@@ -230,7 +229,7 @@ export default function SystemMonitor() {
   }
 
   const historyMemoryData = {
-    labels: history.timestamps,
+    labels: historyLabels,
     datasets: [{
       label: 'RAM használat (2 óra)',
       data: history.memory,
@@ -264,7 +263,7 @@ export default function SystemMonitor() {
   }
 
   const historyNetworkData = {
-    labels: history.timestamps,
+    labels: historyLabels,
     datasets: [
       {
         label: 'Letöltés (MB/s)',
@@ -73,11 +73,10 @@ export default function DashboardPage() {
     setUpdating(true)
 
     try {
-      // Redirect to static updating page immediately
-      window.location.href = '/updating.html';
-      
-      // Start the update process
+      // Start the update in the background, then follow its progress
+      // on the static updating page (it survives the backend restart)
       await api.post('/dashboard/git-update')
+      window.location.href = '/updating.html';
     } catch (err: any) {
       setMessage(err.response?.data?.detail || 'Update failed')
       setUpdating(false)